@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# File       : benchmark_batch_scaling.py
+# Description: Measures how BatchProcessingExecutor scales with the number of processes
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+Runs a preprocessing and augmentation chain over many synthetic SDSS-shaped spectra
+with BatchProcessingExecutor, for several numbers of worker processes, and reports
+the best time, the speedup over one process and the parallel efficiency of each.
+One process runs the chain inline, so the speedups include the cost of starting the
+pool and of copying spectra through shared memory.
+
+Scaling is only near-linear when every process has a core of its own and the chain
+is long compared to the copies; run on an otherwise idle machine.
+
+Usage:
+    python benchmarks/benchmark_batch_scaling.py --spectra 400 --samples 4600
+    python benchmarks/benchmark_batch_scaling.py --processes 1 2 4 8 --repeat 5
+"""
+
+import argparse
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.batch_processing_module import BatchProcessingExecutor
+
+STEPS = ['normalize_data', 'remove_outliers',
+         ('compute_fractional_derivative', {'column_name': 'Flux', 'derivative_order': 0.5})]
+
+def make_spectra(n_spectra, n_samples, seed=0):
+    """Creates spectra shaped like the CSV spectra of dr18.sdss.org"""
+    rng = np.random.default_rng(seed)
+    wavelength = np.geomspace(3600, 10400, n_samples)
+    continuum = 10 + 5 * np.exp(-((wavelength - 6000) / 2000) ** 2)
+    return [pd.DataFrame({'Wavelength': wavelength, 'Flux': continuum + rng.normal(0, 1, n_samples),
+                          'BestFit': continuum, 'SkyFlux': rng.uniform(0, 5, n_samples)})
+            for _ in range(n_spectra)]
+
+def time_run(executor, spectra, repeat):
+    """Returns the best time of processing every spectrum"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        executor.run(spectra)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--spectra', type=int, default=400)
+    parser.add_argument('--samples', type=int, default=4600, help='samples per spectrum')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='worker process counts')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per count, the best is kept')
+    args = parser.parse_args(argv)
+    # deprecation warnings of dependencies would be repeated for every spectrum
+    warnings.simplefilter('ignore', FutureWarning)
+
+    spectra = make_spectra(args.spectra, args.samples)
+    print(f'{args.spectra} spectra of {args.samples} samples, {os.cpu_count()} CPUs')
+    # one process is always timed first, as the reference of the speedups
+    baseline = None
+    for processes in sorted(set(args.processes) | {1}):
+        seconds = time_run(BatchProcessingExecutor(STEPS, processes=processes), spectra, args.repeat)
+        baseline = baseline or seconds
+        speedup = baseline / seconds
+        print(f'{processes:3d} processes {seconds:8.3f} s  {args.spectra / seconds:8.1f} spectra/s  '
+              f'x{speedup:5.2f}  {speedup / processes:6.1%} efficiency')
+
+if __name__ == '__main__':
+    main()
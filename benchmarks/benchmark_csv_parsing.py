@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# File       : benchmark_csv_parsing.py
+# Description: Compares CSV spectrum parsing paths of SpectraExtract
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+Times the default pd.read_csv(io.StringIO(response.text)) path of extract_spectra
+against parse_spectra_csv and parse_spectra_csv_batch on synthetic dr18-shaped payloads.
+
+Usage: python benchmarks/benchmark_csv_parsing.py [n_spectra] [n_samples]
+"""
+
+import io
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.core_functions_module_extract import parse_spectra_csv, parse_spectra_csv_batch
+
+def make_payload(n_samples, seed):
+    """Creates the bytes of a CSV spectrum as served by dr18.sdss.org"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({'Wavelength': np.linspace(3600, 10400, n_samples), 'Flux': rng.normal(10, 3, n_samples),
+                          'BestFit': rng.normal(10, 3, n_samples), 'SkyFlux': rng.uniform(0, 5, n_samples)})
+    return frame.to_csv(index=False, float_format='%.3f').encode()
+
+def main(n_spectra=50, n_samples=4600):
+    payloads = [make_payload(n_samples, seed) for seed in range(n_spectra)]
+
+    paths = {
+        'read_csv(StringIO(text))': lambda: [pd.read_csv(io.StringIO(payload.decode())) for payload in payloads],
+        'parse_spectra_csv': lambda: [parse_spectra_csv(payload) for payload in payloads],
+        'parse_spectra_csv_batch': lambda: parse_spectra_csv_batch(payloads),
+    }
+
+    baseline = None
+    for name, func in paths.items():
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        baseline = baseline or seconds
+        rows_per_second = n_spectra * n_samples / seconds
+        print(f'{name:28s} {seconds * 1e3:9.2f} ms  {rows_per_second / 1e6:6.2f} Mrows/s  x{baseline / seconds:.2f}')
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
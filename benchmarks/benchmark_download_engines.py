@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# File       : benchmark_download_engines.py
+# Description: Compares the download engines of the package against a local service
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+Downloads the spectra of many objects from a LocalSDSSService with a given latency,
+error rate and bandwidth, using sequential SpectraExtract calls, BulkSpectraDownloader
+with several thread counts and AsyncSpectraClient with several concurrency limits,
+and reports the throughput of each. Rate limits are lifted, so only the engines and
+the simulated service limit the throughput.
+
+Note that the blocking engines wait 2 seconds before every retry, so error rates
+above zero mostly measure that delay.
+
+Usage:
+    python benchmarks/benchmark_download_engines.py --objects 200 --latency 0.05
+    python benchmarks/benchmark_download_engines.py --error-rate 0.2 --bandwidth 500000 --full
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+import numpy as np
+from astropy.table import Table
+from group9_package.subpkg_1.async_extract_module import AsyncSpectraClient
+from group9_package.subpkg_1.bulk_download_module import BulkSpectraDownloader
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.local_service_module import LocalSDSSService
+from group9_package.subpkg_1.rate_limiter_module import configure_rate_limit
+
+def sequential(rows, full):
+    """Downloads one object at a time"""
+    for row in rows:
+        extractor = SpectraExtract(row)
+        extractor.extract_spectra_full(fast=True) if full else extractor.extract_spectra(fast=True)
+
+def bulk(rows, full, workers):
+    """Downloads with BulkSpectraDownloader, including writing the files and the manifest"""
+    with tempfile.TemporaryDirectory() as directory:
+        downloader = BulkSpectraDownloader(os.path.join(directory, 'manifest.sqlite'), directory,
+                                           full=full, max_workers=workers)
+        downloader.add_objects(rows)
+        downloader.run(max_passes=1)
+        downloader.manifest.close()
+
+def concurrent(rows, full, concurrency):
+    """Downloads on one event loop with AsyncSpectraClient"""
+    async def run():
+        async with AsyncSpectraClient(max_concurrency=concurrency, delay=0) as client:
+            await client.extract_many(rows, full=full)
+    asyncio.run(run())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--objects', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before every answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes per second per connection')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16], help='BulkSpectraDownloader threads')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64], help='AsyncSpectraClient limits')
+    parser.add_argument('--full', action='store_true', help='download FITS instead of CSV spectra')
+    args = parser.parse_args(argv)
+
+    configure_rate_limit('sdss', 1e6)
+    rows = Table({'plate': np.full(args.objects, 15150), 'mjd': np.full(args.objects, 59291),
+                  'fiberid': np.arange(1, args.objects + 1)})
+
+    engines = {'sequential': lambda: sequential(rows, args.full)}
+    for workers in args.workers:
+        engines[f'bulk ({workers} threads)'] = lambda workers=workers: bulk(rows, args.full, workers)
+    for concurrency in args.concurrency:
+        engines[f'async ({concurrency} in flight)'] = lambda limit=concurrency: concurrent(rows, args.full, limit)
+
+    service = LocalSDSSService(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               bandwidth=args.bandwidth)
+    with service, service.use():
+        for name, engine in engines.items():
+            service.reset_stats()
+            start = time.perf_counter()
+            # the package prints a line per download
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine()
+            seconds = time.perf_counter() - start
+            stats = service.stats
+            print(f'{name:24s} {seconds:8.2f} s  {args.objects / seconds:8.1f} objects/s  '
+                  f'{stats["requests"]:6d} requests  {stats["errors"]:5d} errors  '
+                  f'{stats["max_in_flight"]:4d} max in flight  {stats["bytes_sent"] / seconds / 1e6:7.2f} MB/s')
+
+if __name__ == '__main__':
+    main()
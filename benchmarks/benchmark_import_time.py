@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# File       : benchmark_import_time.py
+# Description: Reports the import time of every package module
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+Imports each module of the package in a fresh interpreter under python -X importtime
+and reports its cumulative import time with the slowest dependencies it pulled in.
+
+Usage: python benchmarks/benchmark_import_time.py [n_repeats] [n_dependencies]
+"""
+
+import sys
+from group9_package.subpkg_1.lazy_import_module import measure_import_time
+
+MODULES = (
+    'group9_package.subpkg_1.core_functions_module_extract',
+    'group9_package.subpkg_1.core_functions_module_modify',
+    'group9_package.subpkg_1.data_augmentation_module',
+    'group9_package.subpkg_1.visualize_module',
+    'group9_package.subpkg_2.cross_matching_module',
+    'group9_package.subpkg_2.machine_learning_module',
+    'group9_package.subpkg_2.pipeline_module',
+)
+
+def main(n_repeats=3, n_dependencies=3):
+    for module in MODULES:
+        # keep the fastest run, the others include disk cache misses
+        runs = [measure_import_time(module) for _ in range(n_repeats)]
+        timings = min(runs, key=lambda run: run[module][1])
+        top_level = {name: times for name, times in timings.items() if '.' not in name}
+        slowest = sorted(top_level.items(), key=lambda item: -item[1][1])[:n_dependencies]
+        details = ', '.join(f'{name} {cumulative / 1e3:.0f} ms' for name, (_, cumulative) in slowest)
+        print(f'{module:55s} {timings[module][1] / 1e3:7.0f} ms  ({details})')
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
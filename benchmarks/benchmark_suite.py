@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# File       : benchmark_suite.py
+# Description: Times the hot path of every module across input sizes
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+Times the hot path of every module of the package on synthetic SDSS-shaped spectra,
+for several input sizes, and prints a scaling curve per benchmark: the best time at
+each size and the fitted exponent k of time ~ size^k. Network paths are timed against
+a LocalSDSSService, so no SDSS or Gaia service is contacted.
+
+Results can be saved as JSON and compared with the results of another version; any
+benchmark slower than the baseline by more than the tolerance is reported as a
+regression and the script exits with status 1.
+
+Usage:
+    python benchmarks/benchmark_suite.py --output before.json
+    python benchmarks/benchmark_suite.py --compare before.json --tolerance 0.25
+    python benchmarks/benchmark_suite.py --only normalize_data remove_outliers --sizes 1000 10000
+    python benchmarks/benchmark_suite.py --float-dtype float32 --compare before.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1 import rate_limiter_module
+from group9_package.subpkg_1.async_extract_module import AsyncSpectraClient
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor, WavelengthAlignment
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+from group9_package.subpkg_1.dtype_policy_module import FLOAT_DTYPES, configure_float_dtype
+from group9_package.subpkg_1.local_service_module import LocalSDSSService
+from group9_package.subpkg_1.rate_limiter_module import configure_rate_limit
+from group9_package.subpkg_2.cross_matching_module import CrossMatchingModule
+from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier
+
+# number of samples of a typical SDSS lite spectrum
+DEFAULT_SIZES = (1000, 4000, 16000)
+
+def make_lite_spectrum(n, seed=0):
+    """Creates a spectrum shaped like the CSV spectra of dr18.sdss.org"""
+    rng = np.random.default_rng(seed)
+    wavelength = np.geomspace(3600, 10400, n)
+    continuum = 10 + 5 * np.exp(-((wavelength - 6000) / 2000) ** 2)
+    return pd.DataFrame({'Wavelength': wavelength, 'Flux': continuum + rng.normal(0, 1, n),
+                         'BestFit': continuum, 'SkyFlux': rng.uniform(0, 5, n)})
+
+def make_full_spectrum(n, seed=0):
+    """Creates a spectrum shaped like the COADD table returned by extract_spectra_full"""
+    rng = np.random.default_rng(seed)
+    loglam = np.linspace(3.5563, 4.0170, n)
+    return pd.DataFrame({'loglam': loglam, 'flux': rng.normal(10, 3, n), 'ivar': rng.uniform(0.1, 1, n),
+                         'and_mask': np.zeros(n, dtype=np.int32), 'or_mask': np.zeros(n, dtype=np.int32),
+                         'wdisp': rng.uniform(1, 2, n), 'sky': rng.uniform(0, 5, n), 'model': rng.normal(10, 1, n)})
+
+def make_classification(n, n_features=8, seed=0):
+    """Creates separable galaxy/star/qso features"""
+    rng = np.random.default_rng(seed)
+    labels = np.array(['galaxy', 'star', 'qso'])[rng.integers(0, 3, n)]
+    centers = {'galaxy': 0.0, 'star': 2.0, 'qso': 4.0}
+    features = rng.normal(0, 1, (n, n_features)) + np.array([centers[label] for label in labels])[:, None]
+    return pd.DataFrame(features, columns=[f'f{i}' for i in range(n_features)]), pd.Series(labels)
+
+def bench_normalize_data(n, server):
+    preprocessor = DataPreprocessor(None, data=make_lite_spectrum(n))
+    return preprocessor.normalize_data
+
+def bench_remove_outliers(n, server):
+    preprocessor = DataPreprocessor(None, data=make_lite_spectrum(n))
+    return preprocessor.remove_outliers
+
+def bench_interpolate_data(n, server):
+    preprocessor = DataPreprocessor(None, data=make_lite_spectrum(n))
+    new_wavelengths = np.linspace(3700, 10300, n)
+    return lambda: preprocessor.interpolate_data(new_wavelengths)
+
+def bench_wavelength_align(n, server):
+    spectrum = make_full_spectrum(n)
+    return lambda: WavelengthAlignment.WavelengthAlign(spectrum, (3.6, 4.0))
+
+def bench_compute_derivative(n, server):
+    augmentation = DataAugmentation(make_lite_spectrum(n))
+    return lambda: augmentation.compute_derivative('Flux')
+
+def bench_compute_fractional_derivative(n, server):
+    augmentation = DataAugmentation(make_lite_spectrum(n))
+    return lambda: augmentation.compute_fractional_derivative('Flux', 0.5)
+
+def bench_extract_spectra(n, server):
+    server.n_samples = n
+    row = Table({'plate': [15150], 'mjd': [59291], 'fiberid': [1]})[0]
+    return lambda: SpectraExtract(row).extract_spectra(fast=True)
+
+def bench_cross_match(n, server):
+    server.tap_rows = n
+    return lambda: CrossMatchingModule().cross_match(10, 6279435494640163584)
+
+def bench_cross_match_async(n, server):
+    server.tap_rows = n
+    async def run():
+        async with AsyncSpectraClient(delay=0) as client:
+            return await CrossMatchingModule().cross_match_async(10, 6279435494640163584, client)
+    return lambda: asyncio.run(run())
+
+def bench_classifier_fit(n, server):
+    X, y = make_classification(n)
+    return lambda: CelestialObjectClassifier().fit(X, y)
+
+def bench_classifier_predict(n, server):
+    X, y = make_classification(n)
+    classifier = CelestialObjectClassifier()
+    classifier.fit(X, y)
+    return lambda: classifier.predict(X, y)
+
+BENCHMARKS = {
+    'normalize_data': bench_normalize_data,
+    'remove_outliers': bench_remove_outliers,
+    'interpolate_data': bench_interpolate_data,
+    'wavelength_align': bench_wavelength_align,
+    'compute_derivative': bench_compute_derivative,
+    'compute_fractional_derivative': bench_compute_fractional_derivative,
+    'extract_spectra': bench_extract_spectra,
+    'cross_match': bench_cross_match,
+    'cross_match_async': bench_cross_match_async,
+    'classifier_fit': bench_classifier_fit,
+    'classifier_predict': bench_classifier_predict,
+}
+
+def time_benchmark(setup, n, server, repeat):
+    """Returns the best time of a benchmark, with a fresh setup for every repetition"""
+    best = float('inf')
+    for _ in range(repeat):
+        func = setup(n, server)
+        # the package prints progress messages, which are not part of the timing
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def scaling_exponent(timings):
+    """Fits time ~ size^k and returns k"""
+    sizes = np.array([int(size) for size in timings], dtype=float)
+    if len(sizes) < 2:
+        return float('nan')
+    return float(np.polyfit(np.log(sizes), np.log(list(timings.values())), 1)[0])
+
+def run(names, sizes, repeat):
+    """Runs benchmarks and prints their scaling curves
+
+    Returns:
+        dict: {benchmark: {size: best seconds}}
+    """
+    server = LocalSDSSService().start()
+    limiters = dict(rate_limiter_module._RATE_LIMITERS)
+    configure_rate_limit('sdss', 1e6)
+    configure_rate_limit('gaia', 1e6)
+    results = {}
+    try:
+        with server.use():
+            for name in names:
+                results[name] = {str(n): time_benchmark(BENCHMARKS[name], n, server, repeat) for n in sizes}
+                curve = '  '.join(f'{n:>7}: {seconds * 1e3:9.3f} ms' for n, seconds in results[name].items())
+                print(f'{name:30s} {curve}  k={scaling_exponent(results[name]):.2f}')
+    finally:
+        rate_limiter_module._RATE_LIMITERS.update(limiters)
+        server.stop()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Prints the speed ratio of every benchmark to a baseline
+
+    Returns:
+        list: (benchmark, size, ratio) of every benchmark slower than baseline * (1 + tolerance).
+    """
+    regressions = []
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            before = baseline.get(name, {}).get(size)
+            if before is None:
+                continue
+            ratio = seconds / before
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions.append((name, size, ratio))
+                flag = '  REGRESSION'
+            print(f'{name:30s} {size:>7}  {before * 1e3:9.3f} ms -> {seconds * 1e3:9.3f} ms  x{ratio:.2f}{flag}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions per size, the best is kept')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--float-dtype', choices=sorted(FLOAT_DTYPES), help='float dtype the package computes in')
+    args = parser.parse_args(argv)
+    configure_float_dtype(args.float_dtype)
+    # deprecation warnings of dependencies would be repeated for every repetition
+    warnings.simplefilter('ignore', FutureWarning)
+
+    results = run(args.only, args.sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                       'machine': platform.machine(), 'float_dtype': args.float_dtype, 'results': results},
+                      file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) above {args.tolerance:.0%}')
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# File       : async_extract_module.py
+# Description: Asyncio Clients for the SDSS and Gaia Services
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides asyncio counterparts of the blocking network calls of the
+package (SkyServer SQL queries, CSV and FITS spectrum downloads and Gaia TAP queries),
+so that thousands of requests can be in flight on one event loop. Every request goes
+through the same rate limiters as the blocking calls.
+"""
+
+import asyncio
+import io
+import aiohttp
+import pandas as pd
+from astropy.io import fits
+from astropy.table import Table
+from astroquery.exceptions import RemoteServiceError
+from group9_package.subpkg_1.core_functions_module_extract import (
+    FitsStreamDecoder, SpectralAnalysisBase, SpectraExtract, parse_fits_bintable, parse_skyserver_csv,
+    parse_spectra_csv, skyserver_params, spectrum_url)
+from group9_package.subpkg_1.dtype_policy_module import as_float
+from group9_package.subpkg_1.instrumentation_module import count, stage
+from group9_package.subpkg_1.rate_limiter_module import get_rate_limiter
+from group9_package.subpkg_1.service_urls_module import get_service_url
+
+class AsyncSpectraClient:
+    """A Class for querying SDSS and Gaia concurrently from an asyncio event loop
+
+    The client owns one aiohttp session, so it should be used as an async context
+    manager:
+
+        async with AsyncSpectraClient(max_concurrency=200) as client:
+            spectra = await client.extract_many(table, full=True)
+    """
+    def __init__(self, max_concurrency=100, timeout=60, retries=5, delay=2,
+                 spectrum_url=None, sql_url=None, tap_url=None):
+        """Initializes the AsyncSpectraClient Class
+
+        Args:
+            max_concurrency (int, optional): Maximum number of requests in flight at once.
+                Defaults to 100.
+            timeout (float, optional): Seconds allowed for each request, from connecting to
+                reading the whole body. Defaults to 60.
+            retries (int, optional): Attempts per spectrum, as the spectrum service often
+                answers 500 to valid requests. Defaults to 5.
+            delay (float, optional): Seconds to wait between attempts. Defaults to 2.
+            spectrum_url (str, optional): Spectrum service. Defaults to None (the configured
+                'sdss_spectrum' service).
+            sql_url (str, optional): SkyServer SQL search service. Defaults to None (the
+                configured 'sdss_sql' service).
+            tap_url (str, optional): Gaia TAP sync service. Defaults to None (the configured
+                'gaia_tap' service).
+
+        Raises:
+            ValueError: If max_concurrency or retries are not positive
+        """
+        if max_concurrency < 1 or retries < 1:
+            raise ValueError("max_concurrency and retries must be positive")
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.delay = delay
+        self.spectrum_url = get_service_url('sdss_spectrum') if spectrum_url is None else spectrum_url
+        self.sql_url = get_service_url('sdss_sql') if sql_url is None else sql_url
+        self.tap_url = get_service_url('gaia_tap') if tap_url is None else tap_url
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        """Opens the HTTP session"""
+        # the connector limit matches the semaphore, so no request waits on a socket it cannot get
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Closes the HTTP session, after any cancelled request has released its connection"""
+        await self._session.close()
+        self._session = None
+
+    async def _get(self, url, service, params=None, decoder=None, chunk_size=65536):
+        """Sends one GET request, retrying while the service answers with an error status
+
+        If a FitsStreamDecoder is given, the body is fed to it in chunks and the
+        connection is dropped as soon as it has decoded its table.
+
+        Returns:
+            bytes: The response body, the table decoded by decoder, or None if every
+            attempt failed.
+
+        Raises:
+            RuntimeError: If the client is used outside of its context manager
+            aiohttp.ClientError, asyncio.TimeoutError: If a request cannot be completed
+        """
+        if self._session is None:
+            raise RuntimeError("AsyncSpectraClient must be used with 'async with'")
+
+        limiter = get_rate_limiter(service)
+        for i in range(self.retries):
+            await limiter.acquire_async()
+            # hold a slot only while the request is in flight, not while waiting to retry
+            async with self._semaphore:
+                with stage('async.request'):
+                    async with self._session.get(url, params=params) as response:
+                        status = response.status
+                        received = 0
+                        if status == 200 and decoder is not None:
+                            async for chunk in response.content.iter_chunked(chunk_size):
+                                received += len(chunk)
+                                if decoder.feed(chunk) is not None:
+                                    break
+                            body = decoder.finish()
+                        elif status == 200:
+                            body = await response.read()
+                            received = len(body)
+            count('requests')
+
+            if status == 200:
+                limiter.reward()
+                count('bytes_downloaded', received)
+                return body
+
+            # server errors mean we are going too fast: slow every worker down
+            if status >= 500 or status == 429:
+                limiter.penalize()
+            if i < self.retries - 1:
+                count('retries')
+                await asyncio.sleep(self.delay)
+
+        count('failed_downloads')
+        print(f'Request to {url} failed after {self.retries} retries (last status code: {status}).')
+        return None
+
+    async def execute_query(self, query):
+        """Executes a SQL query against the SDSS database
+
+        Args:
+            query (str): The SQL query.
+
+        Returns:
+            Astropy Table: The result of the query, empty if nothing matched.
+
+        Raises:
+            ValueError: If the query is invalid
+            RemoteServiceError: If SkyServer reports an error or cannot be reached
+        """
+        SpectralAnalysisBase.query_validation(query)
+        body = await self._get(self.sql_url, 'sdss', params=skyserver_params(query))
+        if body is None:
+            raise RemoteServiceError("SkyServer did not answer the query")
+        return parse_skyserver_csv(body.decode())
+
+    async def tap_query(self, query):
+        """Executes an ADQL query against the Gaia archive
+
+        Args:
+            query (str): The ADQL query.
+
+        Returns:
+            Astropy Table: The result of the query.
+
+        Raises:
+            RemoteServiceError: If the Gaia archive cannot be reached
+        """
+        body = await self._get(self.tap_url, 'gaia',
+                               params={'REQUEST': 'doQuery', 'LANG': 'ADQL', 'FORMAT': 'csv', 'QUERY': query})
+        if body is None:
+            raise RemoteServiceError("The Gaia archive did not answer the query")
+        return Table.read(body.decode(), format='ascii.csv')
+
+    def _url(self, row, data_format):
+        """Validates a row as SpectraExtract does and returns its spectrum URL"""
+        row = SpectraExtract(row).row
+        return spectrum_url(row['plate'], row['mjd'], row['fiberid'], data_format, base_url=self.spectrum_url)
+
+    async def extract_spectra(self, row, fast=False):
+        """Asyncio counterpart of SpectraExtract.extract_spectra
+
+        Args:
+            row (Table.Row): Row with 'plate', 'mjd' and 'fiberid' columns.
+            fast (bool, optional): If True, parse with parse_spectra_csv. Defaults to False.
+
+        Returns:
+            DataFrame: The spectral data, or None if every attempt failed.
+        """
+        body = await self._get(self._url(row, 'csv'), 'sdss')
+        if body is None:
+            return None
+        return parse_spectra_csv(body) if fast else as_float(pd.read_csv(io.BytesIO(body)))
+
+    async def extract_spectra_full(self, row, fast=False, stream=False):
+        """Asyncio counterpart of SpectraExtract.extract_spectra_full
+
+        Args:
+            row (Table.Row): Row with 'plate', 'mjd' and 'fiberid' columns.
+            fast (bool, optional): If True, parse with parse_fits_bintable. Defaults to False.
+            stream (bool, optional): If True, decode the COADD table while it downloads and
+                stop reading once it is complete. Implies fast. Defaults to False.
+
+        Returns:
+            DataFrame: The COADD table of the spectrum, or None if every attempt failed.
+        """
+        if stream:
+            return await self._get(self._url(row, 'fits'), 'sdss', decoder=FitsStreamDecoder(hdu_index=1))
+
+        body = await self._get(self._url(row, 'fits'), 'sdss')
+        if body is None:
+            return None
+        if fast:
+            return parse_fits_bintable(body, hdu_index=1)
+        with fits.open(io.BytesIO(body)) as fits_data:
+            return as_float(pd.DataFrame(fits_data[1].data))
+
+    async def extract_many(self, rows, full=False, fast=True, return_exceptions=True, stream=False):
+        """Downloads the spectra of many objects concurrently
+
+        Args:
+            rows (iterable of Table.Row): The objects, e.g. an Astropy Table.
+            full (bool, optional): If True, download the full FITS spectra. Defaults to False.
+            fast (bool, optional): If True, use the fast parsers. Defaults to True.
+            return_exceptions (bool, optional): If True, a failed object yields its exception
+                instead of cancelling the others. Defaults to True.
+            stream (bool, optional): If True, decode full spectra while they download
+                (see extract_spectra_full). Ignored unless full is True. Defaults to False.
+
+        Returns:
+            list: One DataFrame (or None, or exception) per row, in input order.
+        """
+        if full:
+            tasks = (self.extract_spectra_full(row, fast=fast, stream=stream) for row in rows)
+        else:
+            tasks = (self.extract_spectra(row, fast=fast) for row in rows)
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
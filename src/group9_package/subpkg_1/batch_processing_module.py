@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# File       : batch_processing_module.py
+# Description: Process Pool Executor for Preprocessing and Augmenting Many Spectra
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module runs a configured chain of DataPreprocessor and DataAugmentation
+methods over many spectra in parallel, exchanging the spectral arrays with the
+worker processes through shared memory instead of pickled DataFrames.
+"""
+
+import gc
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+
+# methods that may appear in a processing chain and the class providing them
+PREPROCESS_METHODS = ('normalize_data', 'remove_outliers', 'interpolate_data', 'correct_redshift')
+AUGMENT_METHODS = ('compute_derivative', 'compute_fractional_derivative', 'augment_both_derivatives')
+
+# byte alignment of every column inside a shared memory block
+_ALIGNMENT = 64
+
+def _align(offset):
+    """Rounds offset up to the next multiple of _ALIGNMENT"""
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def _pack(frames):
+    """Copies the columns of a list of DataFrames into one shared memory block
+
+    Returns:
+        (SharedMemory, layout) where layout holds, for every frame, an (index, columns)
+        pair: columns is a list of (column name, dtype string, byte offset, length)
+        tuples, and index is such a tuple for a numeric index, or else the index itself,
+        which is small to pickle when it is a RangeIndex
+    """
+    layout, arrays, offset = [], [], 0
+
+    def add(name, array):
+        nonlocal offset
+        offset = _align(offset)
+        arrays.append((array, offset))
+        entry = (name, array.dtype.str, offset, array.shape[0])
+        offset += array.nbytes
+        return entry
+
+    for frame in frames:
+        index = frame.index
+        if not isinstance(index, pd.RangeIndex) and isinstance(index.dtype, np.dtype) and index.dtype.kind in 'biuf':
+            index = add(index.name, np.ascontiguousarray(index.to_numpy()))
+
+        columns = []
+        for name in frame.columns:
+            array = np.ascontiguousarray(frame[name].to_numpy())
+            if array.dtype.hasobject:
+                raise TypeError(f"Column '{name}' is not numeric and cannot be shared")
+            columns.append(add(name, array))
+        layout.append((index, columns))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, start in arrays:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=start)[:] = array
+    return shm, layout
+
+def _unpack(shm, layout, copy=False):
+    """Builds DataFrames over the columns stored in a shared memory block
+
+    With copy=False the DataFrames are views of the shared memory, which must stay
+    open for as long as they are in use.
+    """
+    def read(dtype, start, length):
+        view = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=start)
+        return view.copy() if copy else view
+
+    frames = []
+    for index, columns in layout:
+        if isinstance(index, tuple):
+            name, dtype, start, length = index
+            index = pd.Index(read(dtype, start, length), name=name, copy=False)
+        data = {name: read(dtype, start, length) for name, dtype, start, length in columns}
+        frames.append(pd.DataFrame(data, index=index, copy=copy))
+    return frames
+
+def _apply_steps(data, steps):
+    """Runs the processing chain on a single DataFrame and returns the result"""
+    for name, kwargs in steps:
+        if name in PREPROCESS_METHODS:
+            processor = DataPreprocessor(query=None, data=data)
+            getattr(processor, name)(**kwargs)
+            data = processor.data
+        else:
+            augmentor = DataAugmentation(data)
+            data = getattr(augmentor, name)(**kwargs)
+    return data
+
+def _process_chunk(shm_name, layout, steps):
+    """Worker entry point: processes the spectra of one chunk found in shared memory
+
+    Returns:
+        (name, layout) of a new shared memory block holding the processed spectra
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = _unpack(shm, layout)
+        results = [_apply_steps(frame, steps) for frame in frames]
+        out_shm, out_layout = _pack(results)
+        out_name = out_shm.name
+        out_shm.close()
+
+        # drop every view into the input block before closing it
+        del frames, results
+        gc.collect()
+    finally:
+        shm.close()
+    return out_name, out_layout
+
+class BatchProcessingExecutor:
+    """A Class for running a chain of preprocessing and augmentation steps over many spectra in parallel"""
+    def __init__(self, steps, processes=None, chunks_per_process=4):
+        """Initializes the BatchProcessingExecutor Class
+
+        Args:
+            steps (list): Chain of method names from DataPreprocessor or DataAugmentation,
+                or (method_name, kwargs) pairs, applied in order to every spectrum.
+            processes (int, optional): Number of worker processes. Values below 2 run the
+                chain in the calling process. Defaults to os.cpu_count().
+            chunks_per_process (int, optional): Number of chunks each worker receives on
+                average, to balance spectra of different lengths. Defaults to 4.
+
+        Raises:
+            ValueError: If a step is not a supported method or chunks_per_process is not positive
+        """
+        self.steps = []
+        for step in steps:
+            name, kwargs = (step, {}) if isinstance(step, str) else step
+            if name not in PREPROCESS_METHODS + AUGMENT_METHODS:
+                raise ValueError(f"Unsupported processing step: {name}")
+            self.steps.append((name, dict(kwargs)))
+
+        if chunks_per_process < 1:
+            raise ValueError("chunks_per_process must be a positive integer")
+
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunks_per_process = chunks_per_process
+
+    def run(self, spectra):
+        """Processes a list of spectra and returns the results in the same order
+
+        Each chunk of spectra is copied once into a shared memory block that the worker
+        maps directly; results come back the same way, so no DataFrame is pickled.
+
+        Args:
+            spectra (list of pandas.DataFrame): Spectra with numeric columns.
+
+        Returns:
+            list of pandas.DataFrame, the processed spectra
+
+        Raises:
+            TypeError: If an element is not a DataFrame or has non-numeric columns
+        """
+        spectra = list(spectra)
+        if not all(isinstance(frame, pd.DataFrame) for frame in spectra):
+            raise TypeError("All spectra must be Pandas Data Frames")
+
+        if self.processes < 2 or len(spectra) < 2:
+            return [_apply_steps(frame.copy(), self.steps) for frame in spectra]
+
+        n_chunks = min(len(spectra), self.processes * self.chunks_per_process)
+        bounds = np.linspace(0, len(spectra), n_chunks + 1).astype(int)
+
+        inputs = []
+        try:
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                inputs.append(_pack(spectra[start:end]))
+
+            outputs, error = [], None
+            with ProcessPoolExecutor(max_workers=min(self.processes, n_chunks)) as pool:
+                futures = [pool.submit(_process_chunk, shm.name, layout, self.steps) for shm, layout in inputs]
+                for future in futures:
+                    try:
+                        outputs.append(future.result())
+                    except Exception as e:
+                        error = error or e
+
+            # collect the successful chunks even after a failure, so no block is leaked
+            results = []
+            for out_name, out_layout in outputs:
+                out_shm = shared_memory.SharedMemory(name=out_name)
+                try:
+                    if error is None:
+                        results.extend(_unpack(out_shm, out_layout, copy=True))
+                finally:
+                    out_shm.close()
+                    out_shm.unlink()
+
+            if error is not None:
+                raise error
+            return results
+        finally:
+            for shm, _ in inputs:
+                shm.close()
+                shm.unlink()
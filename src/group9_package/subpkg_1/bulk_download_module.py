@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# File       : bulk_download_module.py
+# Description: Resumable Manifest-Driven Bulk Download of Spectra
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module downloads the spectra of many objects with SpectraExtract while
+recording the state of every object (pending, done or failed, with a checksum) in
+a local SQLite manifest, so that an interrupted run resumes where it stopped.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from astropy.table import Table
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+class DownloadManifest:
+    """A Class for tracking the download state of objects in a SQLite database"""
+    def __init__(self, path):
+        """Opens the manifest, creating it if needed
+
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "plate INTEGER, mjd INTEGER, fiberid INTEGER, state TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, checksum TEXT, file TEXT, error TEXT, "
+                "PRIMARY KEY (plate, mjd, fiberid))")
+
+    def close(self):
+        """Closes the database connection"""
+        self._connection.close()
+
+    def add(self, keys):
+        """Adds objects as pending, leaving objects that are already known untouched
+
+        Args:
+            keys (iterable of tuple): (plate, mjd, fiberid) of every object.
+
+        Returns:
+            int: The number of objects that were new.
+        """
+        rows = [(int(plate), int(mjd), int(fiberid), PENDING) for plate, mjd, fiberid in keys]
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO objects (plate, mjd, fiberid, state) VALUES (?, ?, ?, ?)", rows)
+            return self._connection.total_changes - before
+
+    def keys(self, state):
+        """Lists the objects in a given state
+
+        Args:
+            state (str): One of 'pending', 'done' or 'failed'.
+
+        Returns:
+            list of (plate, mjd, fiberid) tuples
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT plate, mjd, fiberid FROM objects WHERE state = ? ORDER BY rowid", (state,))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def record(self, key, state, checksum=None, file=None, error=None):
+        """Records the outcome of one download attempt and commits it immediately
+
+        Args:
+            key (tuple): (plate, mjd, fiberid) of the object.
+            state (str): 'done' or 'failed'.
+            checksum (str, optional): SHA-256 of the downloaded file. Defaults to None.
+            file (str, optional): Path of the downloaded file. Defaults to None.
+            error (str, optional): Reason of a failure. Defaults to None.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE objects SET state = ?, attempts = attempts + 1, checksum = ?, file = ?, error = ? "
+                "WHERE plate = ? AND mjd = ? AND fiberid = ?", (state, checksum, file, error, *key))
+
+    def reset(self, keys):
+        """Marks objects as pending again, e.g. after their file was lost
+
+        Args:
+            keys (iterable of tuple): (plate, mjd, fiberid) of every object.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE objects SET state = ? WHERE plate = ? AND mjd = ? AND fiberid = ?",
+                [(PENDING, *(int(value) for value in key)) for key in keys])
+
+    def entry(self, key):
+        """Returns the manifest entry of one object as a dictionary, or None if unknown"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT plate, mjd, fiberid, state, attempts, checksum, file, error FROM objects "
+                "WHERE plate = ? AND mjd = ? AND fiberid = ?", tuple(int(value) for value in key))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        names = ('plate', 'mjd', 'fiberid', 'state', 'attempts', 'checksum', 'file', 'error')
+        return dict(zip(names, row))
+
+    def summary(self):
+        """Summarises the manifest
+
+        Returns:
+            dict with the number of objects per state and the list of failures with their
+            attempts and last error
+        """
+        with self._lock:
+            counts = dict(self._connection.execute("SELECT state, COUNT(*) FROM objects GROUP BY state").fetchall())
+            failures = self._connection.execute(
+                "SELECT plate, mjd, fiberid, attempts, error FROM objects WHERE state = ? ORDER BY rowid",
+                (FAILED,)).fetchall()
+        report = {state: counts.get(state, 0) for state in (PENDING, DONE, FAILED)}
+        report['failures'] = [{'key': tuple(row[:3]), 'attempts': row[3], 'error': row[4]} for row in failures]
+        return report
+
+class BulkSpectraDownloader:
+    """A Class for downloading the spectra of many objects with a resumable manifest"""
+    def __init__(self, manifest_path, output_dir, full=False, max_workers=1):
+        """Initializes the BulkSpectraDownloader Class
+
+        Args:
+            manifest_path (str): Path of the SQLite manifest.
+            output_dir (str): Directory where spectra are written as CSV files.
+            full (bool, optional): If True, download full spectra with extract_spectra_full.
+                Defaults to False.
+            max_workers (int, optional): Number of concurrent downloads. Defaults to 1.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = DownloadManifest(manifest_path)
+        self.output_dir = output_dir
+        self.full = full
+        self.max_workers = max_workers
+
+    def add_objects(self, data):
+        """Adds the objects of a query result to the manifest
+
+        Args:
+            data (astropy.table.Table): Rows with 'plate', 'mjd' and 'fiberid' columns.
+
+        Returns:
+            int: The number of objects that were not in the manifest yet.
+
+        Raises:
+            ValueError: If the table is missing a required column
+        """
+        missing = [col for col in ['plate', 'mjd', 'fiberid'] if col not in data.colnames]
+        if missing:
+            raise ValueError(f"The input table is missing required columns: {missing}")
+        return self.manifest.add(zip(data['plate'], data['mjd'], data['fiberid']))
+
+    def _path(self, key):
+        """Returns the output file of an object"""
+        kind = 'spec-full' if self.full else 'spec'
+        return os.path.join(self.output_dir, f'{kind}-{key[0]}-{key[1]}-{key[2]}.csv')
+
+    def _download(self, key):
+        """Downloads one object and records the outcome in the manifest"""
+        try:
+            row = Table({'plate': [key[0]], 'mjd': [key[1]], 'fiberid': [key[2]]})[0]
+            extractor = SpectraExtract(row)
+            data = extractor.extract_spectra_full() if self.full else extractor.extract_spectra()
+            if data is None:
+                raise RuntimeError("no data returned after retries")
+
+            # write to a temporary file first, so a crash never leaves a partial spectrum
+            path = self._path(key)
+            payload = data.to_csv(index=False).encode()
+            with open(path + '.tmp', 'wb') as output:
+                output.write(payload)
+            os.replace(path + '.tmp', path)
+            self.manifest.record(key, DONE, checksum=hashlib.sha256(payload).hexdigest(), file=path)
+        except Exception as e:
+            self.manifest.record(key, FAILED, error=f"{type(e).__name__}: {e}")
+
+    def verify(self):
+        """Marks done objects whose file is missing or does not match its checksum as pending again
+
+        Returns:
+            list of (plate, mjd, fiberid) tuples that will be downloaded again
+        """
+        invalid = []
+        for key in self.manifest.keys(DONE):
+            entry = self.manifest.entry(key)
+            path = entry['file']
+            valid = path is not None and os.path.exists(path)
+            if valid:
+                with open(path, 'rb') as existing:
+                    valid = hashlib.sha256(existing.read()).hexdigest() == entry['checksum']
+            if not valid:
+                invalid.append(key)
+        self.manifest.reset(invalid)
+        return invalid
+
+    def run(self, max_passes=3):
+        """Downloads every pending object, then retries failures in later passes
+
+        Objects already marked done, e.g. by an earlier run that was interrupted, are
+        skipped.
+
+        Args:
+            max_passes (int, optional): Number of passes, the first over pending objects
+                and the others over failed objects. Defaults to 3.
+
+        Returns:
+            dict: The manifest summary after the last pass.
+        """
+        for attempt in range(max_passes):
+            keys = self.manifest.keys(PENDING) + (self.manifest.keys(FAILED) if attempt else [])
+            if not keys:
+                break
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(self._download, keys))
+
+        report = self.manifest.summary()
+        print(f"Download summary: {report[DONE]} done, {report[FAILED]} failed, {report[PENDING]} pending")
+        return report
@@ -5,15 +5,394 @@
 # Copyright 2023 Harvard University. All Rights Reserved.
 """This python module provides functionality for querying and extracting astronomical data from the SDSS database."""
 
-from astroquery.sdss import SDSS
 from astropy.table import Table
-from astroquery.exceptions import RemoteServiceError, TimeoutError
-from requests.exceptions import RequestException
 import pandas as pd
-import requests
+import numpy as np
 import io
-from astropy.io import fits
+import re
 import time
+from group9_package.subpkg_1.dtype_policy_module import as_float, get_float_dtype
+from group9_package.subpkg_1.instrumentation_module import count, stage
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+from group9_package.subpkg_1.rate_limiter_module import get_rate_limiter
+from group9_package.subpkg_1.service_urls_module import SDSS_SPECTRUM_URL, get_service_url, is_default_service
+
+# imported on first use, as astroquery alone takes most of a second to load
+SDSS = LazyImport('astroquery.sdss', 'SDSS')
+astroquery_exceptions = LazyImport('astroquery.exceptions')
+requests = LazyImport('requests')
+fits = LazyImport('astropy.io.fits')
+
+# FITS files are made of 2880 byte blocks, headers of 80 character cards
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+
+# big endian storage type of each binary table TFORM code supported by the fast parser
+FITS_TFORM_DTYPES = {'L': 'i1', 'B': 'u1', 'I': '>i2', 'J': '>i4', 'K': '>i8', 'E': '>f4', 'D': '>f8', 'A': 'S'}
+
+# schema of the CSV spectra served by dr18.sdss.org
+SPECTRA_CSV_COLUMNS = ('Wavelength', 'Flux', 'BestFit', 'SkyFlux')
+
+def spectrum_url(plate, mjd, fiberid, data_format='csv', base_url=None):
+    """Builds the URL of the lite spectrum of one object
+
+    Args:
+        plate (int): Plate number.
+        mjd (int): MJD of the observation.
+        fiberid (int): Fiber number.
+        data_format (str, optional): 'csv' or 'fits'. Defaults to 'csv'.
+        base_url (str, optional): Spectrum service to use. Defaults to the configured
+            'sdss_spectrum' service (SDSS_SPECTRUM_URL).
+
+    Returns:
+        str: The spectrum URL.
+    """
+    base_url = get_service_url('sdss_spectrum') if base_url is None else base_url.rstrip('/')
+    return f'{base_url}/format={data_format}/spec=lite?plateid={plate}&mjd={mjd}&fiberid={fiberid}'
+
+def skyserver_params(query):
+    """Returns the parameters of a SkyServer SQL search, as sent by astroquery.sdss"""
+    # comments and newlines are removed from the query
+    command = ' '.join(line.split('--')[0] for line in query.split('\n'))
+    return {'cmd': command, 'format': 'csv', 'searchtool': 'SQL'}
+
+def parse_skyserver_csv(text):
+    """Parses the CSV answer of a SkyServer SQL search
+
+    Args:
+        text (str): The response body.
+
+    Returns:
+        Astropy Table: The result of the query, empty if nothing matched.
+
+    Raises:
+        RemoteServiceError: If SkyServer reports an error
+    """
+    if 'error_message' in text:
+        raise astroquery_exceptions.RemoteServiceError(text)
+    if not any(line and not line.startswith('#') for line in text.splitlines()):
+        return Table()
+    return Table.read(text, format='ascii.csv', comment='#')
+
+def query_sql(query):
+    """Runs a SQL query on the configured SkyServer
+
+    The public SkyServer is queried through astroquery.sdss; any other 'sdss_sql'
+    service (e.g. a LocalSDSSService) with plain HTTP requests.
+
+    Args:
+        query (str): The SQL query.
+
+    Returns:
+        Astropy Table: The result of the query.
+
+    Raises:
+        RemoteServiceError: If SkyServer reports an error
+        RequestException: If the service cannot be reached
+    """
+    if is_default_service('sdss_sql'):
+        return SDSS.query_sql(query)
+    response = requests.get(get_service_url('sdss_sql'), params=skyserver_params(query))
+    response.raise_for_status()
+    count('bytes_downloaded', len(response.content))
+    return parse_skyserver_csv(response.text)
+
+def _split_csv_rows(payload):
+    """Validates the header line of a CSV spectrum and returns its data lines"""
+    lines = payload.splitlines()
+    header = lines[0] if lines else b''
+    columns = tuple(name.strip() for name in header.decode('ascii', errors='replace').split(','))
+    if columns != SPECTRA_CSV_COLUMNS:
+        raise ValueError(f"Unexpected CSV spectrum columns: {columns}")
+    return [line for line in lines[1:] if line]
+
+def _csv_float(field):
+    """Converts one CSV field, an empty field being NaN as with pd.read_csv"""
+    return float(field) if field.strip() else np.nan
+
+def _load_csv_rows(lines, dtype):
+    """Converts the data lines of a CSV spectrum to a (rows, 4) array
+
+    Empty fields become NaN, as with pd.read_csv; since they are rare, the lines are
+    only parsed field by field after the fast conversion failed.
+    """
+    if not lines:
+        return np.empty((0, len(SPECTRA_CSV_COLUMNS)), dtype=dtype)
+    try:
+        return np.loadtxt(lines, delimiter=',', dtype=dtype, ndmin=2)
+    except ValueError:
+        return np.loadtxt(lines, delimiter=',', dtype=dtype, ndmin=2, converters=_csv_float)
+
+def parse_spectra_csv(payload, dtype=None):
+    """Parses a CSV spectrum from the raw response bytes with a fixed schema
+
+    Unlike pd.read_csv on response.text, the bytes are not decoded to a str first
+    and no column type inference is done. As with pd.read_csv, empty fields are NaN
+    and a body without data lines gives an empty DataFrame.
+
+    Args:
+        payload (bytes): Raw CSV response body.
+        dtype (numpy dtype, optional): Type of every column. Defaults to the configured
+            float dtype (get_float_dtype), np.float64 if none is set.
+
+    Returns:
+        DataFrame: A Pandas DataFrame with the 'Wavelength', 'Flux', 'BestFit' and 'SkyFlux' columns.
+
+    Raises:
+        ValueError: If the header does not match the expected columns or a field is not a number
+    """
+    rows = _split_csv_rows(payload)
+    dtype = dtype or get_float_dtype() or np.float64
+    values = _load_csv_rows(rows, dtype).reshape(len(rows), len(SPECTRA_CSV_COLUMNS))
+    return pd.DataFrame(values, columns=list(SPECTRA_CSV_COLUMNS), copy=False)
+
+def parse_spectra_csv_batch(payloads, dtype=None, out=None):
+    """Parses many CSV spectra into one preallocated (total_rows, 4) array
+
+    Args:
+        payloads (list of bytes): Raw CSV response bodies.
+        dtype (numpy dtype, optional): Type of the output array. Defaults to the configured
+            float dtype (get_float_dtype), np.float64 if none is set.
+        out (numpy.ndarray, optional): Array of shape (total_rows, 4) to fill. Defaults
+            to a new array.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): the stacked rows of every spectrum, with columns
+        in the order of SPECTRA_CSV_COLUMNS, and the offsets such that spectrum i is
+        rows offsets[i]:offsets[i + 1]
+
+    Raises:
+        ValueError: If a header does not match or out has the wrong shape
+    """
+    rows = [_split_csv_rows(payload) for payload in payloads]
+    offsets = np.concatenate([[0], np.cumsum([len(lines) for lines in rows])]).astype(np.int64)
+
+    shape = (int(offsets[-1]), len(SPECTRA_CSV_COLUMNS))
+    if out is None:
+        out = np.empty(shape, dtype=dtype or get_float_dtype() or np.float64)
+    elif out.shape != shape:
+        raise ValueError(f"out must have shape {shape}")
+
+    for lines, start, end in zip(rows, offsets[:-1], offsets[1:]):
+        if end > start:
+            out[start:end] = _load_csv_rows(lines, out.dtype)
+    return out, offsets
+
+def _parse_fits_value(value):
+    """Converts the value field of a FITS header card to a Python object"""
+    value = value.strip()
+    if value.startswith("'"):
+        match = re.match(r"'((?:[^']|'')*)'", value)
+        return match.group(1).replace("''", "'").rstrip() if match else value
+    value = value.split('/')[0].strip()
+    if value in ('T', 'F'):
+        return value == 'T'
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            continue
+    return value
+
+def read_fits_header(buffer, offset=0):
+    """Reads the header of the FITS HDU starting at offset
+
+    Args:
+        buffer (bytes-like): Raw FITS file contents.
+        offset (int, optional): Byte position of the start of the header. Defaults to 0.
+
+    Returns:
+        (dict, int, int): the header keywords, the byte position where the HDU data
+        starts, and the size of the data padded to whole FITS blocks
+
+    Raises:
+        ValueError: If the buffer ends before the END card of the header
+    """
+    view = memoryview(buffer)
+    cards = {}
+    while True:
+        if offset + FITS_BLOCK_SIZE > len(view):
+            raise ValueError("FITS header is truncated")
+        block = bytes(view[offset:offset + FITS_BLOCK_SIZE]).decode('ascii', errors='replace')
+        offset += FITS_BLOCK_SIZE
+        for start in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE):
+            card = block[start:start + FITS_CARD_SIZE]
+            keyword = card[:8].strip()
+            if keyword == 'END':
+                # size of the data unit, from the FITS standard
+                naxis = cards.get('NAXIS', 0)
+                size = 0
+                if naxis:
+                    size = cards.get('PCOUNT', 0)
+                    axes = 1
+                    for n in range(1, naxis + 1):
+                        axes *= cards.get(f'NAXIS{n}', 0)
+                    size = abs(cards.get('BITPIX', 8)) // 8 * cards.get('GCOUNT', 1) * (size + axes)
+                padded = -(-size // FITS_BLOCK_SIZE) * FITS_BLOCK_SIZE
+                return cards, offset, padded
+            if card[8:10] == '= ':
+                cards[keyword] = _parse_fits_value(card[10:])
+
+def _bintable_dtype(cards):
+    """Builds the big endian record dtype of a FITS binary table from its header"""
+    names, formats, offsets, position = [], [], [], 0
+    for n in range(1, cards['TFIELDS'] + 1):
+        match = re.fullmatch(r'\s*(\d*)([A-Z])\s*', str(cards[f'TFORM{n}']))
+        if match is None or match.group(2) not in FITS_TFORM_DTYPES:
+            raise ValueError(f"Unsupported FITS column format: {cards[f'TFORM{n}']}")
+        repeat = int(match.group(1) or 1)
+        code = match.group(2)
+        if code == 'A':
+            fmt, width = f'S{repeat}', repeat
+        else:
+            base = np.dtype(FITS_TFORM_DTYPES[code])
+            fmt, width = ((base, (repeat,)) if repeat != 1 else base), base.itemsize * repeat
+        names.append(cards.get(f'TTYPE{n}', f'col{n}'))
+        formats.append(fmt)
+        offsets.append(position)
+        position += width
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': cards['NAXIS1']})
+
+def _apply_scaling(values, scale, zero):
+    """Applies the TSCAL and TZERO of a column, in a type wide enough for the result
+
+    Integer columns with TSCAL = 1 and an integer TZERO, such as the unsigned integer
+    convention TZERO = 2**31, stay integers; other columns become floating point.
+    """
+    if values.dtype.kind in 'iu' and scale == 1 and float(zero).is_integer():
+        zero = int(zero)
+        if values.dtype.itemsize == 8 and zero == 2**63:
+            # unsigned 64-bit integers: adding 2**63 flips the sign bit
+            return values.view(np.uint64) ^ np.uint64(2**63)
+        return values.astype(np.int64) + zero
+    return as_float(values.astype(np.float64) * scale + zero)
+
+def parse_fits_bintable(buffer, hdu_index=1):
+    """Parses one binary table HDU of a FITS file held in memory
+
+    The table is read as a record view over buffer without copying it, then every
+    column is byte-swapped to native order in a single vectorised pass, which also
+    converts floating point columns to the configured float dtype. No file handles
+    or HDUList objects are created.
+
+    Args:
+        buffer (bytes-like): Raw FITS file contents, e.g. response.content.
+        hdu_index (int, optional): Position of the table HDU; 1 is the COADD HDU of
+            SDSS spectra. Defaults to 1.
+
+    Returns:
+        DataFrame: A Pandas DataFrame with one native-endian column per table field.
+
+    Raises:
+        ValueError: If the buffer is truncated, the HDU is not a binary table or uses
+            a column format that is not supported
+    """
+    offset = 0
+    for _ in range(hdu_index):
+        _, data_start, size = read_fits_header(buffer, offset)
+        offset = data_start + size
+
+    cards, data_start, _ = read_fits_header(buffer, offset)
+    if cards.get('XTENSION') != 'BINTABLE':
+        raise ValueError(f"HDU {hdu_index} is not a binary table")
+
+    n_rows = cards['NAXIS2']
+    if data_start + cards['NAXIS1'] * n_rows > len(buffer):
+        raise ValueError("FITS table data is truncated")
+
+    records = np.frombuffer(buffer, dtype=_bintable_dtype(cards), count=n_rows, offset=data_start)
+
+    columns = {}
+    for n, name in enumerate(records.dtype.names, start=1):
+        raw = records[name]
+        native = raw.dtype.newbyteorder('=')
+        if native.kind == 'f' and get_float_dtype() is not None:
+            native = np.dtype((get_float_dtype(), native.shape)) if native.shape else get_float_dtype()
+        values = raw.astype(native)
+        if cards.get(f'TFORM{n}', '').strip().endswith('L'):
+            values = values == ord('T')
+        scale, zero = cards.get(f'TSCAL{n}', 1), cards.get(f'TZERO{n}', 0)
+        if scale != 1 or zero != 0:
+            values = _apply_scaling(values, scale, zero)
+        columns[name] = list(values) if values.ndim > 1 else values
+    return pd.DataFrame(columns, copy=False)
+
+class FitsStreamDecoder:
+    """Incrementally decodes one binary table HDU of a FITS file received in chunks
+
+    Bytes of the HDUs before the requested one are dropped as soon as they arrive, so
+    at most one HDU is held in memory, and decoding happens as soon as the last byte of
+    the requested table is received, without waiting for the rest of the file.
+    """
+    def __init__(self, hdu_index=1):
+        """Initializes the FitsStreamDecoder Class
+
+        Args:
+            hdu_index (int, optional): Position of the table HDU; 1 is the COADD HDU of
+                SDSS spectra. Defaults to 1.
+        """
+        self.hdu_index = hdu_index
+        self.result = None
+        self._buffer = bytearray()
+        self._hdu = 0
+        self._skip = 0
+        self._table_size = None
+
+    @property
+    def done(self):
+        """True once the requested HDU has been decoded"""
+        return self.result is not None
+
+    def feed(self, chunk):
+        """Adds the next chunk of the file
+
+        Args:
+            chunk (bytes-like): The next bytes of the FITS file.
+
+        Returns:
+            DataFrame: The decoded table once enough bytes were received, otherwise None.
+
+        Raises:
+            ValueError: If the requested HDU is not a binary table or uses a column format
+                that is not supported
+        """
+        if self.result is not None:
+            return self.result
+        self._buffer += chunk
+
+        while self._table_size is None:
+            if self._skip:
+                dropped = min(self._skip, len(self._buffer))
+                del self._buffer[:dropped]
+                self._skip -= dropped
+                if self._skip:
+                    return None
+            try:
+                cards, data_start, size = read_fits_header(self._buffer)
+            except ValueError:
+                # the header of the current HDU has not fully arrived yet
+                return None
+            if self._hdu < self.hdu_index:
+                self._hdu += 1
+                self._skip = data_start + size
+            else:
+                self._table_size = data_start + cards.get('NAXIS1', 0) * cards.get('NAXIS2', 0)
+
+        if len(self._buffer) < self._table_size:
+            return None
+        self.result = parse_fits_bintable(self._buffer, hdu_index=0)
+        self._buffer = bytearray()
+        return self.result
+
+    def finish(self):
+        """Returns the decoded table once the stream has ended
+
+        Raises:
+            ValueError: If the stream ended before the requested HDU was complete
+        """
+        if self.result is None:
+            raise ValueError(f"FITS stream ended before HDU {self.hdu_index} was received")
+        return self.result
 
 class SpectralAnalysisBase:
     """Foundational class for performing spectral analysis by querying and handling data from the SDSS database."""
@@ -58,12 +437,14 @@ class SpectralAnalysisBase:
         # use try except block in order to catch issues with query
         try:
             self.query_validation(self.query)  # Validate the query before executing
-            result = SDSS.query_sql(self.query)
+            get_rate_limiter('sdss').acquire()
+            with stage('extract.query'):
+                result = query_sql(self.query)
             self.data = Table(result)
-        except (RemoteServiceError, TimeoutError, ValueError) as e:
+        except (astroquery_exceptions.RemoteServiceError, astroquery_exceptions.TimeoutError, ValueError) as e:
             print(f"Query Error: {e}")
             raise
-        except RequestException as e:
+        except requests.exceptions.RequestException as e:
             print(f"RequestException: {e}")
             raise
         else:
@@ -81,6 +462,151 @@ class MetaDataExtractor(SpectralAnalysisBase):
         """
         super().__init__(query, data)
 
+        # sorted indexes over the loaded table, built on first lookup
+        self._indexes = {}
+        self._indexed_data = None
+
+    @staticmethod
+    def _spectrum_key(plate, mjd, fiberid):
+        """Packs (plate, mjd, fiberid) into one int64 key, plate < 10^9, mjd < 10^5 and fiberid < 10^4
+
+        Raises:
+            ValueError: If a value is negative or too large for its field, as its key would
+                be the key of another spectrum
+        """
+        plate, mjd, fiberid = (np.asarray(value, dtype=np.int64) for value in (plate, mjd, fiberid))
+        for name, values, limit in (('plate', plate, 10**9), ('mjd', mjd, 10**5), ('fiberid', fiberid, 10**4)):
+            invalid = (values < 0) | (values >= limit)
+            if np.any(invalid):
+                raise ValueError(f"{name} must be in [0, {limit}) to look up spectra, got {np.atleast_1d(values)[np.atleast_1d(invalid)][:5].tolist()}")
+        return (plate * 100000 + mjd) * 10000 + fiberid
+
+    def _index(self, name):
+        """Returns the (sorted keys, row order) index of the loaded table, building it once"""
+        # a new or resized table invalidates every index
+        if self._indexed_data is not self.data or self._indexes.get('_length') != len(self.data):
+            self._indexes = {'_length': len(self.data)}
+            self._indexed_data = self.data
+
+        if name not in self._indexes:
+            if name == 'bestObjID':
+                keys = np.asarray(self.data['bestObjID'], dtype=np.int64)
+            else:
+                keys = self._spectrum_key(self.data['plate'], self.data['mjd'], self.data['fiberid'])
+            # a stable sort keeps the first row of duplicated keys first
+            order = np.argsort(keys, kind='stable')
+            self._indexes[name] = (keys[order], order)
+        return self._indexes[name]
+
+    def _positions(self, name, keys):
+        """Finds the row of the first match of every key with a binary search, -1 if missing"""
+        sorted_keys, order = self._index(name)
+        keys = np.atleast_1d(np.asarray(keys, dtype=np.int64))
+        if len(sorted_keys) == 0:
+            return np.full(len(keys), -1)
+        found = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return np.where(sorted_keys[found] == keys, order[found], -1)
+
+    def lookup(self, best_obj_id):
+        """Finds the row of one object by its bestObjID in O(log n).
+
+        Args:
+            best_obj_id (int): The bestObjID of the object.
+
+        Returns:
+            Astropy Table Row: The first row with this bestObjID.
+
+        Raises:
+            ValueError: If no data is available or the 'bestObjID' column is missing.
+            KeyError: If no row has this bestObjID.
+        """
+        return self.data[self._checked_positions('bestObjID', [best_obj_id], ['bestObjID'])[0]]
+
+    def lookup_many(self, best_obj_ids):
+        """Finds the rows of many objects by their bestObjID.
+
+        Args:
+            best_obj_ids (array-like): The bestObjIDs to look up.
+
+        Returns:
+            Astropy Table: The first row for every bestObjID, in the order requested.
+
+        Raises:
+            ValueError: If no data is available or the 'bestObjID' column is missing.
+            KeyError: If any bestObjID is not in the data.
+        """
+        return self.data[self._checked_positions('bestObjID', best_obj_ids, ['bestObjID'])]
+
+    def lookup_spectrum(self, plate, mjd, fiberid):
+        """Finds the row of one spectrum by its plate, mjd and fiberid in O(log n).
+
+        Args:
+            plate (int or array-like): Plate number(s).
+            mjd (int or array-like): MJD(s) of the observation.
+            fiberid (int or array-like): Fiber number(s).
+
+        Returns:
+            Astropy Table Row for a single spectrum, or an Astropy Table when arrays are given.
+
+        Raises:
+            ValueError: If no data is available, the 'plate', 'mjd' or 'fiberid' columns are
+                missing, or a plate, mjd or fiberid is out of range.
+            KeyError: If a spectrum is not in the data.
+        """
+        keys = self._spectrum_key(plate, mjd, fiberid)
+        positions = self._checked_positions('spectrum', keys, ['plate', 'mjd', 'fiberid'])
+        return self.data[positions[0]] if np.ndim(keys) == 0 else self.data[positions]
+
+    def _checked_positions(self, name, keys, columns):
+        """Validates the data, then returns the row positions of keys or raises KeyError"""
+        if self.data is None or not all(item in self.data.colnames for item in columns):
+            raise ValueError(f"No data available to look up by {columns}.")
+
+        positions = self._positions(name, keys)
+        if np.any(positions < 0):
+            missing = np.atleast_1d(np.asarray(keys))[positions < 0]
+            raise KeyError(f"Keys not found in the data: {missing.tolist()}")
+        return positions
+
+    def join(self, other, key='bestObjID'):
+        """Inner joins another query result onto this one using the index.
+
+        Every row of other is matched to the first row of this data with the same key.
+
+        Args:
+            other (MetaDataExtractor or astropy.table.Table): The query result to join.
+            key (str, optional): Either 'bestObjID' or 'spectrum' for (plate, mjd, fiberid).
+                Defaults to 'bestObjID'.
+
+        Returns:
+            Astropy Table: The matched rows of this data followed by the other columns
+                of the matched rows of other.
+
+        Raises:
+            ValueError: If the key is unknown or either table lacks the key columns.
+        """
+        other = other.data if isinstance(other, MetaDataExtractor) else other
+        columns = {'bestObjID': ['bestObjID'], 'spectrum': ['plate', 'mjd', 'fiberid']}
+        if key not in columns:
+            raise ValueError("key must be 'bestObjID' or 'spectrum'")
+        if self.data is None or other is None or not all(item in self.data.colnames and item in other.colnames
+                                                         for item in columns[key]):
+            raise ValueError(f"Both tables need the {columns[key]} columns to join.")
+
+        if key == 'bestObjID':
+            keys = other['bestObjID']
+        else:
+            keys = self._spectrum_key(other['plate'], other['mjd'], other['fiberid'])
+
+        positions = self._positions(key, keys)
+        matched = positions >= 0
+        left = self.data[positions[matched]]
+        right = other[np.flatnonzero(matched)]
+        for name in right.colnames:
+            if name not in columns[key]:
+                left[name if name not in left.colnames else f'{name}_2'] = right[name]
+        return left
+
     def extract_identifiers(self):
         """Extracts unique identifiers from the data.
 
@@ -96,6 +622,76 @@ class MetaDataExtractor(SpectralAnalysisBase):
         identifiers = self.data['bestObjID']
         return identifiers
 
+    def extract_columns(self, *fields, as_array=False):
+        """Extracts any set of columns from the data in one call.
+
+        Args:
+            *fields (str): Names of the columns to extract.
+            as_array (bool, optional): If True, return a NumPy structured array with one
+                field per column, which copies the values once into a single record
+                layout. Defaults to False.
+
+        Returns:
+            Astropy Table whose columns share memory with the data (no copy), or a
+            NumPy structured array if as_array is True; a numpy.ma.MaskedArray keeping
+            the masks if any of the columns has masked values.
+
+        Raises:
+            ValueError: If no fields are given, no data is available or a column is missing.
+        """
+        if not fields:
+            raise ValueError("At least one column must be requested.")
+
+        if self.data is None:
+            raise ValueError("No data available to extract columns.")
+
+        missing = [field for field in fields if field not in self.data.colnames]
+        if missing:
+            raise ValueError(f"Columns missing from the data: {missing}")
+
+        if as_array:
+            records = np.empty(len(self.data), dtype=[(field, self.data[field].dtype) for field in fields])
+            masks = {}
+            for field in fields:
+                records[field] = self.data[field]
+                mask = np.ma.getmask(self.data[field])
+                if mask is not np.ma.nomask and mask.any():
+                    masks[field] = mask
+            if masks:
+                # the masks of MaskedColumns are lost in a plain array, so masked values would look valid
+                mask = np.zeros(len(self.data), dtype=[(field, bool) for field in fields])
+                for field, column_mask in masks.items():
+                    mask[field] = column_mask
+                return np.ma.MaskedArray(records, mask=mask)
+            return records
+
+        return Table([self.data[field] for field in fields], copy=False)
+
+    def project_query(self, *fields):
+        """Rewrites the select list of the query so only the given columns are fetched.
+
+        Pushing the projection into the SQL means the server only returns the needed
+        columns. The rewritten query is stored in the query attribute.
+
+        Args:
+            *fields (str): Column names (or SQL expressions) to select.
+
+        Returns:
+            str: The rewritten query.
+
+        Raises:
+            ValueError: If no fields are given or the query has no select ... from clause.
+        """
+        if not fields:
+            raise ValueError("At least one column must be requested.")
+
+        pattern = re.compile(r'^(\s*select\s+(?:(?:top\s+\d+|distinct)\s+)*)(.*?)(\s+from\s)', re.IGNORECASE | re.DOTALL)
+        if not pattern.search(self.query):
+            raise ValueError("Query is invalid.")
+
+        self.query = pattern.sub(lambda match: match.group(1) + ', '.join(fields) + match.group(3), self.query, count=1)
+        return self.query
+
     def extract_coordinates(self):
         """Extracts astronomical coordinates from the data.
 
@@ -109,7 +705,7 @@ class MetaDataExtractor(SpectralAnalysisBase):
         if self.data is None or not all(item in self.data.colnames  for item in coordinatesCol):
             raise ValueError("No data available to extract coordinates.")
         
-        coordinates = self.data['bestObjID', 'ra', 'dec']
+        coordinates = self.extract_columns(*coordinatesCol)
         return coordinates
 
     def extract_chemical_abundances(self):
@@ -126,7 +722,7 @@ class MetaDataExtractor(SpectralAnalysisBase):
             raise ValueError("No data available to extract chemical abundances.")
         
         # find the actual column name in dataset
-        chemical_abundances = self.data['bestObjID','elodieFeH']
+        chemical_abundances = self.extract_columns(*chemicalAbundancesCol)
         return chemical_abundances
 
     def extract_redshifts(self):
@@ -142,7 +738,7 @@ class MetaDataExtractor(SpectralAnalysisBase):
         if self.data is None or not all(item in self.data.colnames for item in redshiftsCol):
             raise ValueError("No data available to extract redshifts.")
         
-        redshifts = self.data['bestObjID','elodieZ']
+        redshifts = self.extract_columns(*redshiftsCol)
         return redshifts
 
 class SpectraExtract(SpectralAnalysisBase):
@@ -171,9 +767,14 @@ class SpectraExtract(SpectralAnalysisBase):
         # if data is proper, save row to self
         self.row = data_row
         
-    def extract_spectra(self):
+    def extract_spectra(self, fast=False):
         """Retrieves spectral data for the astronomical object represented by inputted data row.
 
+        Args:
+            fast (bool, optional): If True, parse the response bytes with the fixed
+                schema of parse_spectra_csv instead of pd.read_csv on the decoded text.
+                Defaults to False.
+
         Returns:
             DataFrame: A Pandas DataFrame containing the spectral data.
         """
@@ -184,29 +785,56 @@ class SpectraExtract(SpectralAnalysisBase):
         fiberid = row['fiberid']
 
         # Use initialized values for url
-        url = f'http://dr18.sdss.org/optical/spectrum/view/data/format=csv/spec=lite?plateid={plate}&mjd={mjd}&fiberid={fiberid}'
+        url = spectrum_url(plate, mjd, fiberid, 'csv')
 
         # Since site is faulty, retry a few times - error 500 is common even with a correct query
         retries = 5  
         delay = 2  
 
+        limiter = get_rate_limiter('sdss')
         for i in range(retries):
-            response = requests.get(url)
+            limiter.acquire()
+            with stage('extract.download'):
+                response = requests.get(url)
+            count('requests')
 
             if response.status_code == 200:
-                df = pd.read_csv(io.StringIO(response.text))
+                limiter.reward()
+                count('bytes_downloaded', len(response.content))
+                with stage('extract.parse'):
+                    if fast:
+                        df = parse_spectra_csv(response.content)
+                    else:
+                        df = as_float(pd.read_csv(io.StringIO(response.text)))
                 print('Successful Query!')
                 return df
             else:
+                # server errors mean we are going too fast: slow every worker down
+                if response.status_code >= 500 or response.status_code == 429:
+                    limiter.penalize()
+                # only attempts followed by another one are retries, as in AsyncSpectraClient
+                if i < retries - 1:
+                    count('retries')
                 print(f'Request failed with status code: {response.status_code}. Retrying...')
                 time.sleep(delay)  # Adding a delay before the next retry
 
         #print failure message
+        count('failed_downloads')
         print(f'Request failed after {retries} retries. Ensure proper row was input or try again later.')
 
-    def extract_spectra_full(self):
+    def extract_spectra_full(self, fast=False, stream=False, chunk_size=65536):
         """Retrieves full spectral data in FITS format and processes it.
 
+        Args:
+            fast (bool, optional): If True, parse only the COADD HDU straight from the
+                response bytes with parse_fits_bintable instead of building an astropy
+                HDUList, which avoids an extra copy of every column. Defaults to False.
+            stream (bool, optional): If True, read the response in chunks with a
+                FitsStreamDecoder and close the connection as soon as the COADD HDU is
+                decoded, without downloading the HDUs after it. Implies fast.
+                Defaults to False.
+            chunk_size (int, optional): Bytes read at a time when streaming. Defaults to 65536.
+
         Returns:
             DataFrame: A Pandas DataFrame containing the processed spectral data.
         """
@@ -217,31 +845,63 @@ class SpectraExtract(SpectralAnalysisBase):
         fiberid = row['fiberid']
 
         # Use initialized values for the URL
-        url = f'http://dr18.sdss.org/optical/spectrum/view/data/format=fits/spec=lite?plateid={plate}&mjd={mjd}&fiberid={fiberid}'
+        url = spectrum_url(plate, mjd, fiberid, 'fits')
 
         # Since the site might be faulty, retry a few times - error 500 is common even with a correct query
         retries = 5
         delay = 2
 
+        limiter = get_rate_limiter('sdss')
         for i in range(retries):
-            response = requests.get(url)
+            limiter.acquire()
+            with stage('extract.download'):
+                response = requests.get(url, stream=True) if stream else requests.get(url)
+            count('requests')
 
             if response.status_code == 200:
-                # Process the FITS data
-                fits_data = fits.open(io.BytesIO(response.content))
-
-                # Extract the data you need from the FITS file (example: HDUList[1].data)
-                # Replace the following line with your actual FITS data extraction logic.
-                processed_data = fits_data[1].data
-
-                # Convert the processed data to a Pandas DataFrame
-                df = pd.DataFrame(processed_data)
+                limiter.reward()
+                if stream:
+                    decoder = FitsStreamDecoder(hdu_index=1)
+                    received = 0
+                    try:
+                        # the body arrives while it is decoded, so both are timed together
+                        with stage('extract.stream'):
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                received += len(chunk)
+                                if decoder.feed(chunk) is not None:
+                                    break
+                    finally:
+                        # stop the transfer of the HDUs after the COADD table
+                        response.close()
+                        count('bytes_downloaded', received)
+                    df = decoder.finish()
+                else:
+                    count('bytes_downloaded', len(response.content))
+                    with stage('extract.parse'):
+                        if fast:
+                            df = parse_fits_bintable(response.content, hdu_index=1)
+                        else:
+                            # Process the FITS data, closing the HDUList once the table is copied out
+                            with fits.open(io.BytesIO(response.content)) as fits_data:
+                                # Extract the data you need from the FITS file (example: HDUList[1].data)
+                                processed_data = fits_data[1].data
+
+                                # Convert the processed data to a Pandas DataFrame
+                                df = as_float(pd.DataFrame(processed_data))
 
                 print('Successful Query!')
                 return df
             else:
+                # server errors mean we are going too fast: slow every worker down
+                if response.status_code >= 500 or response.status_code == 429:
+                    limiter.penalize()
+                if stream:
+                    response.close()
+                if i < retries - 1:
+                    count('retries')
                 print(f'Request failed with status code: {response.status_code}. Retrying...')
                 time.sleep(delay)  # Adding a delay before the next retry
 
         # Print failure message
+        count('failed_downloads')
         print(f'Request failed after {retries} retries. Ensure proper row was input or try again later.')
\ No newline at end of file
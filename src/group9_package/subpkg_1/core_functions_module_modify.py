@@ -8,12 +8,17 @@ This python module extends the functionality of the core_functions_module_extrac
 by focusing on data preprocessing and modification techniques of spectral data.
 """
 
-from astroquery.sdss import SDSS
-from scipy.interpolate import interp1d
-from scipy.stats import zscore
 import numpy as np
 import pandas as pd
-from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase
+from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase, query_sql
+from group9_package.subpkg_1.dtype_policy_module import as_float
+from group9_package.subpkg_1.instrumentation_module import instrumented, stage
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+from group9_package.subpkg_1.rate_limiter_module import get_rate_limiter
+
+# scipy is only needed by a few methods and takes most of a second to import
+interp1d = LazyImport('scipy.interpolate', 'interp1d')
+zscore = LazyImport('scipy.stats', 'zscore')
 
 
 class DataPreprocessor(SpectralAnalysisBase):
@@ -24,7 +29,8 @@ class DataPreprocessor(SpectralAnalysisBase):
         Args:
             query (str): SQL query to retrieve data from the SDSS database.
             data (pandas.DataFrame, optional): Pre-loaded spectral data in a pandas DataFrame. 
-                Defaults to None.
+                Defaults to None. Floating point columns are converted to the configured
+                float dtype (see dtype_policy_module), in a copy if they are not of it already.
 
         Raises:
             ValueError: If the provided data is not a pandas DataFrame.
@@ -36,13 +42,16 @@ class DataPreprocessor(SpectralAnalysisBase):
             raise ValueError("Input data must be a pandas DataFrame")
 
         if data is None:
-            job = SDSS.query_sql(self.query)
-            self.data = job.to_pandas()
+            get_rate_limiter('sdss').acquire()
+            with stage('extract.query'):
+                job = query_sql(self.query)
+            self.data = as_float(job.to_pandas())
         else:
-            self.data = data
+            self.data = as_float(data)
 
         self.column_headers = list(self.data.columns)
 
+    @instrumented('preprocess.normalize_data')
     def normalize_data(self):
         """Normalizes the spectral data using Z-score normalization.
 
@@ -59,6 +68,7 @@ class DataPreprocessor(SpectralAnalysisBase):
         else:
             raise ValueError("No data available for normalization")
 
+    @instrumented('preprocess.remove_outliers')
     def remove_outliers(self, threshold=2.5):
         """Removes outliers from the spectral data based on a Z-score threshold.
 
@@ -71,13 +81,15 @@ class DataPreprocessor(SpectralAnalysisBase):
         """
         if self.data is not None:
             for header in self.column_headers:
-                # Remove outliers from data in using z-score
-                z_scores = np.abs(zscore(self.data[header]))
-                outliers_removed = self.data[header][z_scores < threshold]
-                self.data[header] = outliers_removed
+                # Remove outliers from data in using z-score, computed in place to avoid temporaries
+                z_scores = zscore(self.data[header].to_numpy())
+                np.abs(z_scores, out=z_scores)
+                # outliers become NaN, as when assigning the filtered column back
+                self.data[header] = self.data[header].where(z_scores < threshold)
         else:
             raise ValueError("No data available for outlier removal")
 
+    @instrumented('preprocess.interpolate_data')
     def interpolate_data(self, new_wavelengths):
         """Interpolates the spectral data to new wavelengths.
 
@@ -104,16 +116,17 @@ class DataPreprocessor(SpectralAnalysisBase):
                 raise ValueError("Length of new_wavelengths does not match the length of old wavelengths")
             
             # Create interpolation function
-            interp_function = interp1d(np.array(old_wavelengths.values), np.array(flux_values.values), kind='cubic', fill_value="extrapolate", bounds_error=False)
+            interp_function = interp1d(old_wavelengths.to_numpy(), flux_values.to_numpy(), kind='cubic', fill_value="extrapolate", bounds_error=False)
 
             # Use the interpolation function to estimate values at new_wavelengths
             interpolated_values = interp_function(new_wavelengths)
 
             # Update the dataframe with the interpolated values
-            self.data[header_flux] = interpolated_values
+            self.data[header_flux] = as_float(interpolated_values)
         else:
             raise ValueError("No data available for interpolation")
 
+    @instrumented('preprocess.correct_redshift')
     def correct_redshift(self, bands=['u', 'g', 'r', 'i']):
         """Corrects the wavelengths of spectral data for redshift.
 
@@ -140,6 +153,7 @@ class DataPreprocessor(SpectralAnalysisBase):
             raise ValueError("No wavelength data available for redshift correction")
 
 class WavelengthAlignment():
+    @instrumented('align.wavelength_align')
     def WavelengthAlign(spectra_data, target_range):
         """ Aligns spectra data to a specified wavelength range, potentially requiring interpolation.
 
@@ -149,7 +163,8 @@ class WavelengthAlignment():
             target_range (tuple): A tuple specifying the target wavelength range (start, end).
 
         Returns:
-            DataFrame: DataFrame containing aligned spectra data.
+            DataFrame: DataFrame containing aligned spectra data, with floating point
+            columns of the configured float dtype (see dtype_policy_module).
         """
         # Type and data validation
         if not isinstance(spectra_data, pd.DataFrame):
@@ -167,20 +182,18 @@ class WavelengthAlignment():
             raise ValueError("Target wavelength range is outside the range of loglam values.")
 
         # Interpolate flux values to align to the target range
-        interpolator = interp1d(loglam, flux, kind='linear', fill_value=0.0, bounds_error=False)
         aligned_loglam = np.linspace(target_range[0], target_range[1], len(loglam))
-        aligned_flux = interpolator(aligned_loglam)
-
-        # Create a DataFrame for the aligned spectrum
-        aligned_spectrum = pd.DataFrame({
-            'loglam': aligned_loglam,
-            'flux': aligned_flux,
-            'ivar': spectra_data['ivar'],
-            'and_mask': spectra_data['and_mask'],
-            'or_mask': spectra_data['or_mask'],
-            'wdisp': spectra_data['wdisp'],
-            'sky': spectra_data['sky'],
-            'model': spectra_data['model']
-        })
+        if loglam.is_monotonic_increasing:
+            # same result as interp1d, without its sorted copies of loglam and flux
+            aligned_flux = np.interp(aligned_loglam, loglam.to_numpy(), flux.to_numpy(), left=0.0, right=0.0)
+        else:
+            interpolator = interp1d(loglam, flux, kind='linear', fill_value=0.0, bounds_error=False)
+            aligned_flux = interpolator(aligned_loglam)
+
+        # Create a DataFrame for the aligned spectrum, copying the other columns once
+        # (building it from a dict of columns copies them twice)
+        aligned_spectrum = as_float(spectra_data[expected_columns[2:]].copy())
+        aligned_spectrum.insert(0, 'flux', as_float(aligned_flux))
+        aligned_spectrum.insert(0, 'loglam', as_float(aligned_loglam))
 
         return aligned_spectrum
\ No newline at end of file
@@ -7,6 +7,8 @@
 import numpy as np
 import pandas as pd
 import differint.differint as df
+from group9_package.subpkg_1.dtype_policy_module import as_float
+from group9_package.subpkg_1.instrumentation_module import instrumented
 
 class DataAugmentation:
     """A Class for Augmenting Preprocessed Spectral data with derivatives and fractional derivatives"""
@@ -14,15 +16,17 @@ class DataAugmentation:
         """Initializes DataAugmentation Class
 
         Args:
-            data (Pandas Data Frame, optional): data to compute derivatives on
+            data (Pandas Data Frame, optional): data to compute derivatives on, whose floating
+                point columns are converted to the configured float dtype (see dtype_policy_module)
 
         Raises:
             ValueError: If the given data is not an astropy table
         """
         if not isinstance(data, pd.DataFrame):
             raise TypeError('Data is not a Pandas Data Frame')
-        self.data = data
+        self.data = as_float(data)
 
+    @instrumented('augment.derivative')
     def compute_derivative(self, column_name):
         """Computes the Derivative of a column for spectral data and creates a
         column with the derivative data
@@ -36,9 +40,10 @@ class DataAugmentation:
         """
         if column_name not in self.data.columns.tolist():
             raise ValueError('Column is not in the Preprocessed Spectral Data')
-        self.data[f'{column_name} Derivative'] = np.gradient(self.data[column_name], axis=0)
+        self.data[f'{column_name} Derivative'] = as_float(np.gradient(self.data[column_name], axis=0))
         return self.data
 
+    @instrumented('augment.fractional_derivative')
     def compute_fractional_derivative(self, column_name, derivative_order):
         """Computes the Fractional Derivative of a column for spectral data and
         creates a column with the derivative data
@@ -53,8 +58,8 @@ class DataAugmentation:
         """
         if column_name not in self.data.columns.tolist():
             raise ValueError('Column is not in the Preprocessed Spectral Data')
-        frac_diff = df.GLI(derivative_order, self.data[column_name].ravel(),num_points=self.data[column_name].shape[0])
-        self.data[f'{column_name}_fractional_derivative'] = frac_diff
+        frac_diff = df.GLI(derivative_order, self.data[column_name].to_numpy(),num_points=self.data[column_name].shape[0])
+        self.data[f'{column_name}_fractional_derivative'] = as_float(frac_diff)
         return self.data
 
     def augment_both_derivatives(self, column_name, derivative_order):
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# File       : dtype_policy_module.py
+# Description: Package-Wide Floating Point Precision of Spectral Data
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module holds the floating point type the package computes in. By
+default data keeps the types it arrives with, and the steps return what numpy,
+pandas and scipy produce, mostly float64. With configure_float_dtype('float32')
+(or GROUP9_FLOAT_DTYPE=float32 before the package is imported) downloads,
+preprocessing, alignment, augmentation and classification all carry float32
+columns: SDSS flux is only float32 at the source, and it halves the memory and
+bandwidth of every step.
+
+configure_float_dtype also sets GROUP9_FLOAT_DTYPE, so worker processes started
+afterwards, forked or spawned, compute in the same type.
+
+Integer columns such as the and_mask and or_mask bit masks are never converted.
+"""
+
+import contextlib
+import os
+import numpy as np
+import pandas as pd
+
+FLOAT_DTYPES = {'float32': np.dtype(np.float32), 'float64': np.dtype(np.float64)}
+
+def _float_dtype(dtype):
+    """Returns the numpy dtype of a policy value, None keeping the types of the data
+
+    Raises:
+        ValueError: If dtype is neither None, float32 nor float64
+    """
+    if dtype is None:
+        return None
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        raise ValueError(f"Unsupported float dtype: {dtype!r}") from None
+    if dtype not in FLOAT_DTYPES.values():
+        raise ValueError(f"Float dtype must be one of {sorted(FLOAT_DTYPES)}, not {dtype}")
+    return dtype
+
+# environment variable read at import, so spawned worker processes inherit the policy
+_ENV_VARIABLE = 'GROUP9_FLOAT_DTYPE'
+
+_DTYPE_POLICY = {'float': _float_dtype(os.environ.get(_ENV_VARIABLE) or None)}
+
+def get_float_dtype():
+    """Returns the floating point type the package computes in
+
+    Returns:
+        numpy.dtype: float32 or float64, or None if data keeps the types it arrives with.
+    """
+    return _DTYPE_POLICY['float']
+
+def configure_float_dtype(dtype):
+    """Changes the floating point type the package computes in, here and in worker
+    processes started afterwards
+
+    Args:
+        dtype (str or numpy dtype): 'float32', 'float64', or None to keep the types
+            the data arrives with.
+
+    Returns:
+        numpy.dtype: The previous type, which can be passed back to restore it.
+
+    Raises:
+        ValueError: If dtype is neither None, float32 nor float64
+    """
+    previous = _DTYPE_POLICY['float']
+    dtype = _DTYPE_POLICY['float'] = _float_dtype(dtype)
+    if dtype is None:
+        os.environ.pop(_ENV_VARIABLE, None)
+    else:
+        os.environ[_ENV_VARIABLE] = dtype.name
+    return previous
+
+@contextlib.contextmanager
+def float_dtype(dtype):
+    """Context manager computing in a floating point type within a block, e.g.
+    with float_dtype('float32'): DataPreprocessor(None, data=data).normalize_data()
+
+    Args:
+        dtype (str or numpy dtype): 'float32', 'float64', or None.
+
+    Raises:
+        ValueError: If dtype is neither None, float32 nor float64
+    """
+    previous = configure_float_dtype(dtype)
+    try:
+        yield get_float_dtype()
+    finally:
+        configure_float_dtype(previous)
+
+def as_float(values, dtype=None):
+    """Converts the floating point values of an array, Series or DataFrame to the policy type
+
+    Integer, boolean and object values are returned as they are, and so is anything
+    already of the right type, so the conversion costs nothing when the policy is
+    unset or already met.
+
+    Args:
+        values (numpy.ndarray, pandas.Series or pandas.DataFrame): Values to convert;
+            other sequences are first made numpy arrays.
+        dtype (str or numpy dtype, optional): Type to convert to. Defaults to the
+            configured type (get_float_dtype).
+
+    Returns:
+        The same kind of object, converted column by column if needed.
+
+    Raises:
+        ValueError: If dtype is neither None, float32 nor float64
+    """
+    dtype = get_float_dtype() if dtype is None else _float_dtype(dtype)
+    if dtype is None:
+        return values
+
+    if isinstance(values, pd.DataFrame):
+        changed = {name: dtype for name, column_dtype in values.dtypes.items()
+                   if column_dtype.kind == 'f' and column_dtype != dtype}
+        return values.astype(changed) if changed else values
+
+    if not isinstance(values, (pd.Series, np.ndarray)):
+        values = np.asarray(values)
+    return values.astype(dtype) if values.dtype.kind == 'f' and values.dtype != dtype else values
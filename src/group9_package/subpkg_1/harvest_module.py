@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# File       : harvest_module.py
+# Description: Tiled, Parallel and Resumable Harvesting of SDSS Catalogue Regions
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module splits a large RA/Dec region into cells and queries each cell
+separately, in parallel, checkpointing every finished cell so an interrupted
+harvest can be resumed without fetching those cells again.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from astropy.table import Table, vstack
+from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase
+from group9_package.subpkg_1.query_builder_module import SkyServerQuery
+
+class SkyRegionHarvester:
+    """A Class for harvesting an RA/Dec region of the SDSS catalogue cell by cell"""
+    def __init__(self, columns, ra_range, dec_range, cell_size=1.0, max_workers=4,
+                 key_column='specObjID', table='specObj', configure=None, checkpoint_dir=None):
+        """Initializes the SkyRegionHarvester Class
+
+        Args:
+            columns (list of str): Columns to fetch.
+            ra_range (tuple): (ra_min, ra_max) in degrees; ra_min > ra_max wraps around RA = 0.
+            dec_range (tuple): (dec_min, dec_max) in degrees.
+            cell_size (float, optional): Side of a cell in degrees. Defaults to 1.0.
+            max_workers (int, optional): Maximum number of cell queries in flight. Defaults to 4.
+            key_column (str, optional): Unique identifier used to drop rows fetched by two
+                cells. Added to the columns if missing. Defaults to 'specObjID'.
+            table (str, optional): Table to query. Defaults to 'specObj'.
+            configure (callable, optional): Called with the SkyServerQuery of every cell to
+                add more filters, e.g. lambda query: query.redshift(0.1, 0.3). Defaults to None.
+            checkpoint_dir (str, optional): Directory where finished cells are saved.
+                Defaults to None (no checkpointing).
+
+        Raises:
+            ValueError: If the region, cell size or number of workers is invalid
+        """
+        if cell_size <= 0 or max_workers < 1:
+            raise ValueError("cell_size and max_workers must be positive")
+        if not -90 <= dec_range[0] < dec_range[1] <= 90:
+            raise ValueError("dec_range must be increasing and within [-90, 90]")
+
+        self.columns = list(columns)
+        if key_column not in self.columns:
+            self.columns.append(key_column)
+        self.ra_range = (float(ra_range[0]) % 360, float(ra_range[1]) % 360 or 360.0)
+        self.dec_range = (float(dec_range[0]), float(dec_range[1]))
+        self.cell_size = float(cell_size)
+        self.max_workers = max_workers
+        self.key_column = key_column
+        self.table = table
+        self.configure = configure
+        self.checkpoint_dir = checkpoint_dir
+        self.failures = {}
+
+        if checkpoint_dir is not None:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def cells(self):
+        """Tiles the region into cells
+
+        Returns:
+            list of (ra_min, ra_max, dec_min, dec_max, closed_ra, closed_dec) tuples; the
+            closed flags mark cells on the upper edges of the region, which include that edge
+        """
+        ra_width = (self.ra_range[1] - self.ra_range[0]) % 360 or 360.0
+        n_ra = int(np.ceil(ra_width / self.cell_size))
+        n_dec = int(np.ceil((self.dec_range[1] - self.dec_range[0]) / self.cell_size))
+
+        ra_edges = self.ra_range[0] + np.linspace(0, ra_width, n_ra + 1)
+        dec_edges = np.linspace(self.dec_range[0], self.dec_range[1], n_dec + 1)
+
+        cells = []
+        for j in range(n_dec):
+            for i in range(n_ra):
+                ra_min = float(ra_edges[i] % 360)
+                ra_max = float(ra_edges[i + 1] % 360) or 360.0
+                cells.append((ra_min, ra_max, float(dec_edges[j]), float(dec_edges[j + 1]), i == n_ra - 1, j == n_dec - 1))
+        return cells
+
+    def cell_query(self, cell):
+        """Builds the SQL query of one cell
+
+        Args:
+            cell (tuple): A cell returned by cells().
+
+        Returns:
+            str: The SkyServer SQL query restricted to the cell.
+        """
+        ra_min, ra_max, dec_min, dec_max, closed_ra, closed_dec = cell
+        query = SkyServerQuery(self.table).select(*self.columns)
+        query.box(ra_min, ra_max, dec_min, dec_max, closed_ra=closed_ra, closed_dec=closed_dec)
+        if self.configure is not None:
+            self.configure(query)
+        return query.build()
+
+    def _checkpoint_path(self, query):
+        """Returns the checkpoint file of a cell, named after a hash of its query"""
+        digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+        return os.path.join(self.checkpoint_dir, f'cell_{digest}.ecsv')
+
+    def _fetch_cell(self, query):
+        """Queries one cell, reusing its checkpoint if it was already fetched"""
+        path = self._checkpoint_path(query) if self.checkpoint_dir is not None else None
+        if path is not None and os.path.exists(path):
+            return Table.read(path, format='ascii.ecsv')
+
+        base = SpectralAnalysisBase(query)
+        base.execute_query()
+        result = base.data if base.data is not None else Table()
+
+        if path is not None:
+            # write then rename, so a crash never leaves a partial checkpoint
+            result.write(path + '.tmp', format='ascii.ecsv', overwrite=True)
+            os.replace(path + '.tmp', path)
+        return result
+
+    def harvest(self):
+        """Fetches every cell with bounded parallelism and merges the results
+
+        Cells that fail are recorded in the failures attribute; the cells that succeeded
+        are checkpointed, so calling harvest again only re-queries the failed ones.
+
+        Returns:
+            Astropy Table: The rows of every cell, without duplicated key_column values.
+
+        Raises:
+            RuntimeError: If any cell failed, after all other cells have finished
+        """
+        queries = [self.cell_query(cell) for cell in self.cells()]
+        self.failures = {}
+
+        tables = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {query: pool.submit(self._fetch_cell, query) for query in queries}
+            for query, future in futures.items():
+                try:
+                    tables.append(future.result())
+                except Exception as e:
+                    self.failures[query] = e
+
+        if self.failures:
+            raise RuntimeError(f"{len(self.failures)} of {len(queries)} cells failed; call harvest() again to resume")
+
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return Table(names=self.columns)
+
+        merged = vstack(tables, metadata_conflicts='silent')
+        # keep the first row of every key, in cell order
+        _, first = np.unique(np.asarray(merged[self.key_column]), return_index=True)
+        return merged[np.sort(first)]
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# File       : instrumentation_module.py
+# Description: Stage Timers, Counters and Optional Profiling of the Package
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides the instrumentation layer of the package: per-stage
+timers around downloads, parsing, preprocessing and augmentation, counters such as
+bytes downloaded, retries and cache hits, and optional cProfile or tracemalloc
+capture. Instrumentation is disabled by default, in which case stage() and count()
+return immediately. Metrics can be exported as JSON or in the Prometheus text format.
+
+With trace_memory, stages also record their allocations, the size of their input and
+the peak RSS of the process, and memory_report() flags the stages that allocate much
+more than their input, which usually points at avoidable copies of the data.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+class _NullStage:
+    """Context manager doing nothing, returned by stage() while instrumentation is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """Context manager timing one execution of a stage"""
+    __slots__ = ('owner', 'name', 'input_bytes', 'start', 'memory_start', 'memory_peak', 'rss_start')
+
+    def __init__(self, owner, name, input_bytes=None):
+        self.owner = owner
+        self.name = name
+        self.input_bytes = input_bytes
+
+    def __enter__(self):
+        self.owner._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.owner._exit(self, elapsed, failed=exc_info[0] is not None)
+        return False
+
+class Instrumentation:
+    """A Class collecting stage timings and counters of the package
+
+    Stages can be nested, their timings are inclusive:
+
+        instrumentation = configure_instrumentation()
+        with stage('extract.download'):
+            ...
+        print(instrumentation.to_prometheus())
+    """
+    def __init__(self, enabled=True, profile=False, trace_memory=False):
+        """Initializes the Instrumentation Class
+
+        Args:
+            enabled (bool, optional): If False, stages and counters are not recorded.
+                Defaults to True.
+            profile (bool, optional): If True, run cProfile while the outermost stage of a
+                thread is active, one thread at a time. Defaults to False.
+            trace_memory (bool, optional): If True, start tracemalloc and record the memory
+                allocated by each stage and its peak. Defaults to False.
+        """
+        self.enabled = enabled
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = cProfile.Profile() if profile else None
+        self._profiling_thread = None
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self):
+        """Returns the stages active in the calling thread"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, active):
+        """Starts the optional profiling and memory tracing of a stage"""
+        stack = self._stack()
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # fold the peak reached so far into the enclosing stage before resetting it
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            tracemalloc.reset_peak()
+            active.memory_start = active.memory_peak = current
+            active.rss_start = peak_rss()
+        if self._profiler is not None and not stack:
+            with self._lock:
+                if self._profiling_thread is None:
+                    self._profiling_thread = threading.get_ident()
+                    self._profiler.enable()
+        stack.append(active)
+
+    def _exit(self, active, elapsed, failed):
+        """Records a finished stage"""
+        stack = self._stack()
+        # coroutines sharing the thread may finish their stages in any order
+        if stack[-1] is active:
+            stack.pop()
+        else:
+            stack.remove(active)
+        memory = None
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            active.memory_peak = max(active.memory_peak, peak)
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, active.memory_peak)
+            memory = (current - active.memory_start, active.memory_peak - active.memory_start, peak_rss())
+
+        with self._lock:
+            if self._profiler is not None and not stack and self._profiling_thread == threading.get_ident():
+                self._profiler.disable()
+                self._profiling_thread = None
+
+            timer = self.timers.get(active.name)
+            if timer is None:
+                timer = self.timers[active.name] = {'count': 0, 'errors': 0, 'total_seconds': 0.0,
+                                                    'min_seconds': float('inf'), 'max_seconds': 0.0}
+            timer['count'] += 1
+            timer['errors'] += failed
+            timer['total_seconds'] += elapsed
+            timer['min_seconds'] = min(timer['min_seconds'], elapsed)
+            timer['max_seconds'] = max(timer['max_seconds'], elapsed)
+            if memory is not None:
+                timer['memory_delta_bytes'] = timer.get('memory_delta_bytes', 0) + memory[0]
+                timer['memory_peak_bytes'] = max(timer.get('memory_peak_bytes', 0), memory[1])
+                if memory[2] is not None:
+                    timer['rss_peak_bytes'] = max(timer.get('rss_peak_bytes', 0), memory[2])
+                    # the process high-water mark only grows when a stage needs more memory than ever before
+                    timer['rss_growth_bytes'] = timer.get('rss_growth_bytes', 0) + memory[2] - active.rss_start
+                if active.input_bytes is not None:
+                    timer['input_bytes'] = max(timer.get('input_bytes', 0), active.input_bytes)
+
+    def stage(self, name, input_bytes=None):
+        """Returns a context manager timing a stage
+
+        Args:
+            name (str): Name of the stage, e.g. 'preprocess.normalize_data'.
+            input_bytes (int, optional): Size of the data the stage works on, which
+                memory_report() compares its allocations to. Defaults to None.
+
+        Returns:
+            Context manager.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, input_bytes)
+
+    def count(self, name, value=1):
+        """Adds to a counter
+
+        Args:
+            name (str): Name of the counter, e.g. 'bytes_downloaded'.
+            value (int, optional): Amount to add. Defaults to 1.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """Clears every timer, counter and profile recorded so far"""
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            if self._profiler is not None and self._profiling_thread is None:
+                self._profiler = cProfile.Profile()
+
+    def snapshot(self):
+        """Returns the metrics recorded so far
+
+        Returns:
+            dict: {'timers': {stage: statistics}, 'counters': {name: value}}
+        """
+        with self._lock:
+            timers = {name: dict(timer) for name, timer in self.timers.items()}
+            counters = dict(self.counters)
+        for timer in timers.values():
+            timer['mean_seconds'] = timer['total_seconds'] / timer['count']
+        return {'timers': timers, 'counters': counters}
+
+    def memory_report(self, copy_factor=2.0):
+        """Summarises the memory use of every stage and flags suspected avoidable copies
+
+        A stage is flagged when its allocations peak above copy_factor times the size of
+        its input (temporary copies), or when it keeps as much new memory as its input
+        after returning (a full copy of the input).
+
+        Args:
+            copy_factor (float, optional): Largest peak allocation, relative to the input,
+                that is not flagged. Defaults to 2.0.
+
+        Returns:
+            dict: {'peak_rss_bytes': peak RSS of the process (None where unavailable),
+            'stages': {stage: {'calls', 'input_bytes', 'memory_peak_bytes',
+            'memory_delta_bytes', 'peak_to_input', 'flags'}}}, stages sorted by peak.
+
+        Raises:
+            ValueError: If memory tracing is not enabled
+        """
+        if not self.trace_memory:
+            raise ValueError("Memory tracing is not enabled, use configure_instrumentation(trace_memory=True)")
+
+        stages = {}
+        timers = self.snapshot()['timers']
+        for name, timer in sorted(timers.items(), key=lambda item: -item[1]['memory_peak_bytes']):
+            input_bytes = timer.get('input_bytes')
+            peak = timer['memory_peak_bytes']
+            # memory kept per call, e.g. a returned copy
+            kept = timer['memory_delta_bytes'] / timer['count']
+            flags = []
+            ratio = None
+            if input_bytes:
+                ratio = peak / input_bytes
+                if ratio > copy_factor:
+                    flags.append(f'allocates {ratio:.1f}x its input at peak: temporary copies')
+                if kept >= 0.9 * input_bytes:
+                    flags.append(f'keeps {kept / input_bytes:.1f}x its input: copy of the input')
+            stages[name] = {'calls': timer['count'], 'input_bytes': input_bytes, 'memory_peak_bytes': peak,
+                            'memory_delta_bytes': timer['memory_delta_bytes'], 'peak_to_input': ratio,
+                            'flags': flags}
+        return {'peak_rss_bytes': peak_rss(), 'stages': stages}
+
+    def to_json(self, path=None):
+        """Exports the metrics as JSON
+
+        Args:
+            path (str, optional): File to write. Defaults to None (only return the text).
+
+        Returns:
+            str: The JSON document.
+        """
+        text = json.dumps(self.snapshot(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def to_prometheus(self, prefix='group9'):
+        """Exports the metrics in the Prometheus text exposition format
+
+        Stage timings become a summary labelled by stage, counters become counters
+        named <prefix>_<name>_total.
+
+        Args:
+            prefix (str, optional): Prefix of every metric name. Defaults to 'group9'.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        metrics = self.snapshot()
+        lines = []
+
+        def add(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        timers = sorted(metrics['timers'].items())
+        if timers:
+            name = f'{prefix}_stage_seconds'
+            samples = []
+            for stage_name, timer in timers:
+                label = _label(stage_name)
+                samples.append(f'{name}_sum{{stage="{label}"}} {timer["total_seconds"]!r}')
+                samples.append(f'{name}_count{{stage="{label}"}} {timer["count"]}')
+            add(name, 'summary', 'Time spent in each stage.', samples)
+            add(f'{prefix}_stage_max_seconds', 'gauge', 'Longest execution of each stage.',
+                [f'{prefix}_stage_max_seconds{{stage="{_label(s)}"}} {t["max_seconds"]!r}' for s, t in timers])
+            add(f'{prefix}_stage_errors_total', 'counter', 'Stage executions that raised.',
+                [f'{prefix}_stage_errors_total{{stage="{_label(s)}"}} {t["errors"]}' for s, t in timers])
+            memory = [(s, t) for s, t in timers if 'memory_peak_bytes' in t]
+            if memory:
+                add(f'{prefix}_stage_memory_peak_bytes', 'gauge', 'Largest memory peak of each stage.',
+                    [f'{prefix}_stage_memory_peak_bytes{{stage="{_label(s)}"}} {t["memory_peak_bytes"]}'
+                     for s, t in memory])
+                rss = peak_rss()
+                if rss is not None:
+                    add(f'{prefix}_process_peak_rss_bytes', 'gauge', 'Peak resident set size of the process.',
+                        [f'{prefix}_process_peak_rss_bytes {rss}'])
+
+        for counter, value in sorted(metrics['counters'].items()):
+            name = f'{prefix}_{_metric_name(counter)}_total'
+            add(name, 'counter', f'Total {counter}.', [f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+    def profile_report(self, sort='cumulative', limit=25):
+        """Returns the cProfile statistics collected while stages were active
+
+        Args:
+            sort (str, optional): pstats sort key. Defaults to 'cumulative'.
+            limit (int, optional): Number of functions listed. Defaults to 25.
+
+        Returns:
+            str: The pstats report.
+
+        Raises:
+            ValueError: If profiling is not enabled or nothing was profiled yet
+        """
+        if self._profiler is None:
+            raise ValueError("Profiling is not enabled, use configure_instrumentation(profile=True)")
+        output = io.StringIO()
+        try:
+            pstats.Stats(self._profiler, stream=output).sort_stats(sort).print_stats(limit)
+        except TypeError:
+            raise ValueError("No stage has been profiled yet") from None
+        return output.getvalue()
+
+def peak_rss():
+    """Returns the peak resident set size of the process in bytes, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def data_nbytes(*values):
+    """Returns the size of the largest DataFrame, Series or array among values
+
+    Objects holding their data in a 'data' attribute, such as DataPreprocessor and
+    DataAugmentation, count as that data.
+
+    Returns:
+        int: Size in bytes, 0 if no value holds array data.
+    """
+    largest = 0
+    for value in values:
+        if not hasattr(value, 'dtype') and not hasattr(value, 'dtypes'):
+            value = getattr(value, 'data', None)
+        memory_usage = getattr(value, 'memory_usage', None)
+        if callable(memory_usage):
+            usage = memory_usage(index=True)
+            size = int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+        else:
+            size = int(getattr(value, 'nbytes', 0) or 0) if hasattr(value, 'dtype') else 0
+        largest = max(largest, size)
+    return largest
+
+def _metric_name(name):
+    """Turns a counter name into a valid Prometheus metric name"""
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def _label(value):
+    """Escapes a Prometheus label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# instrumentation used by every module of the package, disabled until configured
+_INSTRUMENTATION = Instrumentation(enabled=False)
+
+def get_instrumentation():
+    """Returns the instrumentation every module of the package reports to"""
+    return _INSTRUMENTATION
+
+def configure_instrumentation(enabled=True, profile=False, trace_memory=False):
+    """Replaces the instrumentation of the package, e.g. to enable it
+
+    Args:
+        enabled (bool, optional): If False, nothing is recorded. Defaults to True.
+        profile (bool, optional): If True, capture a cProfile of the stages. Defaults to False.
+        trace_memory (bool, optional): If True, record tracemalloc allocations per stage.
+            Defaults to False.
+
+    Returns:
+        Instrumentation: The new instrumentation.
+    """
+    global _INSTRUMENTATION
+    _INSTRUMENTATION = Instrumentation(enabled=enabled, profile=profile, trace_memory=trace_memory)
+    return _INSTRUMENTATION
+
+def stage(name):
+    """Returns a context manager timing a stage in the package instrumentation
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        Context manager.
+    """
+    return _INSTRUMENTATION.stage(name)
+
+def count(name, value=1):
+    """Adds to a counter of the package instrumentation
+
+    Args:
+        name (str): Name of the counter.
+        value (int, optional): Amount to add. Defaults to 1.
+    """
+    if _INSTRUMENTATION.enabled:
+        _INSTRUMENTATION.count(name, value)
+
+def instrumented(name):
+    """Decorator timing every call of a function as a stage
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            instrumentation = _INSTRUMENTATION
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            input_bytes = data_nbytes(*args, *kwargs.values()) if instrumentation.trace_memory else None
+            with instrumentation.stage(name, input_bytes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
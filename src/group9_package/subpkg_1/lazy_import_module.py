@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# File       : lazy_import_module.py
+# Description: Deferred Imports of Heavy Dependencies
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides LazyImport, a stand-in for a module or one of its
+attributes that performs the import the first time it is used. The package uses it
+for astroquery, scipy, matplotlib and scikit-learn, which take seconds to import
+and are only needed by some methods.
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+
+class LazyImport:
+    """A Class standing in for a module, or an attribute of a module, until first use
+
+    Attribute access, assignment, deletion and calls are forwarded to the real object,
+    so code (and unittest.mock.patch) can use the stand-in as if it were the object:
+
+        SDSS = LazyImport('astroquery.sdss', 'SDSS')
+        SDSS.query_sql(query)  # imports astroquery.sdss here
+    """
+    __slots__ = ('_lazy_module', '_lazy_attribute', '_lazy_target')
+
+    def __init__(self, module, attribute=None):
+        """Initializes the LazyImport Class
+
+        Args:
+            module (str): Absolute name of the module to import.
+            attribute (str, optional): Name of the object to take from the module.
+                Defaults to None (the module itself).
+        """
+        object.__setattr__(self, '_lazy_module', module)
+        object.__setattr__(self, '_lazy_attribute', attribute)
+        object.__setattr__(self, '_lazy_target', None)
+
+    def _lazy_load(self):
+        """Imports the module on first use and returns the real object"""
+        target = object.__getattribute__(self, '_lazy_target')
+        if target is None:
+            target = importlib.import_module(self._lazy_module)
+            if self._lazy_attribute is not None:
+                target = getattr(target, self._lazy_attribute)
+            object.__setattr__(self, '_lazy_target', target)
+        return target
+
+    @property
+    def loaded(self):
+        """True once the real object has been imported"""
+        return object.__getattribute__(self, '_lazy_target') is not None
+
+    def __getattr__(self, name):
+        return getattr(self._lazy_load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._lazy_load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._lazy_load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_load()(*args, **kwargs)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self):
+        name = self._lazy_module + (f'.{self._lazy_attribute}' if self._lazy_attribute else '')
+        return repr(self._lazy_target) if self.loaded else f'<lazy import of {name}>'
+
+def measure_import_time(module):
+    """Imports a module in a fresh interpreter under python -X importtime
+
+    Args:
+        module (str): Absolute name of the module to import.
+
+    Returns:
+        dict: Maps every module imported along the way to its (self, cumulative)
+        import time in microseconds, in import order.
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    # run with the same sys.path, so the package is found even when it is not installed
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        # lines look like "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(own), int(cumulative))
+    return timings
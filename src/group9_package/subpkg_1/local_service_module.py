@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# File       : local_service_module.py
+# Description: Local Stand-in for the SDSS and Gaia Services
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides LocalSDSSService, an HTTP server standing in for the
+dr18 spectrum service (CSV and FITS spectra), the SkyServer SQL search and the Gaia
+TAP service. It answers with synthetic but realistically shaped data, with a
+configurable latency, error rate and bandwidth, so the download engines of the
+package can be tested and benchmarked end to end without network access.
+"""
+
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import random
+import re
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+from group9_package.subpkg_1.service_urls_module import configure_service_urls
+
+fits = LazyImport('astropy.io.fits')
+
+# samples of a typical BOSS spectrum
+DEFAULT_SAMPLES = 4600
+
+# rest wavelengths (Angstrom) of the emission lines added to the synthetic spectra
+EMISSION_LINES = (3727.0, 4861.3, 4958.9, 5006.8, 6562.8, 6583.5)
+
+# columns of the SQL answer when the select list cannot be parsed (e.g. SELECT *)
+DEFAULT_SQL_COLUMNS = ('plate', 'mjd', 'fiberid', 'ra', 'dec', 'z', 'class')
+
+def make_spectrum(plate, mjd, fiberid, n_samples=DEFAULT_SAMPLES):
+    """Creates the synthetic spectrum of an object, always the same for the same object
+
+    Args:
+        plate (int): Plate number.
+        mjd (int): MJD of the observation.
+        fiberid (int): Fiber number.
+        n_samples (int, optional): Number of samples. Defaults to DEFAULT_SAMPLES.
+
+    Returns:
+        dict: Arrays of the COADD table: loglam, flux, ivar, and_mask, or_mask, wdisp,
+        sky and model.
+    """
+    rng = np.random.default_rng([plate, mjd, fiberid])
+    loglam = np.linspace(3.5563, 4.0170, n_samples)
+    wavelength = 10 ** loglam
+    redshift = rng.uniform(0, 0.3)
+    model = rng.uniform(2, 20) * (wavelength / 6000) ** rng.uniform(-2, 1)
+    for line in EMISSION_LINES:
+        model += rng.uniform(0, 30) * np.exp(-0.5 * ((wavelength - line * (1 + redshift)) / 3.0) ** 2)
+    ivar = rng.uniform(0.5, 2, n_samples)
+    return {
+        'loglam': loglam.astype(np.float32),
+        'flux': (model + rng.normal(0, 1, n_samples) / np.sqrt(ivar)).astype(np.float32),
+        'ivar': ivar.astype(np.float32),
+        'and_mask': np.zeros(n_samples, dtype=np.int32),
+        'or_mask': np.zeros(n_samples, dtype=np.int32),
+        'wdisp': rng.uniform(1, 2, n_samples).astype(np.float32),
+        'sky': rng.uniform(0, 10, n_samples).astype(np.float32),
+        'model': model.astype(np.float32),
+    }
+
+@functools.lru_cache(maxsize=256)
+def spectrum_payload(data_format, plate, mjd, fiberid, n_samples=DEFAULT_SAMPLES):
+    """Returns the bytes of a synthetic spectrum as served by dr18.sdss.org
+
+    Args:
+        data_format (str): 'csv' for the lite CSV spectrum, 'fits' for the spec-lite FITS
+            file with its COADD table in HDU 1 followed by a SPALL table.
+        plate (int): Plate number.
+        mjd (int): MJD of the observation.
+        fiberid (int): Fiber number.
+        n_samples (int, optional): Number of samples. Defaults to DEFAULT_SAMPLES.
+
+    Returns:
+        bytes
+    """
+    spectrum = make_spectrum(plate, mjd, fiberid, n_samples)
+    if data_format == 'csv':
+        frame = pd.DataFrame({'Wavelength': 10.0 ** spectrum['loglam'], 'Flux': spectrum['flux'],
+                              'BestFit': spectrum['model'], 'SkyFlux': spectrum['sky']})
+        return frame.to_csv(index=False, float_format='%.4f').encode()
+
+    formats = {np.dtype(np.float32): 'E', np.dtype(np.int32): 'J'}
+    coadd = fits.BinTableHDU.from_columns(
+        [fits.Column(name=name, format=formats[values.dtype], array=values) for name, values in spectrum.items()],
+        name='COADD')
+    spall = fits.BinTableHDU.from_columns([
+        fits.Column(name='PLATE', format='J', array=np.array([plate])),
+        fits.Column(name='MJD', format='J', array=np.array([mjd])),
+        fits.Column(name='FIBERID', format='J', array=np.array([fiberid])),
+    ], name='SPALL')
+    buffer = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), coadd, spall]).writeto(buffer)
+    return buffer.getvalue()
+
+def _sql_columns(command):
+    """Returns the TOP count (or None) and the column names of a SELECT statement"""
+    match = re.search(r'select\s+(?:top\s+(\d+)\s+)?(.*?)\s+from\s', command, re.IGNORECASE | re.DOTALL)
+    if match is None:
+        return None, None
+    columns = []
+    for field in match.group(2).split(','):
+        # "s.plate", "s.z AS redshift" -> plate, redshift
+        name = re.split(r'\s+as\s+', field.strip(), flags=re.IGNORECASE)[-1].split('.')[-1].strip()
+        if name == '*':
+            return match.group(1), list(DEFAULT_SQL_COLUMNS)
+        columns.append(name)
+    return match.group(1), columns
+
+def _sql_values(name, rng, n):
+    """Creates plausible values of a SkyServer column"""
+    key = name.lower()
+    if key == 'plate':
+        return rng.integers(266, 12000, n)
+    if key == 'mjd':
+        return rng.integers(51600, 59600, n)
+    if key == 'fiberid':
+        return rng.integers(1, 1000, n)
+    if key.endswith('id'):
+        return rng.integers(1 << 60, 1 << 62, n)
+    if key == 'class':
+        return np.array(['GALAXY', 'STAR', 'QSO'])[rng.integers(0, 3, n)]
+    if key == 'ra':
+        return rng.uniform(0, 360, n)
+    if key == 'dec':
+        return rng.uniform(-10, 70, n)
+    if key == 'z':
+        return rng.uniform(0, 3, n)
+    return rng.normal(0, 1, n)
+
+class LocalSDSSService:
+    """A Class running a local stand-in for the SDSS and Gaia services in a background thread
+
+    Routes mirror the real services, so the package only needs its service addresses
+    changed, which use() does for the duration of a with block:
+
+        with LocalSDSSService(latency=0.2, error_rate=0.3) as service, service.use():
+            spectrum = SpectraExtract(row).extract_spectra()
+
+    The package rate limiters still apply; raise them with configure_rate_limit to
+    load-test concurrency settings.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, bandwidth=None, n_samples=DEFAULT_SAMPLES,
+                 sql_rows=10, tap_rows=5, seed=0, host='127.0.0.1', port=0):
+        """Initializes the LocalSDSSService Class
+
+        Args:
+            latency (float, optional): Seconds before every answer. Defaults to 0.0.
+            jitter (float, optional): Random extra latency, uniform in [0, jitter] seconds.
+                Defaults to 0.0.
+            error_rate (float, optional): Fraction of requests answered with status 500,
+                like the frequent failures of dr18.sdss.org. Defaults to 0.0.
+            bandwidth (float, optional): Bytes per second sent to each connection.
+                Defaults to None (unlimited).
+            n_samples (int, optional): Samples per spectrum. Defaults to DEFAULT_SAMPLES.
+            sql_rows (int, optional): Rows returned by SQL queries without TOP. Defaults to 10.
+            tap_rows (int, optional): Rows returned by TAP queries. Defaults to 5.
+            seed (int, optional): Seed of the latency and error draws. Defaults to 0.
+            host (str, optional): Address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on. Defaults to 0 (any free port).
+
+        Raises:
+            ValueError: If a setting is out of range
+        """
+        if latency < 0 or jitter < 0:
+            raise ValueError("latency and jitter must not be negative")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("bandwidth must be positive")
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth
+        self.n_samples = n_samples
+        self.sql_rows = sql_rows
+        self.tap_rows = tap_rows
+        self.host = host
+        self.port = port
+        self.stats = {}
+        self.reset_stats()
+        self._random = random.Random(seed)
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._closing = None
+
+    @property
+    def url(self):
+        """Root address of the running service"""
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def spectrum_url(self):
+        """Address of the stand-in spectrum service"""
+        return f'{self.url}/spectrum'
+
+    @property
+    def sql_url(self):
+        """Address of the stand-in SkyServer SQL search"""
+        return f'{self.url}/sql'
+
+    @property
+    def tap_url(self):
+        """Address of the stand-in Gaia TAP sync service"""
+        return f'{self.url}/tap'
+
+    def reset_stats(self):
+        """Clears the request statistics"""
+        self.stats.update(requests=0, errors=0, bytes_sent=0, in_flight=0, max_in_flight=0)
+
+    def start(self):
+        """Starts serving in a background thread
+
+        Returns:
+            LocalSDSSService: self, with port set to the port actually listened on.
+
+        Raises:
+            RuntimeError: If the service is already running
+        """
+        if self._thread is not None:
+            raise RuntimeError("The service is already running")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    async def _start(self):
+        """Creates the aiohttp application and listens"""
+        self._closing = asyncio.Event()
+        app = web.Application()
+        app.router.add_get('/spectrum/format={data_format:csv|fits}/spec=lite', self._spectrum)
+        app.router.add_get('/sql', self._sql)
+        app.router.add_get('/tap', self._tap)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        """Stops serving, interrupting the answers still in progress"""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._closing.set)
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = self._loop = self._runner = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def use(self):
+        """Points the package, and worker processes started meanwhile, at this service
+
+        Sets the service addresses of the package and the matching GROUP9_<SERVICE>_URL
+        environment variables, and restores both on exit.
+        """
+        urls = {'sdss_spectrum': self.spectrum_url, 'sdss_sql': self.sql_url, 'gaia_tap': self.tap_url}
+        variables = {f'GROUP9_{service.upper()}_URL': url for service, url in urls.items()}
+        saved_environment = {name: os.environ.get(name) for name in variables}
+        previous = configure_service_urls(**urls)
+        os.environ.update(variables)
+        try:
+            yield self
+        finally:
+            configure_service_urls(**previous)
+            for name, value in saved_environment.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    async def _sleep(self, seconds):
+        """Sleeps, unless the service is stopping"""
+        try:
+            await asyncio.wait_for(self._closing.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _answer(self, request, make_body, content_type):
+        """Waits for the latency, then fails or sends the body at the configured bandwidth"""
+        stats = self.stats
+        stats['requests'] += 1
+        stats['in_flight'] += 1
+        stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if delay > 0:
+                await self._sleep(delay)
+            if self._random.random() < self.error_rate:
+                stats['errors'] += 1
+                return web.Response(status=500, text='Internal Server Error')
+
+            body = make_body()
+            if self.bandwidth is None:
+                stats['bytes_sent'] += len(body)
+                return web.Response(body=body, content_type=content_type)
+
+            response = web.StreamResponse(headers={'Content-Type': content_type})
+            response.content_length = len(body)
+            await response.prepare(request)
+            # about 20 writes per second, so the transfer is smooth at any bandwidth
+            chunk_size = max(1024, int(self.bandwidth / 20))
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                await self._sleep(len(chunk) / self.bandwidth)
+                if self._closing.is_set():
+                    break
+                await response.write(chunk)
+                stats['bytes_sent'] += len(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            stats['in_flight'] -= 1
+
+    async def _spectrum(self, request):
+        """Serves /spectrum/format=<csv|fits>/spec=lite?plateid=&mjd=&fiberid="""
+        try:
+            key = tuple(int(request.query[name]) for name in ('plateid', 'mjd', 'fiberid'))
+        except (KeyError, ValueError):
+            return web.Response(status=400, text='plateid, mjd and fiberid are required')
+        data_format = request.match_info['data_format']
+        content_type = 'text/csv' if data_format == 'csv' else 'application/fits'
+        return await self._answer(request, lambda: spectrum_payload(data_format, *key, self.n_samples), content_type)
+
+    async def _sql(self, request):
+        """Serves SkyServer SQL searches in CSV format"""
+        command = request.query.get('cmd', '')
+
+        def body():
+            top, columns = _sql_columns(command)
+            if columns is None:
+                # SkyServer reports invalid queries in the body of a 200 answer
+                return f"error_message: Incorrect syntax in query '{command}'".encode()
+            n = int(top) if top is not None else self.sql_rows
+            rng = np.random.default_rng(zlib.crc32(command.encode()))
+            frame = pd.DataFrame({name: _sql_values(name, rng, n) for name in columns})
+            return b'#Table1\n' + frame.to_csv(index=False).encode()
+
+        return await self._answer(request, body, 'text/plain')
+
+    async def _tap(self, request):
+        """Serves Gaia TAP sync queries of the SDSS best neighbour table in CSV format"""
+        query = request.query.get('QUERY', '')
+
+        def body():
+            rng = np.random.default_rng(zlib.crc32(query.encode()))
+            frame = pd.DataFrame({'original_ext_source_id': rng.integers(1 << 60, 1 << 62, self.tap_rows),
+                                  'angular_distance': np.sort(rng.uniform(0, 20, self.tap_rows))})
+            return frame.to_csv(index=False).encode()
+
+        return await self._answer(request, body, 'text/csv')
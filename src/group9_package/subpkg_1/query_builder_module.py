@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# File       : query_builder_module.py
+# Description: Builds SkyServer SQL Queries with Server-Side Filtering
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides a query builder that generates SkyServer SQL from a
+column list and sky region, redshift and class filters, so that rows are filtered
+by the SDSS server instead of after downloading whole tables.
+"""
+
+import math
+import re
+from group9_package.subpkg_1.core_functions_module_extract import MetaDataExtractor
+
+# spectroscopic classes used in the class column of specObj
+SPECTRAL_CLASSES = ('GALAXY', 'STAR', 'QSO')
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+def _identifier(name):
+    """Validates a table or column name so it can be placed in the SQL text"""
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+def _finite(value):
+    """Validates a numeric value and returns it as a float"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected a number, got {value!r}")
+    # nan and inf have no SQL literal
+    if not math.isfinite(number):
+        raise ValueError(f"Expected a finite number, got {value!r}")
+    return number
+
+def _number(value):
+    """Validates a numeric literal and formats it for the SQL text"""
+    return repr(_finite(value))
+
+class SkyServerQuery:
+    """A Class for building SkyServer SQL queries with column and predicate pushdown"""
+    def __init__(self, table='specObj', ra_column='ra', dec_column='dec', redshift_column='z', class_column='class'):
+        """Initializes the SkyServerQuery Class
+
+        Args:
+            table (str, optional): Table or view to query. Defaults to 'specObj'.
+            ra_column (str, optional): Right ascension column in degrees. Defaults to 'ra'.
+            dec_column (str, optional): Declination column in degrees. Defaults to 'dec'.
+            redshift_column (str, optional): Redshift column. Defaults to 'z'.
+            class_column (str, optional): Spectroscopic class column. Defaults to 'class'.
+
+        Raises:
+            ValueError: If a table or column name is not a valid SQL identifier
+        """
+        self.table = _identifier(table)
+        self.ra_column = _identifier(ra_column)
+        self.dec_column = _identifier(dec_column)
+        self.redshift_column = _identifier(redshift_column)
+        self.class_column = _identifier(class_column)
+        self.columns = []
+        self.conditions = []
+        self.limit = None
+
+    def select(self, *columns):
+        """Adds columns to the select list
+
+        Args:
+            *columns (str): Column names to fetch.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+        """
+        self.columns.extend(_identifier(column) for column in columns)
+        return self
+
+    def top(self, n):
+        """Limits the number of rows returned by the server
+
+        Args:
+            n (int): Maximum number of rows.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+        """
+        if int(n) < 1:
+            raise ValueError("The row limit must be a positive integer")
+        self.limit = int(n)
+        return self
+
+    def box(self, ra_min, ra_max, dec_min, dec_max, closed=False, closed_ra=None, closed_dec=None):
+        """Keeps rows inside an RA/Dec box
+
+        The box is half-open, [min, max), so adjacent boxes do not share rows. A box
+        with ra_min > ra_max wraps around RA = 0.
+
+        Args:
+            ra_min, ra_max (float): Right ascension range in degrees.
+            dec_min, dec_max (float): Declination range in degrees.
+            closed (bool, optional): If True, include the upper edges. Defaults to False.
+            closed_ra (bool, optional): If given, whether to include ra_max, overriding
+                closed. Defaults to None.
+            closed_dec (bool, optional): If given, whether to include dec_max, overriding
+                closed. Defaults to None.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+
+        Raises:
+            ValueError: If a bound is not a finite number
+        """
+        ra_min, ra_max, dec_min, dec_max = map(_finite, (ra_min, ra_max, dec_min, dec_max))
+        upper_ra = '<=' if (closed if closed_ra is None else closed_ra) else '<'
+        upper_dec = '<=' if (closed if closed_dec is None else closed_dec) else '<'
+        ra, dec = self.ra_column, self.dec_column
+        if ra_min <= ra_max:
+            ra_condition = f"{ra} >= {_number(ra_min)} AND {ra} {upper_ra} {_number(ra_max)}"
+        else:
+            ra_condition = f"({ra} >= {_number(ra_min)} OR {ra} {upper_ra} {_number(ra_max)})"
+        self.conditions.append(f"{ra_condition} AND {dec} >= {_number(dec_min)} AND {dec} {upper_dec} {_number(dec_max)}")
+        return self
+
+    def cone(self, ra, dec, radius):
+        """Keeps rows within an angular radius of a sky position
+
+        The exact distance is computed by the SkyServer function fDistanceArcMinEq,
+        behind a declination band that lets the server use its index first.
+
+        Args:
+            ra (float): Right ascension of the centre in degrees.
+            dec (float): Declination of the centre in degrees.
+            radius (float): Radius in degrees.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+
+        Raises:
+            ValueError: If a value is not a finite number or the radius is negative
+        """
+        ra, dec, radius = map(_finite, (ra, dec, radius))
+        if radius < 0:
+            raise ValueError("The cone radius must be non-negative")
+        self.conditions.append(
+            f"{self.dec_column} BETWEEN {_number(dec - radius)} AND {_number(dec + radius)} AND "
+            f"dbo.fDistanceArcMinEq({self.ra_column}, {self.dec_column}, {_number(ra)}, {_number(dec)}) "
+            f"<= {_number(radius * 60)}")
+        return self
+
+    def redshift(self, z_min=None, z_max=None):
+        """Keeps rows within a redshift range
+
+        Args:
+            z_min (float, optional): Minimum redshift. Defaults to no lower bound.
+            z_max (float, optional): Maximum redshift. Defaults to no upper bound.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+        """
+        if z_min is not None:
+            self.conditions.append(f"{self.redshift_column} >= {_number(z_min)}")
+        if z_max is not None:
+            self.conditions.append(f"{self.redshift_column} <= {_number(z_max)}")
+        return self
+
+    def classes(self, *classes):
+        """Keeps rows of the given spectroscopic classes
+
+        Args:
+            *classes (str): Any of 'galaxy', 'star' or 'qso' (case-insensitive).
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+
+        Raises:
+            ValueError: If a class is not a known spectroscopic class
+        """
+        names = [str(name).upper() for name in classes]
+        unknown = [name for name in names if name not in SPECTRAL_CLASSES]
+        if not names or unknown:
+            raise ValueError(f"Classes must be chosen from {SPECTRAL_CLASSES}")
+        values = ', '.join(f"'{name}'" for name in names)
+        self.conditions.append(f"{self.class_column} IN ({values})")
+        return self
+
+    def where(self, condition):
+        """Adds a raw SQL condition, e.g. 'zWarning = 0'
+
+        Args:
+            condition (str): A SQL boolean expression.
+
+        Returns:
+            SkyServerQuery, so that calls can be chained
+        """
+        self.conditions.append(condition)
+        return self
+
+    def build(self):
+        """Generates the SQL text of the query
+
+        Returns:
+            str: The SkyServer SQL query.
+
+        Raises:
+            ValueError: If no columns have been selected
+        """
+        if not self.columns:
+            raise ValueError("At least one column must be selected")
+
+        top = f"TOP {self.limit} " if self.limit is not None else ""
+        query = f"SELECT {top}{', '.join(self.columns)} FROM {self.table}"
+        if self.conditions:
+            query += " WHERE " + " AND ".join(f"({condition})" for condition in self.conditions)
+        return query
+
+    def execute(self):
+        """Runs the query on the SDSS database
+
+        Returns:
+            MetaDataExtractor holding the result in its data attribute
+        """
+        extractor = MetaDataExtractor(self.build())
+        extractor.execute_query()
+        return extractor
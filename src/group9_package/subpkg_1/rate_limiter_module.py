@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# File       : rate_limiter_module.py
+# Description: Token Bucket Rate Limiting of Requests to SDSS and Gaia
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides the token bucket rate limiters that every SDSS and
+Gaia request of the package goes through. A limiter is shared by all threads of
+a process, and can be shared by several processes through a lock file.
+"""
+
+import asyncio
+import os
+import struct
+import threading
+import time
+from group9_package.subpkg_1.instrumentation_module import stage
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# (tokens, last refill time, current rate, clock origin) as stored in the shared state file
+_STATE_FORMAT = '4d'
+
+# largest drift of the clock origin, in seconds, still considered the same boot
+_CLOCK_ORIGIN_TOLERANCE = 1.0
+
+def _clock_origin():
+    """Returns the wall-clock time at which the monotonic clock read zero, which changes at reboot"""
+    return time.time() - time.monotonic()
+
+class TokenBucket:
+    """A Class implementing a token bucket with adaptive (AIMD) rate control"""
+    def __init__(self, rate, capacity=None, min_rate=None, lock_path=None):
+        """Initializes the TokenBucket Class
+
+        Args:
+            rate (float): Maximum number of requests per second.
+            capacity (float, optional): Largest burst of requests allowed at once.
+                Defaults to max(1, rate).
+            min_rate (float, optional): Lowest rate penalize() can drop to.
+                Defaults to rate / 16.
+            lock_path (str, optional): If given, the bucket state is kept in this file and
+                guarded by a file lock, so every process using the same path shares one
+                bucket. Defaults to None (shared by the threads of this process only).
+
+        Raises:
+            ValueError: If the rate or capacity are not positive, or a lock file is
+                requested on a platform without fcntl
+        """
+        if rate <= 0 or (capacity is not None and capacity <= 0):
+            raise ValueError("rate and capacity must be positive")
+        if lock_path is not None and fcntl is None:
+            raise ValueError("Cross-process rate limiting needs fcntl file locks")
+
+        self.max_rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, float(rate))
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 16
+        self.lock_path = lock_path
+        self._lock = threading.Lock()
+        self._state = (self.capacity, time.monotonic(), self.max_rate)
+
+    def _locked(self, update):
+        """Runs update(tokens, last, rate) -> (result, new_state) under the thread and file locks"""
+        with self._lock:
+            if self.lock_path is None:
+                result, self._state = update(*self._state)
+                return result
+
+            # CLOCK_MONOTONIC is shared by the processes of one boot, so their timestamps are
+            # comparable; it restarts at boot, while the state file outlives the processes
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                origin = _clock_origin()
+                raw = os.pread(fd, struct.calcsize(_STATE_FORMAT), 0)
+                state = None
+                if len(raw) == struct.calcsize(_STATE_FORMAT):
+                    *state, written_origin = struct.unpack(_STATE_FORMAT, raw)
+                    # the state of an earlier boot, including a penalised rate, is stale
+                    if abs(written_origin - origin) > _CLOCK_ORIGIN_TOLERANCE or state[1] > time.monotonic():
+                        state = None
+                if state is None:
+                    state = (self.capacity, time.monotonic(), self.max_rate)
+                result, state = update(*state)
+                os.pwrite(fd, struct.pack(_STATE_FORMAT, *state, origin), 0)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    @property
+    def rate(self):
+        """Current number of requests allowed per second"""
+        return self._locked(lambda tokens, last, rate: (rate, (tokens, last, rate)))
+
+    def try_acquire(self, tokens=1):
+        """Takes tokens from the bucket if enough are available, without waiting
+
+        Args:
+            tokens (float, optional): Number of tokens to take. Defaults to 1.
+
+        Returns:
+            float: 0.0 if the tokens were taken, otherwise the number of seconds until
+            enough tokens will be available
+
+        Raises:
+            ValueError: If tokens is not positive or larger than the capacity, as the
+                bucket could then never hold enough tokens
+        """
+        if not 0 < tokens <= self.capacity:
+            raise ValueError(f"tokens must be in (0, {self.capacity}], got {tokens}")
+
+        def update(available, last, rate):
+            now = time.monotonic()
+            available = min(self.capacity, available + max(0.0, now - last) * rate)
+            if available >= tokens:
+                return 0.0, (available - tokens, now, rate)
+            return (tokens - available) / rate, (available, now, rate)
+        return self._locked(update)
+
+    def acquire(self, tokens=1, timeout=None):
+        """Waits until tokens can be taken from the bucket
+
+        Args:
+            tokens (float, optional): Number of tokens to take. Defaults to 1.
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to
+                None (wait as long as needed).
+
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first.
+
+        Raises:
+            ValueError: If tokens is not positive or larger than the capacity
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            with stage('rate_limit.wait'):
+                time.sleep(wait)
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        """Waits until tokens can be taken from the bucket without blocking the event loop
+
+        Args:
+            tokens (float, optional): Number of tokens to take. Defaults to 1.
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to
+                None (wait as long as needed).
+
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired first.
+
+        Raises:
+            ValueError: If tokens is not positive or larger than the capacity
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            with stage('rate_limit.wait'):
+                await asyncio.sleep(wait)
+
+    def penalize(self):
+        """Halves the rate after a server error, down to min_rate"""
+        self._locked(lambda tokens, last, rate: (None, (min(tokens, 0.0), last, max(self.min_rate, rate / 2))))
+
+    def reward(self):
+        """Increases the rate a little after a successful request, up to the configured rate"""
+        step = self.max_rate / 16
+        self._locked(lambda tokens, last, rate: (None, (tokens, last, min(self.max_rate, rate + step))))
+
+# default limiters of the services the package talks to
+_RATE_LIMITERS = {
+    'sdss': TokenBucket(rate=5, capacity=5),
+    'gaia': TokenBucket(rate=2, capacity=2),
+}
+
+def get_rate_limiter(service):
+    """Returns the limiter that requests to a service go through
+
+    Args:
+        service (str): 'sdss' or 'gaia'.
+
+    Returns:
+        TokenBucket
+
+    Raises:
+        KeyError: If the service is unknown
+    """
+    return _RATE_LIMITERS[service]
+
+def configure_rate_limit(service, rate, capacity=None, min_rate=None, lock_path=None):
+    """Replaces the limiter of a service
+
+    Passing the same lock_path in every worker process makes them share one budget,
+    e.g. configure_rate_limit('sdss', 20, lock_path='/tmp/sdss.bucket').
+
+    Args:
+        service (str): 'sdss' or 'gaia'.
+        rate (float): Maximum number of requests per second.
+        capacity (float, optional): Largest burst of requests. Defaults to max(1, rate).
+        min_rate (float, optional): Lowest adaptive rate. Defaults to rate / 16.
+        lock_path (str, optional): State file shared by processes. Defaults to None.
+
+    Returns:
+        TokenBucket: The new limiter.
+
+    Raises:
+        KeyError: If the service is unknown
+    """
+    if service not in _RATE_LIMITERS:
+        raise KeyError(f"Unknown service: {service}")
+    _RATE_LIMITERS[service] = TokenBucket(rate, capacity=capacity, min_rate=min_rate, lock_path=lock_path)
+    return _RATE_LIMITERS[service]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# File       : service_urls_module.py
+# Description: Configurable Addresses of the SDSS and Gaia Services
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module holds the addresses of the services the package talks to: the
+dr18 spectrum service, the SkyServer SQL search and the Gaia TAP service. They can
+be changed at run time with configure_service_urls, or before the package is
+imported with the GROUP9_<SERVICE>_URL environment variables (which also reach
+worker processes), e.g. to point the package at a LocalSDSSService.
+"""
+
+import os
+
+# spectrum service of dr18.sdss.org
+SDSS_SPECTRUM_URL = 'http://dr18.sdss.org/optical/spectrum/view/data'
+
+# SQL search of SkyServer dr17, the release astroquery.sdss queries by default
+SDSS_SQL_URL = 'https://skyserver.sdss.org/dr17/en/tools/search/x_results.aspx'
+
+# synchronous TAP endpoint of the Gaia archive
+GAIA_TAP_URL = 'https://gea.esac.esa.int/tap-server/tap/sync'
+
+DEFAULT_SERVICE_URLS = {
+    'sdss_spectrum': SDSS_SPECTRUM_URL,
+    'sdss_sql': SDSS_SQL_URL,
+    'gaia_tap': GAIA_TAP_URL,
+}
+
+def _environment_urls():
+    """Returns the default addresses, overridden by GROUP9_<SERVICE>_URL environment variables"""
+    return {service: os.environ.get(f'GROUP9_{service.upper()}_URL', url).rstrip('/')
+            for service, url in DEFAULT_SERVICE_URLS.items()}
+
+_SERVICE_URLS = _environment_urls()
+
+def get_service_url(service):
+    """Returns the address requests to a service are sent to
+
+    Args:
+        service (str): 'sdss_spectrum', 'sdss_sql' or 'gaia_tap'.
+
+    Returns:
+        str
+
+    Raises:
+        KeyError: If the service is unknown
+    """
+    return _SERVICE_URLS[service]
+
+def is_default_service(service):
+    """Returns True if a service has not been pointed away from its public address"""
+    return _SERVICE_URLS[service] == DEFAULT_SERVICE_URLS[service]
+
+def configure_service_urls(**urls):
+    """Changes the address of one or more services
+
+    Without astroquery in the way, the SQL and TAP services are then queried with
+    plain HTTP requests, e.g.
+    configure_service_urls(sdss_spectrum='http://127.0.0.1:8080/spectrum').
+
+    Args:
+        **urls (str): New address of each service to change, None restoring the default.
+
+    Returns:
+        dict: The addresses the changed services had before, which can be passed back
+        to restore them.
+
+    Raises:
+        KeyError: If a service is unknown
+    """
+    unknown = set(urls) - set(_SERVICE_URLS)
+    if unknown:
+        raise KeyError(f"Unknown services: {sorted(unknown)}")
+    previous = {service: _SERVICE_URLS[service] for service in urls}
+    for service, url in urls.items():
+        _SERVICE_URLS[service] = DEFAULT_SERVICE_URLS[service] if url is None else url.rstrip('/')
+    return previous
+
+def reset_service_urls():
+    """Restores the addresses the package started with"""
+    _SERVICE_URLS.update(_environment_urls())
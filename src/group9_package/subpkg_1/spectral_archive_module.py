@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# File       : spectral_archive_module.py
+# Description: Append-Only Memory-Mapped Archive of Full Spectra
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module stores many full spectra, as returned by extract_spectra_full,
+in one flat binary file per column with an offset index keyed by (plate, mjd, fiberid).
+Spectra are read back as DataFrames over memory-mapped views of those files.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.spectrum_batch_module import SpectrumBatch
+
+# columns of extract_spectra_full and the type each one is stored as
+ARCHIVE_COLUMNS = {
+    'FLUX': np.float32, 'LOGLAM': np.float32, 'IVAR': np.float32, 'AND_MASK': np.int32,
+    'OR_MASK': np.int32, 'WDISP': np.float32, 'SKY': np.float32, 'WRESL': np.float32, 'MODEL': np.float32,
+}
+INDEX_FILE = 'index.csv'
+
+class SpectralArchive:
+    """A Class for storing and randomly accessing many spectra in a few memory-mapped files"""
+    def __init__(self, path):
+        """Opens the archive in the given directory, creating it if needed
+
+        Args:
+            path (str): Directory holding the column files and the index.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._index = {}
+        self._size = 0
+        self._maps = {}
+
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as index_file:
+                for line in index_file:
+                    fields = line.strip().split(',')
+                    # skip a partially written last line
+                    if len(fields) != 5 or not all(field.lstrip('-').isdigit() for field in fields):
+                        continue
+                    plate, mjd, fiberid, offset, length = map(int, fields)
+                    self._index[(plate, mjd, fiberid)] = (offset, length)
+                    self._size = max(self._size, offset + length)
+
+    def _column_path(self, column):
+        """Returns the file holding a column"""
+        return os.path.join(self.path, f'{column.lower()}.bin')
+
+    def __len__(self):
+        """Returns the number of spectra in the archive"""
+        return len(self._index)
+
+    def __contains__(self, key):
+        """Checks whether a (plate, mjd, fiberid) key is in the archive"""
+        return tuple(int(value) for value in key) in self._index
+
+    def keys(self):
+        """Returns the (plate, mjd, fiberid) keys in the order they were appended"""
+        return list(self._index)
+
+    def append(self, plate, mjd, fiberid, data):
+        """Appends a full spectrum to the archive
+
+        The column files are written first and the index line last, so a write that is
+        interrupted part way leaves the archive unchanged on the next open.
+
+        Args:
+            plate (int): Plate number of the spectrum.
+            mjd (int): MJD of the observation.
+            fiberid (int): Fiber number of the spectrum.
+            data (pandas.DataFrame): Spectrum with the columns of extract_spectra_full.
+
+        Raises:
+            TypeError: If data is not a DataFrame
+            ValueError: If the key is already archived or a column is missing
+        """
+        if not isinstance(data, pd.DataFrame):
+            raise TypeError('Data is not a Pandas Data Frame')
+
+        key = (int(plate), int(mjd), int(fiberid))
+        if key in self._index:
+            raise ValueError(f"Spectrum {key} is already in the archive")
+
+        columns = {str(column).upper(): column for column in data.columns}
+        missing = [column for column in ARCHIVE_COLUMNS if column not in columns]
+        if missing:
+            raise ValueError(f"The spectrum is missing required columns: {missing}")
+
+        offset, length = self._size, len(data)
+        for column, dtype in ARCHIVE_COLUMNS.items():
+            values = np.ascontiguousarray(data[columns[column]].to_numpy(), dtype=dtype)
+            with open(self._column_path(column), 'r+b' if os.path.exists(self._column_path(column)) else 'wb') as column_file:
+                # drop any bytes left behind by an interrupted append
+                column_file.truncate(offset * np.dtype(dtype).itemsize)
+                column_file.seek(0, os.SEEK_END)
+                column_file.write(values.tobytes())
+
+        with open(os.path.join(self.path, INDEX_FILE), 'a') as index_file:
+            index_file.write(f'{key[0]},{key[1]},{key[2]},{offset},{length}\n')
+
+        self._index[key] = (offset, length)
+        self._size = offset + length
+        # the memory maps no longer cover the whole files
+        self._maps = {}
+
+    def _map(self, column):
+        """Returns a read-only memory map over a column file"""
+        if column not in self._maps:
+            if self._size == 0:
+                # only zero-length spectra so far: the files are empty and cannot be mapped
+                return np.empty(0, dtype=ARCHIVE_COLUMNS[column])
+            self._maps[column] = np.memmap(self._column_path(column), dtype=ARCHIVE_COLUMNS[column],
+                                           mode='r', shape=(self._size,))
+        return self._maps[column]
+
+    def get(self, plate, mjd, fiberid):
+        """Reads one spectrum from the archive without copying it
+
+        Args:
+            plate (int): Plate number of the spectrum.
+            mjd (int): MJD of the observation.
+            fiberid (int): Fiber number of the spectrum.
+
+        Returns:
+            pandas.DataFrame with the columns of extract_spectra_full, whose values are
+            read-only views of the memory-mapped files
+
+        Raises:
+            KeyError: If the spectrum is not in the archive
+        """
+        key = (int(plate), int(mjd), int(fiberid))
+        if key not in self._index:
+            raise KeyError(f"Spectrum {key} is not in the archive")
+
+        offset, length = self._index[key]
+        columns = {column: self._map(column)[offset:offset + length] for column in ARCHIVE_COLUMNS}
+        return pd.DataFrame(columns, copy=False)
+
+    def get_batch(self, keys=None):
+        """Reads several spectra into a SpectrumBatch
+
+        Args:
+            keys (list of tuple, optional): (plate, mjd, fiberid) keys to read.
+                Defaults to every spectrum in the archive.
+
+        Returns:
+            SpectrumBatch holding the spectra in the order of keys
+        """
+        keys = self.keys() if keys is None else [tuple(int(value) for value in key) for key in keys]
+        metadata = pd.DataFrame(keys, columns=['plate', 'mjd', 'fiberid'])
+        return SpectrumBatch.from_dataframes([self.get(*key) for key in keys], metadata=metadata,
+                                             extra_columns=('wdisp', 'sky', 'wresl'))
+
+    def add_row(self, data_row):
+        """Downloads the full spectrum of a table row and archives it if it is not there yet
+
+        Args:
+            data_row (Table.Row): A row with 'plate', 'mjd' and 'fiberid' columns.
+
+        Returns:
+            pandas.DataFrame read back from the archive, or None if the download failed
+        """
+        key = (int(data_row['plate']), int(data_row['mjd']), int(data_row['fiberid']))
+        if key not in self._index:
+            data = SpectraExtract(data_row).extract_spectra_full()
+            if data is None:
+                return None
+            self.append(*key, data)
+        return self.get(*key)
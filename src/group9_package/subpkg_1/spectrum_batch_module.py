@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# File       : spectrum_batch_module.py
+# Description: Compact Container for Many Spectra Backed by Contiguous Arrays
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides SpectrumBatch, a container that stores N full spectra
+as contiguous two dimensional NumPy arrays instead of N pandas DataFrames.
+"""
+
+import numpy as np
+import pandas as pd
+
+# columns of a full (FITS) spectrum kept by a SpectrumBatch and their storage types
+FLOAT_COLUMNS = ('loglam', 'flux', 'ivar', 'model')
+MASK_COLUMNS = ('and_mask', 'or_mask')
+METADATA_COLUMNS = ('plate', 'mjd', 'fiberid')
+
+class SpectrumBatch:
+    """A Class for holding N spectra as padded (N, max_length) float32 and int32 arrays"""
+    def __init__(self, loglam, flux, ivar, model, and_mask, or_mask, lengths=None, metadata=None, extra=None):
+        """Initializes the SpectrumBatch Class
+
+        Shorter spectra are padded at the end, with NaN for float columns and 0 for
+        mask columns; lengths records how many samples of each row are real.
+
+        Args:
+            loglam, flux, ivar, model (array-like): Float arrays of shape (N, max_length).
+            and_mask, or_mask (array-like): Integer arrays of shape (N, max_length).
+            lengths (array-like, optional): Number of valid samples per spectrum.
+                Defaults to max_length for every spectrum.
+            metadata (pandas.DataFrame, optional): One row per spectrum with at least the
+                'plate', 'mjd' and 'fiberid' columns. Defaults to None.
+            extra (dict, optional): Additional float columns (e.g. 'sky', 'wdisp') of shape
+                (N, max_length). Defaults to None.
+
+        Raises:
+            ValueError: If the arrays do not share the same two dimensional shape, or the
+                lengths or metadata do not match the number of spectra
+        """
+        self.loglam = np.asarray(loglam, dtype=np.float32)
+        self.flux = np.asarray(flux, dtype=np.float32)
+        self.ivar = np.asarray(ivar, dtype=np.float32)
+        self.model = np.asarray(model, dtype=np.float32)
+        self.and_mask = np.asarray(and_mask, dtype=np.int32)
+        self.or_mask = np.asarray(or_mask, dtype=np.int32)
+        self.extra = {name: np.asarray(values, dtype=np.float32) for name, values in (extra or {}).items()}
+
+        arrays = [self.loglam, self.flux, self.ivar, self.model, self.and_mask, self.or_mask, *self.extra.values()]
+        if self.loglam.ndim != 2 or any(array.shape != self.loglam.shape for array in arrays):
+            raise ValueError("All spectral arrays must have the same (N, max_length) shape")
+
+        n_spectra, max_length = self.loglam.shape
+        if lengths is None:
+            lengths = np.full(n_spectra, max_length)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        if self.lengths.shape != (n_spectra,) or np.any(self.lengths > max_length):
+            raise ValueError("lengths must hold one value per spectrum, at most max_length")
+
+        if metadata is not None:
+            if not isinstance(metadata, pd.DataFrame) or len(metadata) != n_spectra:
+                raise ValueError("metadata must be a DataFrame with one row per spectrum")
+            missing = [col for col in METADATA_COLUMNS if col not in metadata.columns]
+            if missing:
+                raise ValueError(f"metadata is missing required columns: {missing}")
+            metadata = metadata.reset_index(drop=True)
+        self.metadata = metadata
+        self._key_index = None
+
+    def __len__(self):
+        """Returns the number of spectra in the batch"""
+        return self.loglam.shape[0]
+
+    def __getitem__(self, key):
+        """Selects spectra from the batch
+
+        Integers and slices return views of the underlying arrays, so no spectral
+        data is copied; integer arrays and boolean masks follow NumPy semantics and copy.
+
+        Args:
+            key (int, slice or array-like): Spectra to select.
+
+        Returns:
+            SpectrumBatch holding the selected spectra
+        """
+        if isinstance(key, (int, np.integer)):
+            # keep the two dimensional shape for a single spectrum
+            index = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= index < len(self):
+                raise IndexError("SpectrumBatch index out of range")
+            key = slice(index, index + 1)
+
+        metadata = None
+        if self.metadata is not None:
+            metadata = self.metadata.iloc[key] if isinstance(key, slice) else self.metadata.iloc[np.asarray(key)]
+
+        return SpectrumBatch(self.loglam[key], self.flux[key], self.ivar[key], self.model[key],
+                             self.and_mask[key], self.or_mask[key], lengths=self.lengths[key],
+                             metadata=metadata, extra={name: values[key] for name, values in self.extra.items()})
+
+    @property
+    def nbytes(self):
+        """Total number of bytes used by the spectral arrays"""
+        arrays = [self.loglam, self.flux, self.ivar, self.model, self.and_mask, self.or_mask, *self.extra.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def index_of(self, plate, mjd, fiberid):
+        """Finds the position of a spectrum from its plate, mjd and fiberid
+
+        Args:
+            plate (int): Plate number of the spectrum.
+            mjd (int): MJD of the observation.
+            fiberid (int): Fiber number of the spectrum.
+
+        Returns:
+            int, the position of the spectrum in the batch
+
+        Raises:
+            ValueError: If the batch has no metadata
+            KeyError: If no spectrum has the given identifiers
+        """
+        if self.metadata is None:
+            raise ValueError("Batch has no metadata to look up spectra")
+
+        # built once on first use
+        if self._key_index is None:
+            keys = zip(*(self.metadata[col].to_numpy().tolist() for col in METADATA_COLUMNS))
+            self._key_index = {key: i for i, key in enumerate(keys)}
+        return self._key_index[(int(plate), int(mjd), int(fiberid))]
+
+    @classmethod
+    def from_dataframes(cls, frames, metadata=None, extra_columns=()):
+        """Stacks full spectra DataFrames, as returned by extract_spectra_full, into a batch
+
+        Column names are matched case-insensitively, so both the upper case FITS names
+        and the lower case names used by WavelengthAlignment are accepted.
+
+        Args:
+            frames (list of pandas.DataFrame): Spectra with at least the loglam, flux, ivar,
+                model, and_mask and or_mask columns.
+            metadata (pandas.DataFrame or astropy.table.Table, optional): One row per spectrum
+                with 'plate', 'mjd' and 'fiberid'. Defaults to None.
+            extra_columns (sequence of str, optional): Additional float columns to keep,
+                e.g. ('wdisp', 'sky'). Defaults to ().
+
+        Returns:
+            SpectrumBatch holding the stacked spectra
+
+        Raises:
+            ValueError: If no spectra are given or a spectrum is missing a required column
+        """
+        frames = list(frames)
+        if not frames:
+            raise ValueError("At least one spectrum is needed to build a batch")
+
+        float_columns = FLOAT_COLUMNS + tuple(column.lower() for column in extra_columns)
+        lengths = np.array([len(frame) for frame in frames], dtype=np.int64)
+        shape = (len(frames), int(lengths.max()))
+
+        stacked = {name: np.full(shape, np.nan, dtype=np.float32) for name in float_columns}
+        stacked.update({name: np.zeros(shape, dtype=np.int32) for name in MASK_COLUMNS})
+
+        for i, frame in enumerate(frames):
+            columns = {str(column).lower(): column for column in frame.columns}
+            missing = [name for name in stacked if name not in columns]
+            if missing:
+                raise ValueError(f"Spectrum {i} is missing required columns: {missing}")
+            for name, array in stacked.items():
+                array[i, :lengths[i]] = frame[columns[name]].to_numpy()
+
+        if metadata is not None and not isinstance(metadata, pd.DataFrame):
+            metadata = metadata.to_pandas()
+
+        extra = {name: stacked.pop(name) for name in float_columns[len(FLOAT_COLUMNS):]}
+        return cls(**stacked, lengths=lengths, metadata=metadata, extra=extra)
+
+    def to_dataframe(self, index, uppercase=True):
+        """Converts one spectrum of the batch to a DataFrame without copying
+
+        Args:
+            index (int): Position of the spectrum in the batch.
+            uppercase (bool, optional): If True, use the upper case FITS column names of
+                extract_spectra_full, otherwise the lower case names. Defaults to True.
+
+        Returns:
+            pandas.DataFrame whose columns are views of the batch arrays
+        """
+        length = self.lengths[index]
+        columns = {name: getattr(self, name)[index, :length] for name in FLOAT_COLUMNS + MASK_COLUMNS}
+        columns.update({name: values[index, :length] for name, values in self.extra.items()})
+        if uppercase:
+            columns = {name.upper(): values for name, values in columns.items()}
+        return pd.DataFrame(columns, copy=False)
+
+    def to_dataframes(self, uppercase=True):
+        """Converts every spectrum of the batch to a DataFrame without copying
+
+        Args:
+            uppercase (bool, optional): If True, use the upper case FITS column names.
+                Defaults to True.
+
+        Returns:
+            list of pandas.DataFrame, one per spectrum
+        """
+        return [self.to_dataframe(i, uppercase=uppercase) for i in range(len(self))]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# File       : spectrum_store_module.py
+# Description: Shared Memory and Disk Cache of Downloaded Spectra
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides SpectrumStore, a cache of downloaded spectra shared by
+every SpectralVisualizer. Spectra are kept in a bounded in-memory LRU and,
+optionally, as CSV files on disk, so an object is downloaded at most once; tables
+of rows can be prefetched in the background while earlier rows are being viewed.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.dtype_policy_module import as_float
+from group9_package.subpkg_1.instrumentation_module import count
+
+class SpectrumStore:
+    """A Class for caching spectra in memory and on disk, with background prefetching"""
+    def __init__(self, cache_dir=None, max_items=128, max_workers=4, full=False):
+        """Initializes the SpectrumStore Class
+
+        Args:
+            cache_dir (str, optional): Directory of the on-disk cache. Files are named like
+                the output of BulkSpectraDownloader, so a bulk download directory can be
+                used as a cache. Defaults to None (memory only).
+            max_items (int, optional): Number of spectra kept in memory. Defaults to 128.
+            max_workers (int, optional): Number of background downloads. Defaults to 4.
+            full (bool, optional): If True, store full spectra from extract_spectra_full.
+                Defaults to False.
+
+        Raises:
+            ValueError: If max_items or max_workers are not positive
+        """
+        if max_items < 1 or max_workers < 1:
+            raise ValueError("max_items and max_workers must be positive")
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.full = full
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'downloads': 0}
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._started = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _key(row):
+        """Returns the (plate, mjd, fiberid) key of a row"""
+        if not isinstance(row, Table.Row):
+            raise TypeError("The input must be an astropy.table.Row")
+        return int(row['plate']), int(row['mjd']), int(row['fiberid'])
+
+    def _path(self, key):
+        """Returns the cache file of a spectrum"""
+        kind = 'spec-full' if self.full else 'spec'
+        return os.path.join(self.cache_dir, f'{kind}-{key[0]}-{key[1]}-{key[2]}.csv')
+
+    def _claim(self, key):
+        """Returns the cached spectrum, or the future that will hold it, registering one if needed"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                count('spectrum_store_memory_hits')
+                return self._memory[key], None, False
+            if key in self._pending:
+                return None, self._pending[key], False
+            future = self._pending[key] = Future()
+            return None, future, True
+
+    def _load(self, key, row, future):
+        """Reads a spectrum from disk or downloads it, unless another thread already started to"""
+        with self._lock:
+            started = key in self._started or future.done()
+            self._started.add(key)
+        if started:
+            return future.result()
+
+        try:
+            data = None
+            path = self._path(key) if self.cache_dir is not None else None
+            if path is not None and os.path.exists(path):
+                data = as_float(pd.read_csv(path))
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                count('spectrum_store_disk_hits')
+            else:
+                extractor = SpectraExtract(row)
+                data = extractor.extract_spectra_full() if self.full else extractor.extract_spectra()
+                with self._lock:
+                    self.stats['downloads'] += 1
+                count('spectrum_store_downloads')
+                if data is not None and path is not None:
+                    # write then rename, so a crash never leaves a partial spectrum
+                    data.to_csv(path + '.tmp', index=False)
+                    os.replace(path + '.tmp', path)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._started.discard(key)
+                future.set_exception(e)
+            raise
+
+        with self._lock:
+            # failed downloads are not cached, so they are retried next time
+            if data is not None:
+                self._memory[key] = data
+                while len(self._memory) > self.max_items:
+                    self._memory.popitem(last=False)
+            self._pending.pop(key, None)
+            self._started.discard(key)
+            future.set_result(data)
+        return data
+
+    def get(self, row):
+        """Returns the spectrum of a row, from memory, disk or the SDSS server in that order
+
+        The returned DataFrame is shared with the cache and should not be modified;
+        SpectralVisualizer works on a copy.
+
+        Args:
+            row (Table.Row): Row with 'plate', 'mjd' and 'fiberid' columns.
+
+        Returns:
+            DataFrame: The spectrum, or None if it could not be downloaded.
+
+        Raises:
+            TypeError: If row is not an astropy.table.Row
+        """
+        key = self._key(row)
+        data, future, _ = self._claim(key)
+        if future is None:
+            return data
+        # also takes over a prefetch that is still queued, instead of waiting behind others
+        return self._load(key, row, future)
+
+    def prefetch(self, rows):
+        """Starts downloading spectra in the background, in the given order
+
+        Args:
+            rows (iterable of Table.Row): Rows to fetch, e.g. an Astropy Table.
+
+        Returns:
+            int: The number of spectra that were neither cached nor already requested.
+        """
+        started = 0
+        for row in rows:
+            key = self._key(row)
+            _, future, new = self._claim(key)
+            if new:
+                self._pool.submit(self._load, key, row, future)
+                started += 1
+        return started
+
+    def __contains__(self, row):
+        """Returns True if the spectrum of a row is in memory or on disk"""
+        key = self._key(row)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self.cache_dir is not None and os.path.exists(self._path(key))
+
+    def clear(self):
+        """Empties the in-memory cache; files on disk are kept"""
+        with self._lock:
+            self._memory.clear()
+
+    def close(self):
+        """Stops the background downloads that have not started yet"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# store shared by every SpectralVisualizer that is not given its own
+_DEFAULT_STORE = SpectrumStore()
+
+def get_spectrum_store():
+    """Returns the store shared by default by every SpectralVisualizer"""
+    return _DEFAULT_STORE
+
+def configure_spectrum_store(cache_dir=None, max_items=128, max_workers=4, full=False):
+    """Replaces the shared store, e.g. to add an on-disk cache
+
+    Args:
+        cache_dir (str, optional): Directory of the on-disk cache. Defaults to None.
+        max_items (int, optional): Number of spectra kept in memory. Defaults to 128.
+        max_workers (int, optional): Number of background downloads. Defaults to 4.
+        full (bool, optional): If True, store full spectra from extract_spectra_full.
+            Defaults to False.
+
+    Returns:
+        SpectrumStore: The new shared store.
+    """
+    global _DEFAULT_STORE
+    _DEFAULT_STORE.close()
+    _DEFAULT_STORE = SpectrumStore(cache_dir=cache_dir, max_items=max_items, max_workers=max_workers,
+                                   full=full)
+    return _DEFAULT_STORE
@@ -8,18 +8,96 @@ Module for visualizing spectral data, providing tools to graphically represent
 spectra extracted from astronomical observations.
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+from group9_package.subpkg_1.spectrum_batch_module import SpectrumBatch
+from group9_package.subpkg_1.spectrum_store_module import get_spectrum_store
 from astropy.table import Table
 
+# matplotlib is imported when the first plot is drawn
+plt = LazyImport('matplotlib.pyplot')
+Figure = LazyImport('matplotlib.figure', 'Figure')
+FigureCanvasAgg = LazyImport('matplotlib.backends.backend_agg', 'FigureCanvasAgg')
+LineCollection = LazyImport('matplotlib.collections', 'LineCollection')
+
+# figure, axes and line reused by every plot rendered in this process, keyed by (size, dpi)
+_RENDER_FIGURES = {}
+
+def decimate_minmax(x, y, n_bins):
+    """Downsamples a curve to the minimum and maximum of every pixel column
+
+    The x range is split into n_bins equal bins, one per horizontal pixel, and only
+    the lowest and highest point of each bin are kept, in their original order. The
+    drawn line then covers exactly the same pixels as the full curve, so narrow peaks
+    and emission lines survive while at most 2 * n_bins vertices are drawn.
+
+    Points where x or y is not finite, e.g. outliers removed as NaN, are dropped.
+    Descending x is decimated like ascending x, and x in no order is returned
+    without decimation, as its bins would not be contiguous.
+
+    Args:
+        x (array-like): Sorted x values, e.g. wavelengths.
+        y (array-like): y values, e.g. fluxes.
+        n_bins (int): Number of bins, usually the plot width in pixels.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): The decimated x and y values.
+
+    Raises:
+        ValueError: If x and y have different lengths or n_bins is not positive
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.shape != y.shape or x.ndim != 1:
+        raise ValueError("x and y must be one dimensional arrays of the same length")
+    if n_bins < 1:
+        raise ValueError("n_bins must be positive")
+    if len(x) <= 2 * n_bins:
+        return x, y
+
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+        if len(x) <= 2 * n_bins:
+            return x, y
+
+    steps = np.diff(x)
+    if np.all(steps <= 0):
+        x_dec, y_dec = decimate_minmax(x[::-1], y[::-1], n_bins)
+        return x_dec[::-1], y_dec[::-1]
+    if not np.all(steps >= 0):
+        return x, y
+
+    low = np.nanmin(x)
+    span = np.nanmax(x) - low
+    if span > 0:
+        bins = np.minimum(((x - low) * (n_bins / span)).astype(np.int64), n_bins - 1)
+    else:
+        bins = np.zeros(len(x), dtype=np.int64)
+
+    # x is sorted, so every bin is a contiguous segment starting at the first change of bin
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    counts = np.diff(np.r_[starts, len(x)])
+
+    keep = [starts[[0]], [len(x) - 1]]
+    for extreme in (np.fmin, np.fmax):
+        # index of the first point of each segment that equals the segment extreme
+        candidates = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), counts))
+        segment = bins[candidates]
+        keep.append(candidates[np.r_[True, segment[1:] != segment[:-1]]])
+
+    index = np.unique(np.concatenate(keep))
+    return x[index], y[index]
+
 class SpectralVisualizer:
     """
     Class for visualizing spectral data either from a provided data frame 
     or by extracting spectral data given a row of astronomical data.
     """
-    def __init__(self, *, row=None, data=None):
+    def __init__(self, *, row=None, data=None, store=None):
         """Initializes the SpectralVisualizer Class with either a single row of 
         astronomical data or a pre-processed data frame.
 
@@ -28,6 +106,8 @@ class SpectralVisualizer:
                 Defaults to None.
             data (pandas.DataFrame, optional): A pre-processed DataFrame containing spectral data. 
                 Defaults to None.
+            store (SpectrumStore, optional): Cache the spectrum of row is read from and
+                saved to. Defaults to None (the shared store of get_spectrum_store()).
 
         Raises:
             TypeError: If the types of the provided arguments are incorrect.
@@ -41,16 +121,38 @@ class SpectralVisualizer:
 
         self.row = row
         self.data = data if data is not None else pd.DataFrame()  # Initialize data attribute
+        self.store = store
+
+    @classmethod
+    def browse(cls, table, store=None):
+        """Creates one visualizer per row of a table and prefetches their spectra in the background
 
-    def visualize(self):
+        Args:
+            table (astropy.table.Table): Rows with 'plate', 'mjd' and 'fiberid' columns.
+            store (SpectrumStore, optional): Cache to use. Defaults to None (the shared store).
+
+        Returns:
+            list of SpectralVisualizer, in the order of the table
+        """
+        (store or get_spectrum_store()).prefetch(table)
+        return [cls(row=row, store=store) for row in table]
+
+    def visualize(self, decimate=True):
         """Visualizes the spectral data by plotting the flux against the wavelength.
 
+        Args:
+            decimate (bool, optional): If True, spectra with more samples than twice the
+                figure width in pixels are reduced with decimate_minmax before plotting,
+                which looks the same but draws far fewer vertices. Defaults to True.
+
         Raises:
             ValueError: If both 'data' and 'row' are None or empty, indicating there is no valid data to visualize.
         """
         if self.data.empty and self.row is not None:
-            spectra_extractor = SpectraExtract(self.row)
-            self.data = spectra_extractor.extract_spectra()
+            # downloaded at most once across visualizers, through the spectrum store; the
+            # copy keeps changes to self.data out of the cache other visualizers read
+            data = (self.store or get_spectrum_store()).get(self.row)
+            self.data = data.copy() if data is not None else None
 
         if self.data is None:
             raise ValueError("Both 'data' and 'row' are None or empty. Provide either 'data' or 'row' with valid data.")
@@ -59,10 +161,370 @@ class SpectralVisualizer:
         x = self.data['Wavelength']
         y = self.data['Flux']
 
-        plt.figure()
+        fig = plt.figure()
+
+        if decimate:
+            x, y = decimate_minmax(x, y, int(fig.get_figwidth() * fig.dpi))
 
         plt.plot(x, y)
         plt.xlabel('Wavelength')
         plt.ylabel('Flux')
         plt.title('Spectral Visualization')
         plt.show()
+
+class MultiSpectralVisualizer:
+    """
+    Class for visualizing many spectra at once, either overlaid as a single line
+    collection or stacked into an (N x wavelength) heatmap drawn as one image.
+    """
+    def __init__(self, spectra, wavelength=None):
+        """Initializes the MultiSpectralVisualizer Class
+
+        Args:
+            spectra: One of
+                - a SpectrumBatch, plotted against 10 ** loglam;
+                - a list of DataFrames, e.g. WavelengthAlignment.WavelengthAlign outputs,
+                  with 'flux' and either 'loglam' or 'wavelength' columns (any case);
+                - an (N, L) array of fluxes.
+            wavelength (array-like, optional): Wavelengths of the L columns when spectra is
+                an array. Defaults to None (pixel index).
+
+        Raises:
+            TypeError: If spectra is not one of the supported inputs.
+            ValueError: If there are no spectra, a DataFrame lacks the required columns or
+                wavelength does not match the number of columns.
+        """
+        if isinstance(spectra, SpectrumBatch):
+            self.flux = spectra.flux
+            self.wavelength = np.power(np.float32(10), spectra.loglam)
+        elif isinstance(spectra, (list, tuple)) and spectra and all(isinstance(frame, pd.DataFrame) for frame in spectra):
+            self.wavelength, self.flux = self._stack_frames(spectra)
+        elif isinstance(spectra, (np.ndarray, list, tuple)):
+            self.flux = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+            if self.flux.ndim != 2:
+                raise TypeError("Flux arrays must be two dimensional (N, L)")
+            self.wavelength = np.arange(self.flux.shape[1], dtype=np.float64) if wavelength is None else np.asarray(wavelength, dtype=np.float64)
+            if self.wavelength.shape != (self.flux.shape[1],):
+                raise ValueError("wavelength must hold one value per flux column")
+        else:
+            raise TypeError("spectra must be a SpectrumBatch, a list of DataFrames or an (N, L) array")
+
+        if self.flux.size == 0:
+            raise ValueError("There are no spectra to visualize")
+
+    @staticmethod
+    def _stack_frames(frames):
+        """Stacks DataFrames into NaN padded (N, L) wavelength and flux arrays"""
+        length = max(len(frame) for frame in frames)
+        wavelength = np.full((len(frames), length), np.nan)
+        flux = np.full((len(frames), length), np.nan)
+        for i, frame in enumerate(frames):
+            columns = {col.lower(): col for col in frame.columns}
+            if 'flux' not in columns or not ({'loglam', 'wavelength'} & set(columns)):
+                raise ValueError("DataFrames must have 'flux' and 'loglam' or 'wavelength' columns")
+            if 'wavelength' in columns:
+                wavelength[i, :len(frame)] = frame[columns['wavelength']].to_numpy()
+            else:
+                wavelength[i, :len(frame)] = 10 ** frame[columns['loglam']].to_numpy()
+            flux[i, :len(frame)] = frame[columns['flux']].to_numpy()
+        return wavelength, flux
+
+    def common_grid(self):
+        """Returns the spectra on one shared wavelength grid
+
+        Aligned spectra are returned as they are; otherwise every spectrum is linearly
+        interpolated onto an evenly spaced grid covering all of them, with NaN where a
+        spectrum has no data.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): The (L,) grid and the (N, L) fluxes.
+        """
+        if self.wavelength.ndim == 1:
+            return self.wavelength, self.flux
+        if np.all((self.wavelength == self.wavelength[0]) | np.isnan(self.wavelength)):
+            return self.wavelength[0], self.flux
+
+        grid = np.linspace(np.nanmin(self.wavelength), np.nanmax(self.wavelength), self.flux.shape[1])
+        flux = np.full((self.flux.shape[0], grid.size), np.nan)
+        for i, (x, y) in enumerate(zip(self.wavelength, self.flux)):
+            valid = ~np.isnan(x)
+            if valid.any():
+                flux[i] = np.interp(grid, x[valid], y[valid], left=np.nan, right=np.nan)
+        return grid, flux
+
+    def _color_limits(self, values, percentiles):
+        """Estimates colour limits on a subsample; exact percentiles of 10^7 values are slow"""
+        sample = values.ravel()[::max(1, values.size // 1000000)]
+        if not np.isfinite(sample).any():
+            return None, None
+        return tuple(np.nanpercentile(sample, percentiles))
+
+    def overlay(self, ax=None, decimate=True, alpha=0.3, linewidth=0.5, max_lines=500):
+        """Overlays every spectrum, as one artist whatever the number of spectra
+
+        Up to max_lines spectra are drawn as a single LineCollection. Beyond that, lines
+        would take minutes to draw, so the overlay is rendered as a density image instead:
+        the number of samples falling in every pixel, on a logarithmic colour scale.
+
+        Args:
+            ax (matplotlib.axes.Axes, optional): Axes to draw on. Defaults to None (a new
+                figure, shown with plt.show()).
+            decimate (bool, optional): If True, reduce each line with decimate_minmax to
+                the axes width. Defaults to True.
+            alpha (float, optional): Opacity of the lines. Defaults to 0.3.
+            linewidth (float, optional): Width of the lines. Defaults to 0.5.
+            max_lines (int, optional): Largest number of spectra drawn as lines.
+                Defaults to 500.
+
+        Returns:
+            matplotlib.collections.LineCollection or matplotlib.image.AxesImage: The drawn artist.
+
+        Raises:
+            ValueError: If the density image is drawn and no sample has a finite wavelength and flux
+        """
+        show = ax is None
+        if show:
+            plt.figure()
+            ax = plt.gca()
+        width, height = ax.figure.get_size_inches() * ax.figure.dpi
+        n_spectra = self.flux.shape[0]
+        wavelength = np.broadcast_to(self.wavelength, self.flux.shape)
+
+        if n_spectra <= max_lines:
+            segments = []
+            for x, y in zip(wavelength, self.flux):
+                valid = ~(np.isnan(x) | np.isnan(y))
+                x, y = x[valid], y[valid]
+                if decimate and len(x):
+                    x, y = decimate_minmax(x, y, int(width))
+                segments.append(np.column_stack([x, y]))
+
+            artist = LineCollection(segments, alpha=alpha, linewidths=linewidth)
+            ax.add_collection(artist)
+            ax.autoscale_view()
+        else:
+            x, y = wavelength.ravel(), self.flux.ravel()
+            valid = np.isfinite(x) & np.isfinite(y)
+            if not valid.any():
+                if show:
+                    plt.close(ax.figure)
+                raise ValueError("None of the spectra has a sample with finite wavelength and flux")
+            x, y = x[valid], y[valid]
+            x_range = (x.min(), x.max())
+            y_range = self._color_limits(y, (0.5, 99.5))
+            # count the samples per pixel with one bincount instead of histogram2d
+            cols, rows = int(width), int(height)
+            i = np.clip(((x - x_range[0]) * (cols / max(x_range[1] - x_range[0], 1e-12))).astype(np.int64), 0, cols - 1)
+            j = np.clip(((y - y_range[0]) * (rows / max(y_range[1] - y_range[0], 1e-12))).astype(np.int64), 0, rows - 1)
+            counts = np.bincount(j * cols + i, minlength=rows * cols).reshape(rows, cols)
+
+            artist = ax.imshow(np.log1p(counts), aspect='auto', origin='lower', cmap='magma',
+                               extent=(x_range[0], x_range[1], y_range[0], y_range[1]))
+
+        ax.set_xlabel('Wavelength')
+        ax.set_ylabel('Flux')
+        ax.set_title(f'Overlay of {n_spectra} Spectra')
+        if show:
+            plt.show()
+        return artist
+
+    @staticmethod
+    def _block_mean(values, shape):
+        """Averages an (N, L) array over blocks so that it is at most shape, ignoring NaN"""
+        factors = [max(1, -(-size // limit)) for size, limit in zip(values.shape, shape)]
+        if factors == [1, 1]:
+            return values
+        rows, cols = (-(-size // factor) for size, factor in zip(values.shape, factors))
+        padded = np.full((rows * factors[0], cols * factors[1]), np.nan, dtype=np.float64)
+        padded[:values.shape[0], :values.shape[1]] = values
+        blocks = padded.reshape(rows, factors[0], cols, factors[1])
+        counts = np.sum(~np.isnan(blocks), axis=(1, 3))
+        sums = np.nansum(blocks, axis=(1, 3))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def heatmap(self, ax=None, cmap='viridis', percentiles=(1, 99), max_shape=(2048, 2048)):
+        """Renders the spectra as an (N x wavelength) image, one row per spectrum
+
+        Args:
+            ax (matplotlib.axes.Axes, optional): Axes to draw on. Defaults to None (a new
+                figure, shown with plt.show()).
+            cmap (str, optional): Matplotlib colormap. Defaults to 'viridis'.
+            percentiles (tuple, optional): Flux percentiles mapped to the ends of the
+                colormap, so a few outliers do not wash out the image. Defaults to (1, 99).
+            max_shape (tuple, optional): Largest (rows, columns) image drawn; bigger inputs
+                are averaged over blocks first, which keeps redraws interactive. None draws
+                every sample. Defaults to (2048, 2048).
+
+        Returns:
+            matplotlib.image.AxesImage: The drawn image.
+        """
+        show = ax is None
+        if show:
+            plt.figure()
+            ax = plt.gca()
+
+        grid, flux = self.common_grid()
+        n_spectra = flux.shape[0]
+        if max_shape is not None:
+            flux = self._block_mean(flux, max_shape)
+        vmin, vmax = self._color_limits(flux, percentiles)
+
+        image = ax.imshow(flux, aspect='auto', origin='upper', cmap=cmap, vmin=vmin, vmax=vmax,
+                          interpolation='antialiased', extent=(grid[0], grid[-1], n_spectra, 0))
+        ax.figure.colorbar(image, ax=ax, label='Flux')
+        ax.set_xlabel('Wavelength')
+        ax.set_ylabel('Spectrum')
+        ax.set_title(f'Heatmap of {n_spectra} Spectra')
+        if show:
+            plt.show()
+        return image
+
+def _render_figure(size, dpi):
+    """Returns the figure, axes and line of this process for a figure size, creating them once"""
+    key = (tuple(size), dpi)
+    if key not in _RENDER_FIGURES:
+        # a bare Agg figure needs no GUI and is never registered with pyplot
+        fig = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        line, = ax.plot([], [], linewidth=0.8)
+        ax.set_xlabel('Wavelength')
+        ax.set_ylabel('Flux')
+        _RENDER_FIGURES[key] = (fig, ax, line)
+    return _RENDER_FIGURES[key]
+
+def _file_name(name):
+    """Returns the image file name of a spectrum, which stays inside the output directory
+
+    Raises:
+        ValueError: If the name is empty, '.' or '..'
+    """
+    # path separators would write outside of output_dir, or into missing directories
+    for separator in {'/', '\\', os.sep, os.altsep, '\0'} - {None}:
+        name = name.replace(separator, '_')
+    if name in ('', '.', '..'):
+        raise ValueError(f"Invalid image name: {name!r}")
+    return name
+
+def _unique_file_names(names):
+    """Returns the image file name of every spectrum, adding -1, -2... to the names that
+    collide once sanitised, such as 'a/b' and 'a_b'
+
+    Invalid names are returned as they are, for _file_name to reject when rendering.
+    """
+    files, used = [], set()
+    for name in names:
+        try:
+            file = unique = _file_name(name)
+        except ValueError:
+            files.append(name)
+            continue
+        # compared without case, as on the file systems of macOS and Windows
+        suffix = 0
+        while unique.casefold() in used:
+            suffix += 1
+            unique = f'{file}-{suffix}'
+        used.add(unique.casefold())
+        files.append(unique)
+    return files
+
+def _render_chunk(items, output_dir, fmt, size, dpi, decimate):
+    """Worker entry point: renders (name, file name, wavelength, flux) items and returns their manifest records"""
+    fig, ax, line = _render_figure(size, dpi)
+    records = []
+    for name, file, x, y in items:
+        try:
+            path = os.path.join(output_dir, f'{_file_name(file)}.{fmt}')
+            if x is None:
+                raise ValueError("spectra must be DataFrames with 'Wavelength' and 'Flux' columns")
+            if decimate:
+                x, y = decimate_minmax(x, y, int(size[0] * dpi))
+            line.set_data(x, y)
+            ax.relim()
+            ax.autoscale_view()
+            ax.set_title(name)
+            fig.savefig(path, format=fmt)
+            records.append({'name': name, 'file': path, 'points': len(x), 'status': 'done', 'error': None})
+        except Exception as e:
+            records.append({'name': name, 'file': None, 'points': 0, 'status': 'failed', 'error': f"{type(e).__name__}: {e}"})
+    return records
+
+class BatchSpectralRenderer:
+    """A Class for rendering many spectra to image files without a display, in parallel"""
+    def __init__(self, output_dir, fmt='png', size=(4, 3), dpi=100, processes=None, chunks_per_process=4, decimate=True):
+        """Initializes the BatchSpectralRenderer Class
+
+        Args:
+            output_dir (str): Directory where the images and manifest.csv are written.
+            fmt (str, optional): 'png' or 'svg'. Defaults to 'png'.
+            size (tuple, optional): Figure size in inches. Defaults to (4, 3).
+            dpi (int, optional): Resolution of the images. Defaults to 100.
+            processes (int, optional): Number of worker processes. Values below 2 render in
+                the calling process. Defaults to os.cpu_count().
+            chunks_per_process (int, optional): Number of chunks each worker receives on
+                average. Defaults to 4.
+            decimate (bool, optional): If True, reduce each spectrum with decimate_minmax to
+                the image width before drawing. Defaults to True.
+
+        Raises:
+            ValueError: If the format is not supported or chunks_per_process is not positive
+        """
+        if fmt not in ('png', 'svg'):
+            raise ValueError("fmt must be 'png' or 'svg'")
+        if chunks_per_process < 1:
+            raise ValueError("chunks_per_process must be a positive integer")
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.size = tuple(size)
+        self.dpi = dpi
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunks_per_process = chunks_per_process
+        self.decimate = decimate
+
+    def render(self, spectra):
+        """Renders one image per spectrum and writes a manifest of the results
+
+        Every process draws all of its spectra on a single reused figure. Spectra that
+        cannot be drawn are recorded as failed instead of stopping the batch.
+
+        Args:
+            spectra (dict or iterable of (str, pandas.DataFrame)): Spectra with
+                'Wavelength' and 'Flux' columns, keyed by the name of their image file.
+                Path separators in names are replaced by '_', so every image is written
+                in output_dir, and the names '', '.' and '..' are recorded as failed.
+                Names that would then share a file are given -1, -2... suffixes in order.
+
+        Returns:
+            pandas.DataFrame: The manifest, with the name, file, number of drawn points,
+            status and error of every spectrum, also written to manifest.csv.
+        """
+        items = list(spectra.items()) if isinstance(spectra, dict) else list(spectra)
+
+        # file names are made unique here, as spectra sharing one may go to different workers
+        files = _unique_file_names([str(name) for name, _ in items])
+
+        # only the two plotted columns are sent to the workers
+        payload = []
+        for (name, data), file in zip(items, files):
+            if isinstance(data, pd.DataFrame) and {'Wavelength', 'Flux'} <= set(data.columns):
+                payload.append((str(name), file, data['Wavelength'].to_numpy(), data['Flux'].to_numpy()))
+            else:
+                payload.append((str(name), file, None, None))
+
+        settings = (self.output_dir, self.fmt, self.size, self.dpi, self.decimate)
+        if self.processes < 2 or len(payload) < 2:
+            records = _render_chunk(payload, *settings)
+        else:
+            n_chunks = min(len(payload), self.processes * self.chunks_per_process)
+            bounds = np.linspace(0, len(payload), n_chunks + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=min(self.processes, n_chunks)) as pool:
+                futures = [pool.submit(_render_chunk, payload[start:end], *settings)
+                           for start, end in zip(bounds[:-1], bounds[1:])]
+                records = [record for future in futures for record in future.result()]
+
+        manifest = pd.DataFrame(records, columns=['name', 'file', 'points', 'status', 'error'])
+        manifest.to_csv(os.path.join(self.output_dir, 'manifest.csv'), index=False)
+        return manifest
@@ -1,7 +1,13 @@
-from astroquery.gaia import Gaia
+import io
 import pandas as pd
-import requests
-import astropy
+from group9_package.subpkg_1.instrumentation_module import stage
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+from group9_package.subpkg_1.rate_limiter_module import get_rate_limiter
+from group9_package.subpkg_1.service_urls_module import get_service_url, is_default_service
+
+# astroquery.gaia is imported by the first cross-match
+Gaia = LazyImport('astroquery.gaia', 'Gaia')
+requests = LazyImport('requests')
 
 import ssl
 # must fix ssl error
@@ -11,6 +17,48 @@ class CrossMatchingModule:
     def __init__(self):
         pass
 
+    @staticmethod
+    def _cross_match_query(angular_distance_max, sourceid):
+        """Validates the cross-match inputs and builds the Gaia query
+
+        Returns:
+            tuple: The angular distance as a float and the ADQL query.
+
+        Raises:
+            TypeError: If an input is None
+            ValueError: If the angular distance is negative
+        """
+        # Ensure there are inputs
+        if angular_distance_max is None or sourceid is None:
+            raise TypeError("Input values cannot be None")
+
+        # Convert inputs to integers and validate
+        angular_distance_max = float(angular_distance_max)
+        sourceid = int(sourceid)
+
+        if angular_distance_max < 0:
+            raise ValueError("Angular distance must be a non-negative integer")
+
+        query = f"SELECT original_ext_source_id, angular_distance FROM gaiadr3.sdssdr13_best_neighbour WHERE source_id = {sourceid}"
+        return angular_distance_max, query
+
+    @staticmethod
+    def _launch_job(query):
+        """Runs an ADQL query on the configured Gaia archive
+
+        The public archive is queried through astroquery.gaia; any other 'gaia_tap'
+        service (e.g. a LocalSDSSService) with a plain HTTP request.
+
+        Returns:
+            pandas.DataFrame: The result of the query.
+        """
+        if is_default_service('gaia_tap'):
+            return Gaia.launch_job(query).get_results().to_pandas()
+        response = requests.get(get_service_url('gaia_tap'),
+                                params={'REQUEST': 'doQuery', 'LANG': 'ADQL', 'FORMAT': 'csv', 'QUERY': query})
+        response.raise_for_status()
+        return pd.read_csv(io.StringIO(response.text))
+
     def cross_match(self, angular_distance_max, sourceid):
         """
         Performs a cross-match query between Gaia and SDSS data, filtering the results 
@@ -44,21 +92,10 @@ class CrossMatchingModule:
         """
 
         try:
-            # Ensure there are inputs
-            if angular_distance_max is None or sourceid is None:
-                raise TypeError("Input values cannot be None")
-
-            # Convert inputs to integers and validate
-            angular_distance_max = float(angular_distance_max)
-            sourceid = int(sourceid)
-
-            if angular_distance_max < 0:
-                raise ValueError("Angular distance must be a non-negative integer")
-
-            query = f"SELECT original_ext_source_id, angular_distance FROM gaiadr3.sdssdr13_best_neighbour WHERE source_id = {sourceid}"
-            job = Gaia.launch_job(query)
-            results = job.get_results()
-            df = results.to_pandas()
+            angular_distance_max, query = self._cross_match_query(angular_distance_max, sourceid)
+            get_rate_limiter('gaia').acquire()
+            with stage('cross_match.query'):
+                df = self._launch_job(query)
             pure_df = df[df['angular_distance'] <= angular_distance_max]
             return pure_df
 
@@ -74,3 +111,29 @@ class CrossMatchingModule:
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
 
+    async def cross_match_async(self, angular_distance_max, sourceid, client):
+        """
+        Asyncio counterpart of cross_match, which runs the Gaia query through an
+        AsyncSpectraClient so many cross-matches can share one event loop.
+
+        Args:
+            angular_distance_max (float): The maximum angular distance in arcsec.
+            sourceid (int): The Gaia source ID for which the cross-match is to be performed.
+            client (AsyncSpectraClient): An open client, i.e. inside 'async with'.
+
+        Returns:
+            pandas.DataFrame: The 'original_ext_source_id' and 'angular_distance' of the
+                            SDSS matches within the given angular distance.
+
+        Raises:
+            TypeError, ValueError: If the inputs are invalid
+            RemoteServiceError: If the Gaia archive cannot be reached
+
+        Example:
+            async with AsyncSpectraClient() as client:
+                result_dataframe = await CrossMatchingModule().cross_match_async(10, 6279435494640163584, client)
+        """
+        angular_distance_max, query = self._cross_match_query(angular_distance_max, sourceid)
+        results = await client.tap_query(query)
+        df = results.to_pandas()
+        return df[df['angular_distance'] <= angular_distance_max]
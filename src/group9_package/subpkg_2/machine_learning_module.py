@@ -9,10 +9,144 @@ on its spectral data
 """
 
 from astropy.table import Table
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import confusion_matrix
 import numpy as np
 import pandas as pd
+from group9_package.subpkg_1.dtype_policy_module import as_float
+from group9_package.subpkg_1.instrumentation_module import instrumented
+from group9_package.subpkg_1.lazy_import_module import LazyImport
+
+# scikit-learn takes over a second to import, so it is loaded by the first classifier
+LogisticRegression = LazyImport('sklearn.linear_model', 'LogisticRegression')
+confusion_matrix = LazyImport('sklearn.metrics', 'confusion_matrix')
+
+class StreamingEvaluator:
+    """A class for accumulating classification metrics over batches of predictions"""
+    def __init__(self, labels=("galaxy", "star", "qso"), eps=1e-15):
+        """Initializes the StreamingEvaluator Class
+
+        Args:
+            labels (sequence of str, optional): Classes in the order used for the rows
+                and columns of the confusion matrix. Defaults to ("galaxy", "star", "qso").
+            eps (float, optional): Probabilities are clipped to [eps, 1 - eps] before
+                computing the log-loss. Defaults to 1e-15.
+
+        Raises:
+            ValueError: If no labels are given or the labels are not unique
+        """
+        labels = list(labels)
+        if not labels or len(set(labels)) != len(labels):
+            raise ValueError("Labels must be a non-empty sequence of unique classes")
+
+        self.labels = labels
+        self.eps = eps
+        self._label_index = {label: i for i, label in enumerate(labels)}
+        self.reset()
+
+    def reset(self):
+        """Clears all accumulated counts"""
+        self.confusion_matrix = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.n_samples = 0
+        self._log_loss_sum = 0.0
+        self._log_loss_count = 0
+
+    def _encode(self, values):
+        """Maps class names to their index in self.labels, using -1 for unknown classes"""
+        return np.array([self._label_index.get(value, -1) for value in values], dtype=np.int64)
+
+    def update(self, y_true, y_pred, proba=None, classes=None):
+        """Adds one batch of predictions to the running metrics
+
+        Args:
+            y_true (array-like): True classes for each observation in the batch
+            y_pred (array-like): Predicted classes for each observation in the batch
+            proba (array-like, optional): Predicted probabilities of shape (n_samples, n_classes),
+                used to accumulate the log-loss. Defaults to None.
+            classes (sequence of str, optional): Class name of each column in proba. Defaults
+                to self.labels.
+
+        Raises:
+            ValueError: If the batch arrays do not have matching lengths
+        """
+        y_true = np.asarray(y_true).ravel()
+        y_pred = np.asarray(y_pred).ravel()
+        if y_true.shape[0] != y_pred.shape[0]:
+            raise ValueError("y_true and y_pred must have the same length")
+
+        true_idx = self._encode(y_true)
+        pred_idx = self._encode(y_pred)
+
+        # like sklearn's confusion_matrix, observations outside of self.labels are ignored
+        known = (true_idx >= 0) & (pred_idx >= 0)
+        np.add.at(self.confusion_matrix, (true_idx[known], pred_idx[known]), 1)
+        self.n_samples += y_true.shape[0]
+
+        if proba is not None:
+            proba = np.asarray(proba, dtype=np.float64)
+            classes = self.labels if classes is None else list(classes)
+            if proba.shape != (y_true.shape[0], len(classes)):
+                raise ValueError("proba must have shape (n_samples, n_classes)")
+
+            # probability assigned to the true class, zero if the model never saw that class
+            column_index = {label: i for i, label in enumerate(classes)}
+            true_col = np.array([column_index.get(value, -1) for value in y_true], dtype=np.int64)
+            p_true = np.zeros(y_true.shape[0])
+            seen = true_col >= 0
+            p_true[seen] = proba[np.flatnonzero(seen), true_col[seen]]
+
+            p_true = np.clip(p_true, self.eps, 1 - self.eps)
+            self._log_loss_sum -= float(np.sum(np.log(p_true)))
+            self._log_loss_count += y_true.shape[0]
+
+    def precision(self):
+        """Computes the per-class precision from the accumulated confusion matrix
+
+        Returns:
+            dict mapping each class to its precision (nan if the class was never predicted)
+        """
+        predicted = self.confusion_matrix.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.diag(self.confusion_matrix) / predicted
+        return dict(zip(self.labels, values.tolist()))
+
+    def recall(self):
+        """Computes the per-class recall from the accumulated confusion matrix
+
+        Returns:
+            dict mapping each class to its recall (nan if the class never occurred)
+        """
+        actual = self.confusion_matrix.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.diag(self.confusion_matrix) / actual
+        return dict(zip(self.labels, values.tolist()))
+
+    def log_loss(self):
+        """Computes the mean log-loss over every batch that was given probabilities
+
+        Returns:
+            float, the mean negative log-likelihood of the true classes
+
+        Raises:
+            ValueError: If no probabilities have been accumulated
+        """
+        if self._log_loss_count == 0:
+            raise ValueError("No probabilities accumulated to compute the log-loss")
+        return self._log_loss_sum / self._log_loss_count
+
+    def summary(self):
+        """Collects all accumulated metrics into a dictionary
+
+        Returns:
+            dict with the confusion matrix, precision, recall, log-loss (None if unavailable)
+            and the number of samples seen
+        """
+        return {
+            "labels": list(self.labels),
+            "confusion_matrix": self.confusion_matrix.tolist(),
+            "precision": self.precision(),
+            "recall": self.recall(),
+            "log_loss": self.log_loss() if self._log_loss_count else None,
+            "n_samples": self.n_samples,
+        }
 
 class CelestialObjectClassifier:
     """A class for classifying a Star, Galaxy, or QSO"""
@@ -32,6 +166,7 @@ class CelestialObjectClassifier:
         self.model_fit = model_fit
         self.model = LogisticRegression()  # Using Logistic Regression as an example
 
+    @instrumented('classify.fit')
     def fit(self, spectral_data, y):
         """Trains model based on given spectral data and classifications
         
@@ -50,13 +185,15 @@ class CelestialObjectClassifier:
         if (spectral_data.empty or y.empty):
             raise ValueError("Not enough data inputted to train model")
 
-        self.X_train = spectral_data
+        # scikit-learn fits in the type of the features, so float32 features give a float32 model
+        self.X_train = as_float(spectral_data)
 
         self.model_fit = True
 
         # Train the model
         self.model.fit(self.X_train, y)
 
+    @instrumented('classify.predict')
     def predict(self, spectral_data, y):
         """Predicts the class for each observation in the dataset 
         
@@ -93,7 +230,7 @@ class CelestialObjectClassifier:
         if (spectral_data.empty or y.empty):
             raise ValueError("Not enough data inputted to predict")
 
-        self.X_test = spectral_data
+        self.X_test = as_float(spectral_data)
 
         # Ensure predicting data has the same format as training data
         if self.X_train.shape[1] != self.X_test.shape[1]:
@@ -109,6 +246,7 @@ class CelestialObjectClassifier:
 
         return y_pred
 
+    @instrumented('classify.predict_proba')
     def predict_proba(self, spectral_data):
         """Predicts the probabilities that an observation is a Galaxy, Stary, or QSO
  
@@ -134,10 +272,55 @@ class CelestialObjectClassifier:
         if spectral_data.empty:
             raise ValueError("Not enough data inputted to predict")
 
-        self.X_test = spectral_data
+        self.X_test = as_float(spectral_data)
 
         # Ensure predicting data has the same format as training data
         if self.X_train.shape[1] != self.X_test.shape[1]:
             raise ValueError("Number of features in the test data not the same as train data")
 
         return self.model.predict_proba(self.X_test)
+
+    def evaluate_stream(self, batches, evaluator=None):
+        """Evaluates the trained model chunk by chunk on a stream of (X, y) batches
+
+        Only one batch is held in memory at a time, so the evaluation set can be
+        larger than memory (e.g. a generator reading a hold-out survey from disk).
+
+        Args:
+            batches (iterable): Iterable of (spectral_data, y) pairs, where spectral_data is
+                a DataFrame and y is a Series of classes (QSO, Star, or Galaxy)
+            evaluator (StreamingEvaluator, optional): Evaluator to accumulate into.
+                Defaults to a new StreamingEvaluator.
+
+        Returns:
+            StreamingEvaluator holding the confusion matrix, per-class precision/recall
+            and log-loss over all batches
+
+        Raises:
+            ValueError: 
+                if a batch is not a DataFrame and Series pair
+                if the model has not been trained yet
+                if a batch does not have the same number of features as the train data
+        """
+        if not self.model_fit:
+            raise ValueError("Need to train model first")
+
+        if evaluator is None:
+            evaluator = StreamingEvaluator()
+
+        for spectral_data, y in batches:
+            if (not isinstance(spectral_data, pd.DataFrame) or not isinstance(y, pd.Series)):
+                raise ValueError("Spectral Data inputted not a data frame or classifications data not a series")
+
+            # skip empty chunks, e.g. the tail of a file-backed generator
+            if spectral_data.empty:
+                continue
+
+            if self.X_train.shape[1] != spectral_data.shape[1]:
+                raise ValueError("Number of features in the test data not the same as train data")
+
+            proba = self.model.predict_proba(as_float(spectral_data))
+            y_pred = self.model.classes_[np.argmax(proba, axis=1)]
+            evaluator.update(y, y_pred, proba=proba, classes=self.model.classes_)
+
+        return evaluator
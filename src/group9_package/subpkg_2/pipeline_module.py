@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# File       : pipeline_module.py
+# Description: Lazy Pipeline Chaining Extraction, Preprocessing, Augmentation and Classification
+# License    : GNU General Public License, version 3
+# Copyright 2023 Harvard University. All Rights Reserved.
+"""
+This python module provides a generator-based pipeline that streams astronomical
+objects through the extract, preprocess, align, augment and classify steps of the
+package one object at a time, with bounded queues between stages.
+"""
+
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor, WavelengthAlignment
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+
+# marker that is passed down the queues once a stage has no more items
+_END = object()
+
+class PipelineStage:
+    """A single named step of a SpectralPipeline"""
+    def __init__(self, name, func, workers=1, queue_size=8):
+        """Initializes the PipelineStage Class
+
+        Args:
+            name (str): Name of the stage, used in error messages.
+            func (callable): Function applied to every item. Returning None drops the item
+                (e.g. a spectrum that could not be downloaded).
+            workers (int, optional): Number of threads running func concurrently. Output
+                order is only preserved when workers is 1. Defaults to 1.
+            queue_size (int, optional): Maximum number of items buffered in front of this
+                stage before upstream stages block. Defaults to 8.
+
+        Raises:
+            TypeError: If func is not callable
+            ValueError: If workers or queue_size are not positive
+        """
+        if not callable(func):
+            raise TypeError("Stage function must be callable")
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be positive integers")
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+class SpectralPipeline:
+    """A Class for lazily streaming objects through a chain of processing stages"""
+    def __init__(self, queue_size=8):
+        """Initializes the SpectralPipeline Class
+
+        Args:
+            queue_size (int, optional): Default size of the bounded queue in front of each
+                stage. Defaults to 8.
+        """
+        self.queue_size = queue_size
+        self.stages = []
+
+    def add_stage(self, name, func, workers=1, queue_size=None):
+        """Appends a stage to the pipeline
+
+        Args:
+            name (str): Name of the stage.
+            func (callable): Function applied to every item flowing through the stage.
+            workers (int, optional): Number of threads for this stage. Defaults to 1.
+            queue_size (int, optional): Size of the input queue of this stage.
+                Defaults to the pipeline queue_size.
+
+        Returns:
+            SpectralPipeline, so that calls can be chained
+        """
+        size = self.queue_size if queue_size is None else queue_size
+        self.stages.append(PipelineStage(name, func, workers=workers, queue_size=size))
+        return self
+
+    @staticmethod
+    def _put(q, item, stop):
+        """Puts an item on a queue, giving up if the pipeline is being shut down"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(q, stop):
+        """Gets an item from a queue, returning _END if the pipeline is being shut down"""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def run(self, source, with_source=False):
+        """Lazily runs every item of source through the stages
+
+        Items are handed from stage to stage by reference, so a DataFrame produced
+        by one stage is modified in place by the next rather than copied. Each stage
+        runs in its own thread(s), and the bounded queues between them stop a fast
+        stage (e.g. downloads) from running arbitrarily far ahead of a slow one.
+
+        Args:
+            source (iterable): Items fed into the first stage, e.g. the rows of an
+                Astropy Table returned by a query.
+            with_source (bool, optional): If True, yield (source_item, result) pairs so
+                results can be matched to their inputs when stages run in parallel.
+                Defaults to False.
+
+        Yields:
+            The output of the last stage for every item that was not dropped
+
+        Raises:
+            ValueError: If the pipeline has no stages
+            RuntimeError: If a stage raised an exception, chained to the original error
+        """
+        if not self.stages:
+            raise ValueError("Pipeline has no stages")
+
+        stop = threading.Event()
+        errors = []
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.queue_size))
+        threads = []
+
+        def feed():
+            try:
+                for item in source:
+                    if not self._put(queues[0], (item, item), stop):
+                        return
+            except Exception as e:
+                errors.append(("source", e))
+                stop.set()
+            finally:
+                self._put(queues[0], _END, stop)
+
+        def work(index, stage, remaining):
+            in_q, out_q = queues[index], queues[index + 1]
+            try:
+                while True:
+                    entry = self._get(in_q, stop)
+                    if entry is _END:
+                        # let the sibling workers of this stage see the end marker too
+                        self._put(in_q, _END, stop)
+                        break
+                    origin, value = entry
+                    result = stage.func(value)
+                    if result is not None and not self._put(out_q, (origin, result), stop):
+                        break
+            except Exception as e:
+                errors.append((stage.name, e))
+                stop.set()
+            finally:
+                # the last worker of a stage to finish passes the end marker downstream
+                with remaining["lock"]:
+                    remaining["count"] -= 1
+                    last = remaining["count"] == 0
+                if last:
+                    self._put(out_q, _END, stop)
+
+        threads.append(threading.Thread(target=feed, daemon=True))
+        for index, stage in enumerate(self.stages):
+            remaining = {"count": stage.workers, "lock": threading.Lock()}
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=work, args=(index, stage, remaining), daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                entry = self._get(queues[-1], stop)
+                if entry is _END:
+                    break
+                origin, value = entry
+                yield (origin, value) if with_source else value
+        finally:
+            # also reached when the consumer stops iterating early
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            name, error = errors[0]
+            raise RuntimeError(f"Pipeline stage '{name}' failed: {error}") from error
+
+def extract_stage(full=True):
+    """Creates a stage function that downloads the spectrum of an Astropy Table row
+
+    Args:
+        full (bool, optional): If True, use SpectraExtract.extract_spectra_full, otherwise
+            SpectraExtract.extract_spectra. Defaults to True.
+
+    Returns:
+        callable mapping a Table.Row to a DataFrame (or None if the download failed)
+    """
+    def extract(row):
+        extractor = SpectraExtract(row)
+        return extractor.extract_spectra_full() if full else extractor.extract_spectra()
+    return extract
+
+def preprocess_stage(*steps):
+    """Creates a stage function that runs DataPreprocessor methods on a spectrum
+
+    Args:
+        *steps: Method names of DataPreprocessor (e.g. 'normalize_data'), or
+            (method_name, kwargs) pairs, applied in order.
+
+    Returns:
+        callable mapping a DataFrame to the same, modified, DataFrame
+    """
+    def preprocess(data):
+        preprocessor = DataPreprocessor(query=None, data=data)
+        for step in steps:
+            name, kwargs = (step, {}) if isinstance(step, str) else step
+            getattr(preprocessor, name)(**kwargs)
+        return preprocessor.data
+    return preprocess
+
+def align_stage(target_range):
+    """Creates a stage function that aligns a full spectrum to a wavelength range
+
+    The upper case FITS column names returned by extract_spectra_full are renamed
+    to the lower case names expected by WavelengthAlignment on a new DataFrame, so
+    the spectrum handed to the stage keeps its columns.
+
+    Args:
+        target_range (tuple): Target (start, end) range in log10 wavelength.
+
+    Returns:
+        callable mapping a full spectrum DataFrame to an aligned DataFrame
+    """
+    def align(data):
+        return WavelengthAlignment.WavelengthAlign(data.rename(columns=str.lower), target_range)
+    return align
+
+def augment_stage(column_name, derivative_order=None):
+    """Creates a stage function that adds derivative columns to a spectrum
+
+    Args:
+        column_name (str): Column to differentiate.
+        derivative_order (float, optional): If given, the fractional derivative of this
+            order is added as well. Defaults to None.
+
+    Returns:
+        callable mapping a DataFrame to the same DataFrame with the new columns
+    """
+    def augment(data):
+        augmentor = DataAugmentation(data)
+        if derivative_order is None:
+            return augmentor.compute_derivative(column_name)
+        return augmentor.augment_both_derivatives(column_name, derivative_order)
+    return augment
+
+def classify_stage(classifier, columns=None, features=None):
+    """Creates a stage function that classifies a spectrum
+
+    By default every row of the spectrum, i.e. every wavelength sample, is an
+    observation classified on its own, like the rows CelestialObjectClassifier is
+    trained on, and the stage returns one class per row. Given features, the spectrum
+    is first reduced to a single feature vector and classified as a whole.
+
+    Args:
+        classifier (CelestialObjectClassifier): A trained classifier.
+        columns (list of str, optional): Feature columns passed to the classifier.
+            Defaults to every column.
+        features (callable, optional): Maps a spectrum DataFrame to its feature vector,
+            a Series or one-row DataFrame, e.g. lambda data: data.mean(). Defaults to None.
+
+    Returns:
+        callable mapping a DataFrame to an array of predicted classes, one per row, or
+        to the predicted class of the whole spectrum if features is given
+    """
+    def classify(data):
+        if features is not None:
+            data = features(data)
+            if isinstance(data, pd.Series):
+                data = data.to_frame().T
+            if len(data) != 1:
+                raise ValueError(f"features must return a single feature vector, got {len(data)} rows")
+        selected = data if columns is None else data[columns]
+        proba = classifier.predict_proba(selected)
+        predictions = classifier.model.classes_[np.argmax(proba, axis=1)]
+        return predictions if features is None else predictions[0]
+    return classify
@@ -13,9 +13,24 @@ tests=(
     subpkg_1/test_unit_tests_core_functions_module_extract.py
     subpkg_1/test_unit_tests_core_functions_module_modify.py
     subpkg_1/test_unit_tests_data_augmentation_module.py
+    subpkg_1/test_unit_tests_batch_processing_module.py
+    subpkg_1/test_unit_tests_spectrum_batch_module.py
+    subpkg_1/test_unit_tests_spectral_archive_module.py
+    subpkg_1/test_unit_tests_query_builder_module.py
+    subpkg_1/test_unit_tests_harvest_module.py
+    subpkg_1/test_unit_tests_bulk_download_module.py
+    subpkg_1/test_unit_tests_rate_limiter_module.py
+    subpkg_1/test_unit_tests_async_extract_module.py
+    subpkg_1/test_unit_tests_spectrum_store_module.py
+    subpkg_1/test_unit_tests_lazy_import_module.py
+    subpkg_1/test_unit_tests_instrumentation_module.py
+    subpkg_1/test_unit_tests_service_urls_module.py
+    subpkg_1/test_unit_tests_local_service_module.py
+    subpkg_1/test_unit_tests_dtype_policy_module.py
     subpkg_2/test_machine_learning_module.py
     subpkg_2/test_unit_tests_machine_learning_module.py
     subpkg_2/test_unit_tests_cross_matching_module.py
+    subpkg_2/test_unit_tests_pipeline_module.py
 )
 
 # Must add the module source path because we use `import group9_package` in
@@ -0,0 +1,198 @@
+"""This unit test module runs tests for async_extract_module.py"""
+
+import asyncio
+import io
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from astropy.io import fits
+from astropy.table import Table
+from astroquery.exceptions import RemoteServiceError
+from group9_package.subpkg_1 import rate_limiter_module
+from group9_package.subpkg_1.async_extract_module import AsyncSpectraClient
+from group9_package.subpkg_1.rate_limiter_module import configure_rate_limit
+from group9_package.subpkg_2.cross_matching_module import CrossMatchingModule
+
+CSV_PAYLOAD = b"Wavelength,Flux,BestFit,SkyFlux\n3800.0,1.5,1.4,0.2\n3801.0,1.6,1.5,0.3\n"
+
+def make_fits_payload():
+    """Creates a small FITS file with a COADD table"""
+    coadd = fits.BinTableHDU.from_columns([
+        fits.Column(name='FLUX', format='E', array=np.array([1.0, 2.0, 3.0])),
+        fits.Column(name='LOGLAM', format='E', array=np.array([3.58, 3.59, 3.60])),
+    ], name='COADD')
+    buffer = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), coadd]).writeto(buffer)
+    return buffer.getvalue()
+
+class TestAsyncSpectraClient(unittest.IsolatedAsyncioTestCase):
+    """A class for testing our methods in the AsyncSpectraClient Class against a local server"""
+    async def asyncSetUp(self):
+        """Start a local stand-in for the spectrum, SkyServer and Gaia services"""
+        self.defaults = dict(rate_limiter_module._RATE_LIMITERS)
+        configure_rate_limit('sdss', 10000)
+        configure_rate_limit('gaia', 10000)
+
+        self.failures = {}
+        self.latency = 0.0
+        self.released = asyncio.Event()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fits_payload = make_fits_payload()
+
+        app = web.Application()
+        app.router.add_get('/spectrum/format=csv/spec=lite', self.spectrum)
+        app.router.add_get('/spectrum/format=fits/spec=lite', self.spectrum)
+        app.router.add_get('/sql', self.sql)
+        app.router.add_get('/tap', self.tap)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base = f'http://127.0.0.1:{port}'
+        self.row = Table({'plate': np.array([15150]), 'mjd': np.array([59291]), 'fiberid': np.array([1])})[0]
+
+    async def asyncTearDown(self):
+        """Stop the server and restore the default limiters"""
+        self.released.set()
+        await self.runner.cleanup()
+        rate_limiter_module._RATE_LIMITERS.update(self.defaults)
+
+    def client(self, **kwargs):
+        """Returns a client pointed at the local server"""
+        return AsyncSpectraClient(spectrum_url=f'{self.base}/spectrum', sql_url=f'{self.base}/sql',
+                                  tap_url=f'{self.base}/tap', delay=0, **kwargs)
+
+    async def spectrum(self, request):
+        """Serves a spectrum, failing with 500 a configured number of times per fiber"""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # sleep, unless the test is over
+            try:
+                await asyncio.wait_for(self.released.wait(), self.latency)
+            except asyncio.TimeoutError:
+                pass
+            fiberid = request.query['fiberid']
+            if self.failures.get(fiberid, 0) > 0:
+                self.failures[fiberid] -= 1
+                return web.Response(status=500)
+            if 'format=fits' in request.path:
+                return web.Response(body=self.fits_payload)
+            return web.Response(body=CSV_PAYLOAD)
+        finally:
+            self.in_flight -= 1
+
+    async def sql(self, request):
+        """Serves a SkyServer CSV result, or an error for queries on unknown tables"""
+        if 'missing' in request.query['cmd']:
+            return web.Response(text="error_message: Invalid object name 'missing'")
+        return web.Response(text="#Table1\nra,dec\n1.5,2.5\n3.5,4.5\n")
+
+    async def tap(self, request):
+        """Serves a Gaia TAP CSV result"""
+        self.tap_query = request.query['QUERY']
+        return web.Response(text="original_ext_source_id,angular_distance\n1237,0.5\n1238,12.0\n")
+
+    def test_invalid_settings(self):
+        """Tests that non positive concurrency raises ValueError"""
+        with self.assertRaises(ValueError):
+            AsyncSpectraClient(max_concurrency=0)
+
+    async def test_requires_context_manager(self):
+        """Tests that requests outside of 'async with' raise RuntimeError"""
+        with self.assertRaises(RuntimeError):
+            await self.client().extract_spectra(self.row)
+
+    async def test_extract_spectra(self):
+        """Tests both CSV parsers and the FITS download"""
+        async with self.client() as client:
+            slow = await client.extract_spectra(self.row)
+            fast = await client.extract_spectra(self.row, fast=True)
+            full = await client.extract_spectra_full(self.row, fast=True)
+            streamed = await client.extract_spectra_full(self.row, stream=True)
+
+        self.assertEqual(list(slow.columns), ['Wavelength', 'Flux', 'BestFit', 'SkyFlux'])
+        np.testing.assert_allclose(fast.values, slow.values)
+        np.testing.assert_allclose(full['FLUX'], [1.0, 2.0, 3.0])
+        pd.testing.assert_frame_equal(streamed, full)
+
+    async def test_extract_many_streams_full_spectra(self):
+        """Tests that extract_many passes stream on to the full spectrum downloads"""
+        rows = Table({'plate': [15150, 15150], 'mjd': [59291, 59291], 'fiberid': [1, 2]})
+        async with self.client() as client:
+            full = await client.extract_many(rows, full=True)
+            with patch.object(client, '_get', wraps=client._get) as mock_get:
+                streamed = await client.extract_many(rows, full=True, stream=True)
+
+        self.assertTrue(all('decoder' in call.kwargs for call in mock_get.call_args_list))
+        self.assertEqual(mock_get.call_count, 2)
+        for expected, result in zip(full, streamed):
+            pd.testing.assert_frame_equal(result, expected)
+
+    async def test_retries_server_errors(self):
+        """Tests that 500 answers are retried and give up after the last attempt"""
+        self.failures = {'1': 2, '2': 10}
+        rows = Table({'plate': [15150, 15150], 'mjd': [59291, 59291], 'fiberid': [1, 2]})
+        async with self.client(retries=3) as client:
+            ok, failed = await client.extract_many(rows)
+
+        self.assertIsInstance(ok, pd.DataFrame)
+        self.assertIsNone(failed)
+        self.assertEqual(self.failures, {'1': 0, '2': 7})
+
+    async def test_concurrency_is_bounded(self):
+        """Tests that many requests share one event loop without exceeding max_concurrency"""
+        self.latency = 0.01
+        n = 300
+        rows = Table({'plate': np.full(n, 15150), 'mjd': np.full(n, 59291), 'fiberid': np.arange(n)})
+        async with self.client(max_concurrency=20) as client:
+            results = await client.extract_many(rows)
+
+        self.assertTrue(all(isinstance(result, pd.DataFrame) for result in results))
+        self.assertLessEqual(self.max_in_flight, 20)
+        self.assertGreater(self.max_in_flight, 1)
+
+    async def test_timeout(self):
+        """Tests that slow responses raise asyncio.TimeoutError"""
+        self.latency = 1.0
+        async with self.client(timeout=0.1) as client:
+            with self.assertRaises(asyncio.TimeoutError):
+                await client.extract_spectra(self.row)
+
+    async def test_cancellation(self):
+        """Tests that cancelling a batch stops its requests and frees their slots"""
+        self.latency = 10.0
+        rows = Table({'plate': np.full(5, 15150), 'mjd': np.full(5, 59291), 'fiberid': np.arange(5)})
+        async with self.client() as client:
+            task = asyncio.ensure_future(client.extract_many(rows))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(client._semaphore._value, client.max_concurrency)
+
+    async def test_execute_query(self):
+        """Tests SkyServer results and errors"""
+        async with self.client() as client:
+            result = await client.execute_query("SELECT ra, dec FROM specObj")
+            self.assertEqual(result['dec'].tolist(), [2.5, 4.5])
+
+            with self.assertRaises(RemoteServiceError):
+                await client.execute_query("SELECT ra FROM missing")
+            with self.assertRaises(ValueError):
+                await client.execute_query("ra, dec")
+
+    async def test_cross_match_async(self):
+        """Tests that the async cross-match filters by angular distance"""
+        async with self.client() as client:
+            result = await CrossMatchingModule().cross_match_async(10, 6279435494640163584, client)
+
+        self.assertEqual(result['original_ext_source_id'].tolist(), [1237])
+        self.assertIn("source_id = 6279435494640163584", self.tap_query)
+
+if __name__ == '__main__':
+    unittest.main()
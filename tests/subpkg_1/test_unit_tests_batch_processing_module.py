@@ -0,0 +1,81 @@
+"""This unit test module runs tests for batch_processing_module.py"""
+
+import unittest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from group9_package.subpkg_1.batch_processing_module import BatchProcessingExecutor
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+
+class TestBatchProcessingExecutor(unittest.TestCase):
+    """A class for testing our methods in the BatchProcessingExecutor Class"""
+    def setUp(self):
+        """Create spectra of different lengths to process"""
+        rng = np.random.default_rng(9)
+        self.spectra = [pd.DataFrame({'Wavelength': np.linspace(3800, 9200, n), 'Flux': rng.normal(10, 2, n)})
+                        for n in (20, 35, 50, 20, 41)]
+        self.steps = ['normalize_data', ('compute_fractional_derivative', {'column_name': 'Flux', 'derivative_order': 0.5})]
+
+    def expected(self, frame):
+        """Runs the processing chain by hand on a copy of one spectrum"""
+        preprocessor = DataPreprocessor(query=None, data=frame.copy())
+        preprocessor.normalize_data()
+        augmentor = DataAugmentation(preprocessor.data)
+        return augmentor.compute_fractional_derivative('Flux', 0.5)
+
+    def test_invalid_step(self):
+        """Tests that an unknown method in the chain raises ValueError"""
+        with self.assertRaises(ValueError):
+            BatchProcessingExecutor(['not_a_method'])
+
+    def test_invalid_spectra(self):
+        """Tests that non DataFrame spectra raise TypeError"""
+        executor = BatchProcessingExecutor(self.steps, processes=1)
+        with self.assertRaises(TypeError):
+            executor.run(["not a frame"])
+
+    def test_inline_matches_manual_chain(self):
+        """Tests that a single process run matches calling the classes directly"""
+        results = BatchProcessingExecutor(self.steps, processes=1).run(self.spectra)
+
+        for frame, result in zip(self.spectra, results):
+            assert_frame_equal(result, self.expected(frame))
+
+    def test_process_pool_matches_manual_chain(self):
+        """Tests that the shared memory process pool returns the same spectra in order"""
+        results = BatchProcessingExecutor(self.steps, processes=2, chunks_per_process=2).run(self.spectra)
+
+        self.assertEqual(len(results), len(self.spectra))
+        for frame, result in zip(self.spectra, results):
+            assert_frame_equal(result, self.expected(frame))
+
+    def test_process_pool_keeps_the_index(self):
+        """Tests that the process pool returns the same index as the inline path"""
+        spectra = [frame.set_axis(np.arange(len(frame)) * 10 + 5) for frame in self.spectra[:2]]
+        spectra += [frame.set_axis([f'px{i}' for i in range(len(frame))]) for frame in self.spectra[2:4]]
+        spectra.append(self.spectra[4].iloc[3:])
+        steps = ['remove_outliers'] + self.steps
+
+        inline = BatchProcessingExecutor(steps, processes=1).run(spectra)
+        pooled = BatchProcessingExecutor(steps, processes=2, chunks_per_process=2).run(spectra)
+        for expected, result in zip(inline, pooled):
+            assert_frame_equal(result, expected)
+        self.assertEqual(pooled[4].index[0], 3)
+
+    def test_input_is_not_modified(self):
+        """Tests that the input spectra are left untouched"""
+        original = [frame.copy() for frame in self.spectra]
+        BatchProcessingExecutor(self.steps, processes=2).run(self.spectra)
+
+        for frame, before in zip(self.spectra, original):
+            assert_frame_equal(frame, before)
+
+    def test_worker_error_is_raised(self):
+        """Tests that an error inside a worker is raised in the caller"""
+        executor = BatchProcessingExecutor([('compute_derivative', {'column_name': 'Missing'})], processes=2)
+        with self.assertRaises(ValueError):
+            executor.run(self.spectra)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""This unit test module runs tests for bulk_download_module.py"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1.bulk_download_module import BulkSpectraDownloader, DownloadManifest
+
+class TestBulkSpectraDownloader(unittest.TestCase):
+    """A class for testing our methods in the BulkSpectraDownloader and DownloadManifest Classes"""
+    def setUp(self):
+        """Create a temporary output directory and a table of objects"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmpdir.name, 'manifest.sqlite')
+        self.output_dir = os.path.join(self.tmpdir.name, 'spectra')
+        self.objects = Table({'plate': [15150, 15150, 15151], 'mjd': [59291, 59291, 59292], 'fiberid': [1, 2, 3]})
+        self.spectrum = pd.DataFrame({'Wavelength': [1.0, 2.0], 'Flux': [0.5, 0.8], 'BestFit': [0.4, 0.7], 'SkyFlux': [0.1, 0.2]})
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        self.tmpdir.cleanup()
+
+    def test_add_objects(self):
+        """Tests that objects are only added once and bad tables are rejected"""
+        downloader = BulkSpectraDownloader(self.manifest_path, self.output_dir)
+        self.assertEqual(downloader.add_objects(self.objects), 3)
+        self.assertEqual(downloader.add_objects(self.objects), 0)
+
+        with self.assertRaises(ValueError):
+            downloader.add_objects(Table({'plate': [1]}))
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_run_writes_files_with_checksums(self, mock_extract):
+        """Tests that a run downloads every object and records checksums"""
+        mock_extract.return_value = self.spectrum
+        downloader = BulkSpectraDownloader(self.manifest_path, self.output_dir, max_workers=2)
+        downloader.add_objects(self.objects)
+
+        report = downloader.run()
+
+        self.assertEqual((report['done'], report['failed'], report['pending']), (3, 0, 0))
+        entry = downloader.manifest.entry((15151, 59292, 3))
+        self.assertEqual(len(entry['checksum']), 64)
+        pd.testing.assert_frame_equal(pd.read_csv(entry['file']), self.spectrum)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_restart_skips_done_objects(self, mock_extract):
+        """Tests that a new downloader on the same manifest only fetches unfinished objects"""
+        mock_extract.return_value = self.spectrum
+        first = BulkSpectraDownloader(self.manifest_path, self.output_dir)
+        first.add_objects(self.objects[:2])
+        first.run()
+        first.manifest.close()
+
+        second = BulkSpectraDownloader(self.manifest_path, self.output_dir)
+        second.add_objects(self.objects)
+        report = second.run()
+
+        self.assertEqual(mock_extract.call_count, 3)
+        self.assertEqual(report['done'], 3)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_failures_retried_in_later_pass(self, mock_extract):
+        """Tests that failed objects are retried and reported if they keep failing"""
+        mock_extract.side_effect = [None, self.spectrum, self.spectrum, self.spectrum, None]
+        downloader = BulkSpectraDownloader(self.manifest_path, self.output_dir)
+        downloader.add_objects(self.objects)
+
+        report = downloader.run(max_passes=2)
+        self.assertEqual((report['done'], report['failed']), (3, 0))
+
+        mock_extract.side_effect = None
+        mock_extract.return_value = None
+        downloader.add_objects(Table({'plate': [1], 'mjd': [2], 'fiberid': [3]}))
+        report = downloader.run(max_passes=2)
+
+        self.assertEqual(report['failed'], 1)
+        self.assertEqual(report['failures'][0]['key'], (1, 2, 3))
+        self.assertEqual(report['failures'][0]['attempts'], 2)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_verify_requeues_missing_files(self, mock_extract):
+        """Tests that done objects whose file disappeared are downloaded again"""
+        mock_extract.return_value = self.spectrum
+        downloader = BulkSpectraDownloader(self.manifest_path, self.output_dir)
+        downloader.add_objects(self.objects)
+        downloader.run()
+
+        os.remove(downloader.manifest.entry((15150, 59291, 1))['file'])
+        self.assertEqual(downloader.verify(), [(15150, 59291, 1)])
+        self.assertEqual(downloader.manifest.keys('pending'), [(15150, 59291, 1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,16 @@
 """This unit test module runs tests for core_functions_module_extract.py"""
 
+import io
 import unittest
+import warnings
 import numpy as np
-from unittest.mock import patch
-from astropy.table import Table
-from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase, MetaDataExtractor, SpectraExtract
+import pandas as pd
+from unittest.mock import patch, MagicMock, ANY
+from astropy.io import fits
+from astropy.table import MaskedColumn, Table
+from group9_package.subpkg_1.core_functions_module_extract import (SpectralAnalysisBase, MetaDataExtractor, SpectraExtract,
+                                                                   FitsStreamDecoder, parse_fits_bintable, read_fits_header,
+                                                                   parse_spectra_csv, parse_spectra_csv_batch)
 from astroquery.exceptions import RemoteServiceError, TimeoutError
 from requests.exceptions import RequestException
 
@@ -153,6 +159,118 @@ class TestMetaDataExtractor(unittest.TestCase):
         with self.assertRaises(ValueError):
             extractor.extract_redshifts()
 
+    def test_extract_columns_shares_memory(self):
+        """Tests that extracted columns are views of the data rather than copies"""
+        data = Table({'bestObjID': [1, 2, 3], 'ra': [1.0, 2.0, 3.0], 'dec': [4.0, 5.0, 6.0]})
+        extractor = MetaDataExtractor(self.valid_query, data)
+
+        projection = extractor.extract_columns('ra', 'dec')
+        self.assertEqual(projection.colnames, ['ra', 'dec'])
+        self.assertTrue(np.shares_memory(projection['ra'], data['ra']))
+        self.assertTrue(np.shares_memory(extractor.extract_coordinates()['dec'], data['dec']))
+
+    def test_extract_columns_as_array(self):
+        """Tests that columns can be returned as a NumPy structured array"""
+        data = Table({'bestObjID': [1, 2, 3], 'ra': [1.0, 2.0, 3.0]})
+        extractor = MetaDataExtractor(self.valid_query, data)
+
+        records = extractor.extract_columns('bestObjID', 'ra', as_array=True)
+        self.assertEqual(records.dtype.names, ('bestObjID', 'ra'))
+        self.assertEqual(records['ra'].tolist(), [1.0, 2.0, 3.0])
+        self.assertNotIsInstance(records, np.ma.MaskedArray)
+
+    def test_extract_columns_as_array_masked(self):
+        """Tests that masked values stay masked in the structured array"""
+        data = Table({'bestObjID': [1, 2, 3], 'z': MaskedColumn([0.1, -9999.0, 0.3], mask=[False, True, False])})
+        extractor = MetaDataExtractor(self.valid_query, data)
+
+        records = extractor.extract_columns('bestObjID', 'z', as_array=True)
+        self.assertIsInstance(records, np.ma.MaskedArray)
+        self.assertEqual(records.mask['z'].tolist(), [False, True, False])
+        self.assertFalse(records.mask['bestObjID'].any())
+        self.assertEqual(records['z'].compressed().tolist(), [0.1, 0.3])
+
+    def test_extract_columns_invalid(self):
+        """Tests that missing columns or no columns raise ValueError"""
+        extractor = MetaDataExtractor(self.valid_query, Table({'ra': [1.0]}))
+        with self.assertRaises(ValueError):
+            extractor.extract_columns('dec')
+
+        with self.assertRaises(ValueError):
+            extractor.extract_columns()
+
+    def test_project_query(self):
+        """Tests that the select list of the query is replaced by the requested columns"""
+        extractor = MetaDataExtractor(self.valid_query)
+        query = extractor.project_query('bestObjID', 'z')
+
+        self.assertEqual(query, "select top 10 bestObjID, z from specObj where class = 'galaxy'  and z > 0.3 and zWarning = 0")
+        self.assertEqual(extractor.query, query)
+
+        with self.assertRaises(ValueError):
+            MetaDataExtractor(self.invalid_query).project_query('ra')
+
+class TestMetaDataExtractorIndex(unittest.TestCase):
+    """A class for testing the indexed lookups of the MetaDataExtractor Class"""
+    def setUp(self):
+        """Create query results with identifiers and spectrum keys"""
+        self.data = Table({'bestObjID': [30, 10, 20, 10], 'plate': [1, 1, 2, 3], 'mjd': [500, 500, 501, 502],
+                           'fiberid': [7, 8, 7, 1], 'elodieZ': [0.3, 0.1, 0.2, 0.4]})
+        self.extractor = MetaDataExtractor("select * from specObj", self.data)
+
+    def test_lookup(self):
+        """Tests single lookups by bestObjID, returning the first duplicate"""
+        self.assertEqual(self.extractor.lookup(20)['elodieZ'], 0.2)
+        self.assertEqual(self.extractor.lookup(10)['elodieZ'], 0.1)
+
+        with self.assertRaises(KeyError):
+            self.extractor.lookup(99)
+
+    def test_lookup_many(self):
+        """Tests batch lookups keep the requested order"""
+        rows = self.extractor.lookup_many([30, 20, 10])
+        self.assertEqual(rows['elodieZ'].tolist(), [0.3, 0.2, 0.1])
+
+        with self.assertRaises(KeyError):
+            self.extractor.lookup_many([30, 99])
+
+    def test_lookup_spectrum(self):
+        """Tests lookups by plate, mjd and fiberid"""
+        self.assertEqual(self.extractor.lookup_spectrum(3, 502, 1)['elodieZ'], 0.4)
+        rows = self.extractor.lookup_spectrum([2, 1], [501, 500], [7, 7])
+        self.assertEqual(rows['bestObjID'].tolist(), [20, 30])
+
+    def test_lookup_spectrum_out_of_range(self):
+        """Tests that values which do not fit the packed key raise ValueError instead of colliding"""
+        # fiberid 10001 of mjd 500 would pack to the key of fiberid 1 of mjd 501
+        for plate, mjd, fiberid in [(2, 500, 10001), (2, 100500, 7), (-1, 500, 7), (10**9, 500, 7)]:
+            with self.assertRaises(ValueError):
+                self.extractor.lookup_spectrum(plate, mjd, fiberid)
+        with self.assertRaises(ValueError):
+            self.extractor.lookup_spectrum([2, 1], [501, 500], [7, 10**4])
+
+    def test_index_rebuilt_for_new_data(self):
+        """Tests that loading a new table invalidates the index"""
+        self.extractor.lookup(20)
+        self.extractor.data = Table({'bestObjID': [99], 'elodieZ': [0.9]})
+        self.assertEqual(self.extractor.lookup(99)['elodieZ'], 0.9)
+
+    def test_lookup_without_data(self):
+        """Tests that lookups without data raise ValueError"""
+        with self.assertRaises(ValueError):
+            MetaDataExtractor("select * from specObj").lookup(1)
+
+    def test_join(self):
+        """Tests joining another query result on bestObjID"""
+        other = Table({'bestObjID': [20, 42, 30], 'elodieFeH': [-0.2, -0.5, -0.3]})
+        joined = self.extractor.join(other)
+
+        self.assertEqual(joined['bestObjID'].tolist(), [20, 30])
+        self.assertEqual(joined['elodieFeH'].tolist(), [-0.2, -0.3])
+
+        with self.assertRaises(ValueError):
+            self.extractor.join(other, key='spectrum')
+
 class TestSpectraExtract(unittest.TestCase):
     """A class for testing our methods in the SpectraExtract Class"""
     def test_spectra_extract(self):
@@ -185,5 +303,207 @@ class TestSpectraExtract(unittest.TestCase):
         # make sure dataframe has correct columns
         self.assertCountEqual(['FLUX', 'LOGLAM', 'IVAR', 'AND_MASK', 'OR_MASK', 'WDISP', 'SKY', 'WRESL', 'MODEL'], data_full.columns.tolist())
 
+def make_spec_lite_fits(n=100):
+    """Creates the bytes of a FITS file laid out like an SDSS spec-lite file"""
+    rng = np.random.default_rng(0)
+    coadd = fits.BinTableHDU.from_columns([
+        fits.Column(name='FLUX', format='E', array=rng.normal(10, 1, n)),
+        fits.Column(name='LOGLAM', format='E', array=np.linspace(3.58, 3.96, n)),
+        fits.Column(name='IVAR', format='E', array=rng.uniform(0, 1, n)),
+        fits.Column(name='AND_MASK', format='J', array=rng.integers(0, 2**20, n)),
+        fits.Column(name='OR_MASK', format='J', array=rng.integers(0, 2**20, n)),
+        fits.Column(name='WDISP', format='E', array=np.ones(n)),
+        fits.Column(name='SKY', format='E', array=rng.uniform(0, 5, n)),
+        fits.Column(name='WRESL', format='E', array=np.ones(n)),
+        fits.Column(name='MODEL', format='E', array=rng.normal(10, 1, n)),
+    ], name='COADD')
+    specobj = fits.BinTableHDU.from_columns([fits.Column(name='CLASS', format='6A', array=['GALAXY'])], name='SPALL')
+    buffer = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), coadd, specobj]).writeto(buffer)
+    return buffer.getvalue()
+
+class TestSpectraExtractFits(unittest.TestCase):
+    """A class for testing the FITS parsing paths of the SpectraExtract Class"""
+    def setUp(self):
+        """Create a FITS payload and a row to request it for"""
+        self.payload = make_spec_lite_fits()
+        self.row = Table({'plate': np.array([15150]), 'mjd': np.array([59291]), 'fiberid': np.array([1])})[0]
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_fast_path_matches_astropy(self, mock_get):
+        """Tests that the fast parser returns the same table as the astropy path"""
+        mock_get.return_value = MagicMock(status_code=200, content=self.payload)
+        extractor = SpectraExtract(self.row)
+
+        slow = extractor.extract_spectra_full()
+        fast = extractor.extract_spectra_full(fast=True)
+
+        self.assertEqual(fast.columns.tolist(), slow.columns.tolist())
+        for column in slow.columns:
+            np.testing.assert_array_equal(fast[column].to_numpy(), slow[column].to_numpy())
+            self.assertTrue(fast[column].dtype.isnative)
+
+    def test_parse_other_hdu(self):
+        """Tests that other binary table HDUs can be parsed, including string columns"""
+        table = parse_fits_bintable(self.payload, hdu_index=2)
+        self.assertEqual(table['CLASS'].tolist(), [b'GALAXY'])
+
+    def test_parse_scaled_columns(self):
+        """Tests TSCAL and TZERO, including the unsigned integer convention, against astropy"""
+        table = fits.BinTableHDU.from_columns([
+            fits.Column(name='U32', format='J', bzero=2**31, array=np.array([0, 1, 2**32 - 1], dtype=np.uint32)),
+            fits.Column(name='U64', format='K', bzero=2**63, array=np.array([0, 1, 2**64 - 1], dtype=np.uint64)),
+            fits.Column(name='SCALED', format='I', array=np.array([0, 7, 206], dtype=np.int16)),
+        ])
+        # stored values 0, 7 and 206 are -3.0, 0.5 and 100.0
+        table.header['TSCAL3'] = 0.5
+        table.header['TZERO3'] = -3.0
+        buffer = io.BytesIO()
+        fits.HDUList([fits.PrimaryHDU(), table]).writeto(buffer)
+
+        parsed = parse_fits_bintable(buffer.getvalue())
+        self.assertEqual(parsed['U32'].tolist(), [0, 1, 2**32 - 1])
+        self.assertEqual(parsed['U64'].tolist(), [0, 1, 2**64 - 1])
+        self.assertEqual(parsed['U64'].dtype, np.uint64)
+        np.testing.assert_allclose(parsed['SCALED'], [-3.0, 0.5, 100.0])
+        with fits.open(io.BytesIO(buffer.getvalue())) as hdus:
+            for column in ('U32', 'U64', 'SCALED'):
+                np.testing.assert_array_equal(parsed[column], hdus[1].data[column])
+
+    def test_parse_errors(self):
+        """Tests that truncated buffers and non table HDUs raise ValueError"""
+        with self.assertRaises(ValueError):
+            parse_fits_bintable(self.payload[:5000])
+
+        with self.assertRaises(ValueError):
+            parse_fits_bintable(self.payload, hdu_index=0)
+
+    def test_read_fits_header(self):
+        """Tests that header keywords and the data position are read"""
+        cards, data_start, size = read_fits_header(self.payload, 0)
+        self.assertTrue(cards['SIMPLE'])
+        self.assertEqual(data_start % 2880, 0)
+        self.assertEqual(size, 0)
+
+class TestFitsStreamDecoder(unittest.TestCase):
+    """A class for testing the incremental FITS decoding of the FitsStreamDecoder Class"""
+    def setUp(self):
+        """Create a FITS payload and a row to request it for"""
+        self.payload = make_spec_lite_fits()
+        self.row = Table({'plate': np.array([15150]), 'mjd': np.array([59291]), 'fiberid': np.array([1])})[0]
+
+    def chunks(self, size):
+        """Splits the payload into chunks of a given size"""
+        return [self.payload[i:i + size] for i in range(0, len(self.payload), size)]
+
+    def test_matches_parser_for_any_chunk_size(self):
+        """Tests that chunked decoding gives the same table as parsing the whole file"""
+        expected = parse_fits_bintable(self.payload, hdu_index=2)
+        for size in (1000, 2880, 7919, len(self.payload)):
+            decoder = FitsStreamDecoder(hdu_index=2)
+            for chunk in self.chunks(size):
+                decoder.feed(chunk)
+            pd.testing.assert_frame_equal(decoder.finish(), expected)
+
+    def test_stops_after_requested_hdu(self):
+        """Tests that the COADD table is decoded before the last HDU arrives"""
+        decoder = FitsStreamDecoder(hdu_index=1)
+        chunks = self.chunks(2880)
+        used = next(i for i, chunk in enumerate(chunks, start=1) if decoder.feed(chunk) is not None)
+
+        self.assertLess(used, len(chunks))
+        self.assertTrue(decoder.done)
+        pd.testing.assert_frame_equal(decoder.result, parse_fits_bintable(self.payload, hdu_index=1))
+
+    def test_truncated_stream(self):
+        """Tests that a stream ending before the table is complete raises ValueError"""
+        decoder = FitsStreamDecoder(hdu_index=1)
+        decoder.feed(self.payload[:5000])
+        self.assertFalse(decoder.done)
+        with self.assertRaises(ValueError):
+            decoder.finish()
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_extract_spectra_full_stream(self, mock_get):
+        """Tests that streaming downloads stop reading and close the response early"""
+        chunks = self.chunks(2880)
+        served = []
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                served.append(chunk)
+                yield chunk
+        response = MagicMock(status_code=200)
+        response.iter_content.side_effect = iter_content
+        mock_get.return_value = response
+
+        df = SpectraExtract(self.row).extract_spectra_full(stream=True)
+
+        mock_get.assert_called_once_with(ANY, stream=True)
+        response.close.assert_called_once()
+        self.assertLess(len(served), len(chunks))
+        pd.testing.assert_frame_equal(df, parse_fits_bintable(self.payload, hdu_index=1))
+
+class TestSpectraCsvParsing(unittest.TestCase):
+    """A class for testing the fixed schema CSV parsing of spectra"""
+    def setUp(self):
+        """Create two CSV payloads as served by dr18.sdss.org"""
+        self.payload_a = b"Wavelength,Flux,BestFit,SkyFlux\n3600.1,1.5,1.4,2.0\n3601.2,2.5,2.4,3.0\n"
+        self.payload_b = b"Wavelength,Flux,BestFit,SkyFlux\n4000.0,0.5,0.4,1.0"
+        self.row = Table({'plate': np.array([15150]), 'mjd': np.array([59291]), 'fiberid': np.array([1])})[0]
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_fast_path_matches_read_csv(self, mock_get):
+        """Tests that the fast parser returns the same DataFrame as the default path"""
+        mock_get.return_value = MagicMock(status_code=200, content=self.payload_a, text=self.payload_a.decode())
+        extractor = SpectraExtract(self.row)
+
+        slow = extractor.extract_spectra()
+        fast = extractor.extract_spectra(fast=True)
+
+        self.assertEqual(fast.columns.tolist(), slow.columns.tolist())
+        np.testing.assert_array_equal(fast.to_numpy(), slow.to_numpy())
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_empty_fields_match_read_csv(self, mock_get):
+        """Tests that empty fields are NaN in both paths"""
+        payload = b"Wavelength,Flux,BestFit,SkyFlux\n3600.1,,1.4,2.0\n3601.2,2.5,2.4,\n"
+        mock_get.return_value = MagicMock(status_code=200, content=payload, text=payload.decode())
+        extractor = SpectraExtract(self.row)
+
+        slow = extractor.extract_spectra()
+        fast = extractor.extract_spectra(fast=True)
+        np.testing.assert_array_equal(fast.to_numpy(), slow.to_numpy())
+        self.assertTrue(np.isnan(fast['Flux'][0]) and np.isnan(fast['SkyFlux'][1]))
+
+        values, _ = parse_spectra_csv_batch([payload, self.payload_b])
+        self.assertEqual(int(np.isnan(values).sum()), 2)
+
+    def test_header_only(self):
+        """Tests that a payload without data lines gives an empty DataFrame, without warnings"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            data = parse_spectra_csv(b"Wavelength,Flux,BestFit,SkyFlux\n")
+        self.assertTrue(data.empty)
+        self.assertEqual(data.columns.tolist(), ['Wavelength', 'Flux', 'BestFit', 'SkyFlux'])
+
+    def test_unexpected_header(self):
+        """Tests that a payload with other columns or fields that are not numbers raise ValueError"""
+        with self.assertRaises(ValueError):
+            parse_spectra_csv(b"a,b\n1,2\n")
+        with self.assertRaises(ValueError):
+            parse_spectra_csv(b"Wavelength,Flux,BestFit,SkyFlux\n1,x,3,4\n")
+
+    def test_batch_parsing(self):
+        """Tests that several payloads are stacked into one array with offsets"""
+        out = np.zeros((3, 4), dtype=np.float32)
+        values, offsets = parse_spectra_csv_batch([self.payload_a, self.payload_b], out=out)
+
+        self.assertIs(values, out)
+        np.testing.assert_array_equal(offsets, [0, 2, 3])
+        np.testing.assert_allclose(values[2], [4000.0, 0.5, 0.4, 1.0])
+
+        with self.assertRaises(ValueError):
+            parse_spectra_csv_batch([self.payload_a], out=out)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
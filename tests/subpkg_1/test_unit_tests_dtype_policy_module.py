@@ -0,0 +1,171 @@
+"""This unit test module runs tests for dtype_policy_module.py"""
+
+import contextlib
+import io
+import multiprocessing
+import os
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from group9_package.subpkg_1.dtype_policy_module import as_float, configure_float_dtype, float_dtype, get_float_dtype
+from group9_package.subpkg_1.core_functions_module_extract import parse_fits_bintable, parse_spectra_csv
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor, WavelengthAlignment
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+from group9_package.subpkg_1.local_service_module import spectrum_payload
+from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier
+
+def run_pipeline(n=4600, seed=0):
+    """Runs preprocessing, alignment, augmentation and classification on synthetic
+    spectra, returning the output of every step"""
+    rng = np.random.default_rng(seed)
+    wavelength = np.geomspace(3600, 10400, n)
+    continuum = 10 + 5 * np.exp(-((wavelength - 6000) / 2000) ** 2)
+    lite = pd.DataFrame({'Wavelength': wavelength, 'Flux': continuum + rng.normal(0, 1, n),
+                         'BestFit': continuum, 'SkyFlux': rng.uniform(0, 5, n)})
+    full = pd.DataFrame({'loglam': np.linspace(3.5563, 4.0170, n), 'flux': rng.normal(10, 3, n),
+                         'ivar': rng.uniform(0.1, 1, n), 'and_mask': np.zeros(n, dtype=np.int32),
+                         'or_mask': np.zeros(n, dtype=np.int32), 'wdisp': rng.uniform(1, 2, n),
+                         'sky': rng.uniform(0, 5, n), 'model': rng.normal(10, 1, n)})
+    labels = pd.Series(np.array(['galaxy', 'star', 'qso'])[rng.integers(0, 3, n)])
+    features = pd.DataFrame(rng.normal(0, 1, (n, 8)) + labels.map({'galaxy': 0, 'star': 2, 'qso': 4}).to_numpy()[:, None])
+
+    outputs = {}
+    preprocessor = DataPreprocessor(None, data=lite.copy())
+    preprocessor.normalize_data()
+    outputs['normalize_data'] = preprocessor.data.copy()
+    preprocessor.remove_outliers()
+    outputs['remove_outliers'] = preprocessor.data.copy()
+    preprocessor = DataPreprocessor(None, data=lite.copy())
+    preprocessor.interpolate_data(np.geomspace(3700, 10300, n))
+    outputs['interpolate_data'] = preprocessor.data
+    outputs['wavelength_align'] = WavelengthAlignment.WavelengthAlign(full, (3.6, 4.0))
+    outputs['augment'] = DataAugmentation(lite.copy()).augment_both_derivatives('Flux', 0.5)
+
+    classifier = CelestialObjectClassifier()
+    # predict prints the confusion matrix
+    with contextlib.redirect_stdout(io.StringIO()):
+        classifier.fit(features, labels)
+        outputs['predict'] = classifier.predict(features, labels)
+    outputs['predict_proba'] = classifier.predict_proba(features)
+    return outputs
+
+class TestDtypePolicy(unittest.TestCase):
+    """A class for testing the configuration of the float dtype"""
+    def setUp(self):
+        """Keep the configured dtype, so tests can change it"""
+        self.previous = get_float_dtype()
+
+    def tearDown(self):
+        """Restore the configured dtype"""
+        configure_float_dtype(self.previous)
+
+    def test_configure(self):
+        """Tests configuring, restoring and rejecting float dtypes"""
+        configure_float_dtype(None)
+        self.assertIsNone(configure_float_dtype('float32'))
+        self.assertEqual(get_float_dtype(), np.float32)
+        with float_dtype(np.float64) as dtype:
+            self.assertEqual(dtype, np.float64)
+        self.assertEqual(get_float_dtype(), np.float32)
+        for dtype in ('float16', 'int32', 'not a dtype'):
+            with self.assertRaises(ValueError):
+                configure_float_dtype(dtype)
+        self.assertEqual(get_float_dtype(), np.float32)
+
+    def test_spawned_workers_follow_the_policy(self):
+        """Tests that processes spawned after configuring the dtype compute in it"""
+        context = multiprocessing.get_context('spawn')
+        with float_dtype('float32'):
+            self.assertEqual(os.environ['GROUP9_FLOAT_DTYPE'], 'float32')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                self.assertEqual(pool.submit(get_float_dtype).result(), np.float32)
+                self.assertEqual(pool.submit(as_float, np.ones(2)).result().dtype, np.float32)
+
+        configure_float_dtype(None)
+        self.assertNotIn('GROUP9_FLOAT_DTYPE', os.environ)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            self.assertIsNone(pool.submit(get_float_dtype).result())
+
+    def test_as_float(self):
+        """Tests that only floating point values are converted, and only when needed"""
+        frame = pd.DataFrame({'flux': np.ones(4), 'mask': np.zeros(4, dtype=np.int32), 'name': list('abcd')})
+        configure_float_dtype(None)
+        self.assertIs(as_float(frame), frame)
+
+        configure_float_dtype('float32')
+        converted = as_float(frame)
+        self.assertEqual(converted['flux'].dtype, np.float32)
+        self.assertEqual(converted['mask'].dtype, np.int32)
+        self.assertEqual(converted['name'].dtype, object)
+        self.assertEqual(frame['flux'].dtype, np.float64)
+        self.assertIs(as_float(converted), converted)
+
+        values = np.ones(3, dtype='>f8')
+        self.assertEqual(as_float(values).dtype, np.float32)
+        self.assertEqual(as_float(values, 'float64').dtype, np.dtype('=f8'))
+        self.assertEqual(as_float(frame['flux']).dtype, np.float32)
+        self.assertEqual(as_float([1.5, 2.5]).dtype, np.float32)
+        self.assertEqual(as_float(np.arange(3)).dtype, np.arange(3).dtype)
+
+    def test_parsers(self):
+        """Tests that the CSV and FITS parsers produce the configured dtype"""
+        csv = b"Wavelength,Flux,BestFit,SkyFlux\n3800.0,1.5,1.4,0.2\n3801.0,1.6,1.5,0.3\n"
+        fits_bytes = spectrum_payload('fits', 15150, 59291, 1, n_samples=50)
+
+        configure_float_dtype(None)
+        self.assertEqual(set(parse_spectra_csv(csv).dtypes), {np.dtype(np.float64)})
+        self.assertEqual(parse_fits_bintable(fits_bytes)['flux'].dtype, np.float32)
+
+        configure_float_dtype('float32')
+        self.assertEqual(set(parse_spectra_csv(csv).dtypes), {np.dtype(np.float32)})
+        self.assertEqual(set(parse_spectra_csv(csv, dtype=np.float64).dtypes), {np.dtype(np.float64)})
+
+        configure_float_dtype('float64')
+        coadd = parse_fits_bintable(fits_bytes)
+        self.assertEqual(coadd['flux'].dtype, np.float64)
+        self.assertEqual(coadd['and_mask'].dtype, np.int32)
+
+class TestFloat32Accuracy(unittest.TestCase):
+    """A class comparing every step computed in float32 with the float64 results"""
+    @classmethod
+    def setUpClass(cls):
+        """Run the pipeline in both precisions"""
+        with float_dtype('float64'):
+            cls.reference = run_pipeline()
+        with float_dtype('float32'):
+            cls.reduced = run_pipeline()
+
+    # largest error relative to the largest value of each column
+    TOLERANCES = {
+        'normalize_data': 1e-6,
+        'remove_outliers': 1e-6,
+        'interpolate_data': 1e-4,
+        'wavelength_align': 1e-6,
+        'augment': 1e-6,
+    }
+
+    def test_frames(self):
+        """Tests that float32 steps keep float32 columns and match the float64 results"""
+        for name, tolerance in self.TOLERANCES.items():
+            reference, reduced = self.reference[name], self.reduced[name]
+            with self.subTest(step=name):
+                self.assertEqual(list(reduced.columns), list(reference.columns))
+                for column in reference.columns:
+                    if reference[column].dtype.kind != 'f':
+                        self.assertEqual(reduced[column].dtype, reference[column].dtype)
+                        continue
+                    self.assertEqual(reduced[column].dtype, np.float32)
+                    np.testing.assert_array_equal(reduced[column].isna(), reference[column].isna())
+                    error = np.nanmax(np.abs(reduced[column].to_numpy(np.float64) - reference[column]))
+                    self.assertLessEqual(error, tolerance * np.nanmax(np.abs(reference[column])), column)
+                self.assertLess(reduced.memory_usage().sum(), 0.6 * reference.memory_usage().sum())
+
+    def test_classifier(self):
+        """Tests that a classifier trained on float32 features predicts like the float64 one"""
+        np.testing.assert_array_equal(self.reduced['predict'], self.reference['predict'])
+        self.assertEqual(self.reduced['predict_proba'].dtype, np.float32)
+        np.testing.assert_allclose(self.reduced['predict_proba'], self.reference['predict_proba'], atol=1e-2)
+
+if __name__ == '__main__':
+    unittest.main()
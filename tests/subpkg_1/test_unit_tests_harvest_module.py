@@ -0,0 +1,117 @@
+"""This unit test module runs tests for harvest_module.py"""
+
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from astropy.table import Table
+from group9_package.subpkg_1.harvest_module import SkyRegionHarvester
+
+class TestSkyRegionHarvester(unittest.TestCase):
+    """A class for testing our methods in the SkyRegionHarvester Class"""
+    def setUp(self):
+        """Create a temporary checkpoint directory and a fake SkyServer"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        """Remove the checkpoint directory"""
+        self.tmpdir.cleanup()
+
+    def fake_query(self, query):
+        """Returns two rows per cell, one of which is shared by every cell"""
+        with self.lock:
+            self.calls.append(query)
+            n = len(self.calls)
+        return Table({'specObjID': [0, n], 'ra': [1.0, 2.0], 'dec': [3.0, 4.0]})
+
+    def test_invalid_region(self):
+        """Tests that invalid regions and settings raise ValueError"""
+        with self.assertRaises(ValueError):
+            SkyRegionHarvester(['ra'], (0, 10), (5, 0))
+
+        with self.assertRaises(ValueError):
+            SkyRegionHarvester(['ra'], (0, 10), (0, 5), cell_size=0)
+
+    def test_cells_cover_region(self):
+        """Tests the tiling, including regions that wrap around RA = 0"""
+        cells = SkyRegionHarvester(['ra'], (350, 10), (-2, 2), cell_size=5).cells()
+        self.assertEqual(len(cells), 4 * 1)
+        self.assertEqual([cell[0] for cell in cells], [350, 355, 0, 5])
+        self.assertEqual(cells[1][1], 360.0)
+        self.assertEqual([cell[4] for cell in cells], [False, False, False, True])
+
+    def test_cell_query_edges(self):
+        """Tests that only the upper edges of the region are included"""
+        harvester = SkyRegionHarvester(['ra', 'dec'], (0, 2), (0, 1), cell_size=1,
+                                       configure=lambda query: query.classes('qso'))
+        first, last = [harvester.cell_query(cell) for cell in harvester.cells()]
+
+        self.assertIn("SELECT ra, dec, specObjID FROM specObj", first)
+        self.assertIn("ra < 1.0", first)
+        self.assertIn("ra <= 2.0", last)
+        self.assertIn("class IN ('QSO')", last)
+
+    def test_cell_query_wrapping_top_row(self):
+        """Tests that a cell crossing RA = 0 in the top row keeps both sides of RA = 0"""
+        harvester = SkyRegionHarvester(['ra', 'dec'], (355, 5), (0, 2), cell_size=4)
+        cells = harvester.cells()
+        wrapping = [cell for cell in cells if cell[0] > cell[1]]
+        self.assertEqual(len(wrapping), 1)
+        self.assertEqual(wrapping[0][4:], (False, True))
+
+        ra_min, ra_max = wrapping[0][:2]
+        query = harvester.cell_query(wrapping[0])
+        self.assertIn(f"(ra >= {ra_min!r} OR ra < {ra_max!r})", query)
+        self.assertIn("dec <= 2.0", query)
+
+        # every position of the region, on both sides of RA = 0, belongs to exactly one cell
+        where = [harvester.cell_query(cell).split(' WHERE ')[1].replace(' AND ', ' and ').replace(' OR ', ' or ')
+                 for cell in cells]
+        for ra, dec in [(355.0, 0.0), (359.0, 2.0), (359.0, 1.0), (0.0, 2.0), (1.0, 1.0), (ra_max, 2.0), (5.0, 2.0)]:
+            inside = [eval(condition, {}, {'ra': ra, 'dec': dec}) for condition in where]
+            self.assertEqual(sum(inside), 1, (ra, dec))
+            self.assertEqual(inside[cells.index(wrapping[0])], ra >= ra_min or ra < ra_max, (ra, dec))
+
+    def test_harvest_deduplicates(self):
+        """Tests that rows returned by several cells are kept once"""
+        harvester = SkyRegionHarvester(['ra', 'dec'], (0, 4), (0, 2), cell_size=1, max_workers=3)
+        with patch('group9_package.subpkg_1.core_functions_module_extract.SDSS.query_sql', side_effect=self.fake_query):
+            result = harvester.harvest()
+
+        self.assertEqual(len(self.calls), 8)
+        self.assertEqual(len(result), 9)
+        self.assertEqual(sorted(result['specObjID'].tolist()), list(range(9)))
+
+    def test_resume_after_failure(self):
+        """Tests that a second harvest only re-queries the cells that failed"""
+        def flaky(query):
+            if 'ra < 1.0' in query and not getattr(flaky, 'recovered', False):
+                raise ConnectionError("server error")
+            return self.fake_query(query)
+
+        harvester = SkyRegionHarvester(['ra'], (0, 2), (0, 1), cell_size=1, checkpoint_dir=self.tmpdir.name)
+        with patch('group9_package.subpkg_1.core_functions_module_extract.SDSS.query_sql', side_effect=flaky):
+            with self.assertRaises(RuntimeError):
+                harvester.harvest()
+            self.assertEqual(len(harvester.failures), 1)
+            self.assertEqual(len(self.calls), 1)
+
+            flaky.recovered = True
+            result = harvester.harvest()
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(result), 3)
+
+    def test_empty_cells(self):
+        """Tests that cells without results are handled and checkpointed"""
+        harvester = SkyRegionHarvester(['ra'], (0, 2), (0, 1), cell_size=1, checkpoint_dir=self.tmpdir.name)
+        with patch('group9_package.subpkg_1.core_functions_module_extract.SDSS.query_sql', return_value=None) as mock_query:
+            self.assertEqual(len(harvester.harvest()), 0)
+            harvester.harvest()
+
+        self.assertEqual(mock_query.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
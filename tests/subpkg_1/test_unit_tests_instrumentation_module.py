@@ -0,0 +1,256 @@
+"""This unit test module runs tests for instrumentation_module.py"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1 import instrumentation_module, rate_limiter_module
+from group9_package.subpkg_1.instrumentation_module import (
+    Instrumentation, configure_instrumentation, count, data_nbytes, get_instrumentation, instrumented, peak_rss, stage)
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor, WavelengthAlignment
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+from group9_package.subpkg_1.rate_limiter_module import configure_rate_limit
+from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier
+
+# largest allocation peak of each stage on the standard workloads, relative to its input
+MEMORY_BUDGETS = {
+    'preprocess.normalize_data': 2.25,
+    'preprocess.remove_outliers': 1.0,
+    'preprocess.interpolate_data': 5.0,
+    'align.wavelength_align': 2.25,
+    'augment.derivative': 1.0,
+    'augment.fractional_derivative': 1.0,
+    'classify.fit': 1.5,
+    'classify.predict': 1.0,
+    'classify.predict_proba': 1.0,
+}
+
+def run_standard_workloads(n):
+    """Runs the preprocessing, alignment, augmentation and classification steps on n-sample inputs"""
+    rng = np.random.default_rng(0)
+    lite = lambda: pd.DataFrame({'Wavelength': np.linspace(3600, 10400, n), 'Flux': rng.normal(10, 3, n),
+                                 'BestFit': rng.normal(10, 1, n), 'SkyFlux': rng.uniform(0, 5, n)})
+    preprocessor = DataPreprocessor(None, data=lite())
+    preprocessor.normalize_data()
+    preprocessor.remove_outliers()
+    preprocessor.interpolate_data(np.linspace(3700, 10300, n))
+
+    full = pd.DataFrame({'loglam': np.linspace(3.5563, 4.0170, n), 'flux': rng.normal(10, 3, n),
+                         'ivar': rng.uniform(0.1, 1, n), 'and_mask': np.zeros(n, dtype=np.int32),
+                         'or_mask': np.zeros(n, dtype=np.int32), 'wdisp': rng.uniform(1, 2, n),
+                         'sky': rng.uniform(0, 5, n), 'model': rng.normal(10, 1, n)})
+    WavelengthAlignment.WavelengthAlign(full, (3.6, 4.0))
+
+    augmentation = DataAugmentation(lite())
+    augmentation.compute_derivative('Flux')
+    augmentation.compute_fractional_derivative('Flux', 0.5)
+
+    labels = pd.Series(np.array(['galaxy', 'star', 'qso'])[rng.integers(0, 3, n)])
+    features = pd.DataFrame(rng.normal(0, 1, (n, 8)) + (labels == 'star').to_numpy()[:, None] * 2.0)
+    classifier = CelestialObjectClassifier()
+    # predict prints the confusion matrix
+    with contextlib.redirect_stdout(io.StringIO()):
+        classifier.fit(features, labels)
+        classifier.predict(features, labels)
+        classifier.predict_proba(features)
+
+class TestInstrumentation(unittest.TestCase):
+    """A class for testing our methods in the Instrumentation Class"""
+    def setUp(self):
+        """Keep the package instrumentation, so tests can replace it"""
+        self.default = instrumentation_module._INSTRUMENTATION
+
+    def tearDown(self):
+        """Restore the package instrumentation"""
+        instrumentation_module._INSTRUMENTATION = self.default
+
+    def test_disabled_by_default(self):
+        """Tests that nothing is recorded until instrumentation is configured"""
+        instrumentation_module._INSTRUMENTATION = Instrumentation(enabled=False)
+        with stage('idle'):
+            count('requests')
+        self.assertEqual(get_instrumentation().snapshot(), {'timers': {}, 'counters': {}})
+        self.assertIs(stage('idle'), instrumentation_module._NULL_STAGE)
+
+    def test_stages_and_counters(self):
+        """Tests that nested stages, errors and counters are recorded"""
+        instrumentation = configure_instrumentation()
+        with stage('outer'):
+            with stage('inner'):
+                count('bytes_downloaded', 100)
+            count('bytes_downloaded', 20)
+        with self.assertRaises(KeyError):
+            with stage('inner'):
+                raise KeyError
+
+        metrics = instrumentation.snapshot()
+        self.assertEqual(metrics['counters'], {'bytes_downloaded': 120})
+        self.assertEqual(metrics['timers']['inner']['count'], 2)
+        self.assertEqual(metrics['timers']['inner']['errors'], 1)
+        self.assertEqual(metrics['timers']['outer']['errors'], 0)
+        self.assertGreaterEqual(metrics['timers']['outer']['total_seconds'],
+                                metrics['timers']['inner']['min_seconds'])
+
+        instrumentation.reset()
+        self.assertEqual(instrumentation.snapshot(), {'timers': {}, 'counters': {}})
+
+    def test_threads(self):
+        """Tests that stages and counters of concurrent threads are all recorded"""
+        instrumentation = configure_instrumentation()
+        work = instrumented('work')(lambda: count('items'))
+        threads = [threading.Thread(target=lambda: [work() for _ in range(500)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        metrics = instrumentation.snapshot()
+        self.assertEqual(metrics['counters']['items'], 2000)
+        self.assertEqual(metrics['timers']['work']['count'], 2000)
+
+    def test_exports(self):
+        """Tests the JSON and Prometheus exports"""
+        instrumentation = configure_instrumentation()
+        with stage('extract.download'):
+            count('bytes_downloaded', 42)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            text = instrumentation.to_json(path)
+            with open(path) as file:
+                self.assertEqual(json.load(file), json.loads(text))
+        self.assertEqual(json.loads(text)['counters'], {'bytes_downloaded': 42})
+
+        prometheus = instrumentation.to_prometheus()
+        self.assertIn('# TYPE group9_stage_seconds summary', prometheus)
+        self.assertIn('group9_stage_seconds_count{stage="extract.download"} 1', prometheus)
+        self.assertIn('group9_bytes_downloaded_total 42', prometheus)
+
+    def test_profile_and_memory(self):
+        """Tests the optional cProfile and tracemalloc capture"""
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        instrumentation = configure_instrumentation(profile=True, trace_memory=True)
+        with self.assertRaises(ValueError):
+            instrumentation.profile_report()
+        with stage('allocate'):
+            data = np.ones(1_000_000)
+            del data
+
+        timer = instrumentation.snapshot()['timers']['allocate']
+        self.assertGreaterEqual(timer['memory_peak_bytes'], 8_000_000)
+        self.assertLess(timer['memory_delta_bytes'], 1_000_000)
+        self.assertIn('function calls', instrumentation.profile_report())
+        self.assertIn('group9_stage_memory_peak_bytes', instrumentation.to_prometheus())
+
+        with self.assertRaises(ValueError):
+            Instrumentation().profile_report()
+
+    def test_memory_report(self):
+        """Tests that stages allocating much more than their input are flagged"""
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        instrumentation = configure_instrumentation(trace_memory=True)
+        with self.assertRaises(ValueError):
+            Instrumentation().memory_report()
+
+        data = np.ones(100_000)
+        lean = instrumented('lean')(lambda values: values.sum())
+        copying = instrumented('copying')(lambda values: [values * 2, values * 3, values * 4][0])
+        lean(data)
+        kept = copying(values=data)
+
+        report = instrumentation.memory_report()
+        self.assertGreater(report['peak_rss_bytes'], 10_000_000)
+        self.assertEqual(list(report['stages']), ['copying', 'lean'])
+        self.assertEqual(report['stages']['copying']['input_bytes'], data.nbytes)
+        self.assertGreaterEqual(report['stages']['copying']['peak_to_input'], 3)
+        self.assertEqual(len(report['stages']['copying']['flags']), 2)
+        self.assertEqual(report['stages']['lean']['flags'], [])
+        self.assertIn('group9_process_peak_rss_bytes', instrumentation.to_prometheus())
+        del kept
+
+    def test_data_nbytes(self):
+        """Tests the input size of arrays, DataFrames and objects holding a DataFrame"""
+        frame = pd.DataFrame({'a': np.zeros(100), 'b': np.zeros(100, dtype=np.float32)})
+        self.assertEqual(data_nbytes(np.zeros(10)), 80)
+        self.assertEqual(data_nbytes(frame['a']), 800 + frame.index.nbytes)
+        self.assertEqual(data_nbytes(frame), 1200 + frame.index.nbytes)
+        self.assertEqual(data_nbytes(DataAugmentation(frame), 'Flux', 0.5), data_nbytes(frame))
+        self.assertEqual(data_nbytes(None, 3), 0)
+        self.assertGreater(peak_rss(), 0)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.time.sleep')
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_package_stages(self, mock_get, mock_sleep):
+        """Tests that downloads, retries, preprocessing and augmentation report to the instrumentation"""
+        instrumentation = configure_instrumentation()
+        ok = MagicMock(status_code=200, content=b"Wavelength,Flux,BestFit,SkyFlux\n3800.0,1.5,1.4,0.2\n3801.0,1.6,1.5,0.3\n")
+        mock_get.side_effect = [MagicMock(status_code=500), ok]
+        row = Table({'plate': [15150], 'mjd': [59291], 'fiberid': [1]})[0]
+        data = SpectraExtract(row).extract_spectra(fast=True)
+
+        DataPreprocessor(None, data=pd.DataFrame({'x': np.arange(10.0)})).normalize_data()
+        DataAugmentation(data).compute_derivative('Flux')
+
+        metrics = instrumentation.snapshot()
+        self.assertEqual(metrics['counters'], {'requests': 2, 'retries': 1, 'bytes_downloaded': len(ok.content)})
+        for name in ('extract.download', 'extract.parse', 'preprocess.normalize_data', 'augment.derivative'):
+            self.assertIn(name, metrics['timers'])
+        self.assertEqual(metrics['timers']['extract.download']['count'], 2)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.time.sleep')
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_failed_download_retries(self, mock_get, mock_sleep):
+        """Tests that a download failing every attempt counts one retry less than its requests"""
+        instrumentation = configure_instrumentation()
+        mock_get.return_value = MagicMock(status_code=500)
+        # the errors slow the limiter down, so they must not reach the package limiter
+        self.addCleanup(rate_limiter_module._RATE_LIMITERS.update, dict(rate_limiter_module._RATE_LIMITERS))
+        configure_rate_limit('sdss', 1e6)
+        row = Table({'plate': [15150], 'mjd': [59291], 'fiberid': [1]})[0]
+        with contextlib.redirect_stdout(io.StringIO()):
+            SpectraExtract(row).extract_spectra(fast=True)
+            SpectraExtract(row).extract_spectra_full(stream=True)
+
+        self.assertEqual(instrumentation.snapshot()['counters'], {'requests': 10, 'retries': 8, 'failed_downloads': 2})
+
+class TestMemoryBudgets(unittest.TestCase):
+    """A class asserting the memory budgets of the processing steps on standard workloads"""
+    def setUp(self):
+        """Trace allocations in a fresh instrumentation"""
+        self.default = instrumentation_module._INSTRUMENTATION
+        # import scipy and scikit-learn first: their allocations are not the steps', and
+        # importing them while tracing is slow
+        configure_instrumentation(enabled=False)
+        run_standard_workloads(1000)
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        self.instrumentation = configure_instrumentation(trace_memory=True)
+
+    def tearDown(self):
+        """Restore the package instrumentation"""
+        instrumentation_module._INSTRUMENTATION = self.default
+
+    def test_memory_budgets(self):
+        """Tests that no step allocates more than its budget, relative to its input, at its peak"""
+        run_standard_workloads(20_000)
+
+        stages = self.instrumentation.memory_report()['stages']
+        self.assertEqual(set(stages), set(MEMORY_BUDGETS))
+        for name, budget in MEMORY_BUDGETS.items():
+            with self.subTest(stage=name):
+                self.assertLessEqual(stages[name]['memory_peak_bytes'], budget * stages[name]['input_bytes'])
+        self.assertEqual(stages['preprocess.remove_outliers']['flags'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""This unit test module runs tests for lazy_import_module.py"""
+
+import json
+import os
+import unittest
+from unittest.mock import patch
+from group9_package.subpkg_1.lazy_import_module import LazyImport, measure_import_time
+
+# dependencies that must only be imported when a method needs them
+HEAVY_MODULES = ('astroquery.sdss', 'astroquery.gaia', 'scipy', 'matplotlib', 'sklearn')
+
+class TestLazyImport(unittest.TestCase):
+    """A class for testing our methods in the LazyImport Class"""
+    def test_loads_on_first_use(self):
+        """Tests that the import happens on first attribute access or call"""
+        decoder = LazyImport('json', 'JSONDecoder')
+        self.assertFalse(decoder.loaded)
+        self.assertIn('lazy import of json.JSONDecoder', repr(decoder))
+
+        self.assertEqual(decoder().decode('[1, 2]'), [1, 2])
+        self.assertTrue(decoder.loaded)
+
+        module = LazyImport('json')
+        self.assertIs(module.loads, json.loads)
+        self.assertIn('dumps', dir(module))
+
+    def test_missing_module(self):
+        """Tests that a missing module only fails when it is used"""
+        missing = LazyImport('group9_package.no_such_module')
+        with self.assertRaises(ImportError):
+            missing.anything
+
+    def test_patching_forwards_to_real_object(self):
+        """Tests that patching through the stand-in patches, then restores, the real object"""
+        path = LazyImport('os.path')
+        with patch.object(path, 'exists', return_value='patched'):
+            self.assertEqual(os.path.exists('/'), 'patched')
+            self.assertEqual(path.exists('/'), 'patched')
+        self.assertIs(path.exists('/'), True)
+
+class TestImportTime(unittest.TestCase):
+    """A class checking with python -X importtime that importing the package stays cheap"""
+    def test_heavy_dependencies_are_lazy(self):
+        """Tests that importing the main modules does not import astroquery, scipy, matplotlib or sklearn"""
+        for module in ('group9_package.subpkg_1.core_functions_module_modify',
+                       'group9_package.subpkg_1.visualize_module',
+                       'group9_package.subpkg_2.cross_matching_module',
+                       'group9_package.subpkg_2.machine_learning_module',
+                       'group9_package.subpkg_2.pipeline_module'):
+            with self.subTest(module=module):
+                timings = measure_import_time(module)
+                self.assertIn(module, timings)
+                self.assertEqual([name for name in HEAVY_MODULES if name in timings], [])
+
+    def test_failed_import(self):
+        """Tests that an import error in the child interpreter raises RuntimeError"""
+        with self.assertRaises(RuntimeError):
+            measure_import_time('group9_package.no_such_module')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""This unit test module runs tests for local_service_module.py"""
+
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from astroquery.exceptions import RemoteServiceError
+from group9_package.subpkg_1 import rate_limiter_module
+from group9_package.subpkg_1.async_extract_module import AsyncSpectraClient
+from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase, SpectraExtract
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor
+from group9_package.subpkg_1.local_service_module import LocalSDSSService, make_spectrum, spectrum_payload
+from group9_package.subpkg_1.rate_limiter_module import configure_rate_limit
+from group9_package.subpkg_1.service_urls_module import is_default_service
+from group9_package.subpkg_2.cross_matching_module import CrossMatchingModule
+
+class TestLocalSDSSService(unittest.TestCase):
+    """A class for testing the package end to end against LocalSDSSService"""
+    def setUp(self):
+        """Lift the rate limits"""
+        self.defaults = dict(rate_limiter_module._RATE_LIMITERS)
+        configure_rate_limit('sdss', 10000)
+        configure_rate_limit('gaia', 10000)
+        self.row = Table({'plate': [15150], 'mjd': [59291], 'fiberid': [7]})[0]
+
+    def tearDown(self):
+        """Restore the default limiters"""
+        rate_limiter_module._RATE_LIMITERS.update(self.defaults)
+
+    def test_invalid_settings(self):
+        """Tests that out of range settings raise ValueError"""
+        for settings in ({'latency': -1}, {'error_rate': 1.5}, {'bandwidth': 0}):
+            with self.assertRaises(ValueError):
+                LocalSDSSService(**settings)
+
+    def test_synthetic_spectra(self):
+        """Tests that spectra are deterministic and shaped like SDSS spectra"""
+        first, second = make_spectrum(1, 2, 3, n_samples=100), make_spectrum(1, 2, 3, n_samples=100)
+        np.testing.assert_array_equal(first['flux'], second['flux'])
+        self.assertEqual(first['flux'].dtype, np.float32)
+        self.assertTrue(spectrum_payload('csv', 1, 2, 3, 100).startswith(b'Wavelength,Flux,BestFit,SkyFlux\n'))
+        self.assertTrue(spectrum_payload('fits', 1, 2, 3, 100).startswith(b'SIMPLE  ='))
+
+    def test_spectra_end_to_end(self):
+        """Tests the CSV, FITS and streamed FITS downloads of SpectraExtract"""
+        with LocalSDSSService(n_samples=500) as service, service.use():
+            self.assertFalse(is_default_service('sdss_spectrum'))
+            lite = SpectraExtract(self.row).extract_spectra()
+            full = SpectraExtract(self.row).extract_spectra_full()
+            streamed = SpectraExtract(self.row).extract_spectra_full(stream=True)
+            self.assertEqual(service.stats['requests'], 3)
+        self.assertTrue(is_default_service('sdss_spectrum'))
+
+        self.assertEqual(list(lite.columns), ['Wavelength', 'Flux', 'BestFit', 'SkyFlux'])
+        self.assertEqual(len(lite), 500)
+        self.assertEqual(list(full.columns), ['loglam', 'flux', 'ivar', 'and_mask', 'or_mask', 'wdisp', 'sky', 'model'])
+        np.testing.assert_array_equal(streamed['flux'], full['flux'])
+
+    def test_queries_end_to_end(self):
+        """Tests SkyServer SQL queries and the Gaia cross-match without astroquery"""
+        with LocalSDSSService(tap_rows=20) as service, service.use():
+            base = SpectralAnalysisBase("SELECT TOP 4 s.plate, s.mjd, s.fiberid, s.class FROM specObj AS s")
+            base.execute_query()
+            preprocessor = DataPreprocessor("SELECT ra, dec FROM PhotoObj")
+            with self.assertRaises(RemoteServiceError):
+                SpectralAnalysisBase("SELECT FROM").execute_query()
+            matches = CrossMatchingModule().cross_match(10, 6279435494640163584)
+
+        self.assertEqual(base.data.colnames, ['plate', 'mjd', 'fiberid', 'class'])
+        self.assertEqual(len(base.data), 4)
+        self.assertEqual(preprocessor.data.shape, (10, 2))
+        self.assertTrue((matches['angular_distance'] <= 10).all())
+        self.assertLess(len(matches), 20)
+
+    def test_async_client_uses_configuration(self):
+        """Tests that AsyncSpectraClient picks up the configured addresses"""
+        rows = Table({'plate': np.full(20, 15150), 'mjd': np.full(20, 59291), 'fiberid': np.arange(20)})
+
+        async def run():
+            async with AsyncSpectraClient(max_concurrency=8, delay=0) as client:
+                return await client.extract_many(rows)
+
+        with LocalSDSSService(latency=0.05) as service, service.use():
+            results = asyncio.run(run())
+            self.assertEqual(service.stats['max_in_flight'], 8)
+        self.assertTrue(all(isinstance(result, pd.DataFrame) for result in results))
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.time.sleep')
+    def test_errors(self, mock_sleep):
+        """Tests that the error rate makes requests fail with status 500"""
+        with LocalSDSSService(error_rate=1.0) as service, service.use():
+            self.assertIsNone(SpectraExtract(self.row).extract_spectra())
+            self.assertEqual(service.stats['errors'], 5)
+
+    def test_bandwidth_and_stop(self):
+        """Tests that the bandwidth limit slows transfers and that stop interrupts slow answers"""
+        payload = len(spectrum_payload('csv', 15150, 59291, 7, 1000))
+        with LocalSDSSService(n_samples=1000, bandwidth=payload / 0.5) as service, service.use():
+            start = time.perf_counter()
+            SpectraExtract(self.row).extract_spectra()
+            self.assertGreater(time.perf_counter() - start, 0.4)
+            self.assertEqual(service.stats['bytes_sent'], payload)
+
+        service = LocalSDSSService(latency=30).start()
+        client = AsyncSpectraClient(spectrum_url=service.spectrum_url, retries=1)
+
+        async def run():
+            async with client:
+                task = asyncio.ensure_future(client.extract_spectra(self.row))
+                await asyncio.sleep(0.2)
+                await asyncio.get_running_loop().run_in_executor(None, service.stop)
+                return await asyncio.gather(task, return_exceptions=True)
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""This unit test module runs tests for query_builder_module.py"""
+
+import unittest
+from unittest.mock import patch
+import numpy as np
+from astropy.table import Table
+from group9_package.subpkg_1.query_builder_module import SkyServerQuery
+from group9_package.subpkg_1.core_functions_module_extract import SpectralAnalysisBase
+
+class TestSkyServerQuery(unittest.TestCase):
+    """A class for testing our methods in the SkyServerQuery Class"""
+    def test_select_only(self):
+        """Tests a query with only a select list"""
+        query = SkyServerQuery().select('bestObjID', 'ra', 'dec').build()
+        self.assertEqual(query, "SELECT bestObjID, ra, dec FROM specObj")
+
+    def test_all_filters(self):
+        """Tests that every filter is pushed into the WHERE clause"""
+        query = (SkyServerQuery().select('bestObjID', 'z').top(10)
+                 .box(10, 20, -5, 5).redshift(0.1, 0.3).classes('galaxy', 'qso').where('zWarning = 0').build())
+
+        self.assertEqual(query, "SELECT TOP 10 bestObjID, z FROM specObj WHERE "
+                                "(ra >= 10.0 AND ra < 20.0 AND dec >= -5.0 AND dec < 5.0) AND (z >= 0.1) AND (z <= 0.3) "
+                                "AND (class IN ('GALAXY', 'QSO')) AND (zWarning = 0)")
+        SpectralAnalysisBase.query_validation(query)
+
+    def test_box_wraps_around_zero(self):
+        """Tests that a box crossing RA = 0 uses an OR on right ascension"""
+        query = SkyServerQuery().select('ra').box(350, 10, 0, 1, closed=True).build()
+        self.assertIn("(ra >= 350.0 OR ra <= 10.0)", query)
+        self.assertIn("dec <= 1.0", query)
+
+        query = SkyServerQuery().select('ra').box(350, 10, 0, 1, closed_ra=False, closed_dec=True).build()
+        self.assertIn("(ra >= 350.0 OR ra < 10.0)", query)
+        self.assertIn("dec <= 1.0", query)
+
+    def test_cone(self):
+        """Tests that a cone uses a declination band and the SkyServer distance function"""
+        query = SkyServerQuery().select('ra').cone(180, 0, 0.5).build()
+        self.assertIn("dec BETWEEN -0.5 AND 0.5", query)
+        self.assertIn("dbo.fDistanceArcMinEq(ra, dec, 180.0, 0.0) <= 30.0", query)
+
+        with self.assertRaises(ValueError):
+            SkyServerQuery().cone(180, 0, -1)
+
+    def test_invalid_inputs(self):
+        """Tests that unsafe identifiers, unknown classes and empty selects raise ValueError"""
+        with self.assertRaises(ValueError):
+            SkyServerQuery().select('ra; drop table specObj')
+
+        with self.assertRaises(ValueError):
+            SkyServerQuery().classes('planet')
+
+        with self.assertRaises(ValueError):
+            SkyServerQuery().redshift('low')
+
+        for value in (float('nan'), float('inf'), '-inf', np.nan):
+            with self.assertRaises(ValueError):
+                SkyServerQuery().box(0, value, 0, 1)
+        with self.assertRaises(ValueError):
+            SkyServerQuery().cone(180, 0, float('inf'))
+
+        # missing and non numeric values are rejected before the bounds are compared
+        for args in ((None, 10, 0, 1), (0, 'ten', 0, 1), (0, 10, None, 1)):
+            query = SkyServerQuery()
+            with self.assertRaises(ValueError):
+                query.box(*args)
+            self.assertEqual(query.conditions, [])
+        for args in ((1, 2, None), (None, 2, 1), (1, 'north', 1)):
+            with self.assertRaises(ValueError):
+                SkyServerQuery().cone(*args)
+
+        with self.assertRaises(ValueError):
+            SkyServerQuery().build()
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SDSS.query_sql')
+    def test_execute(self, mock_query_sql):
+        """Tests that execute sends the built query and returns the result"""
+        mock_query_sql.return_value = Table({'bestObjID': [1, 2]})
+        extractor = SkyServerQuery().select('bestObjID').classes('star').execute()
+
+        mock_query_sql.assert_called_once_with("SELECT bestObjID FROM specObj WHERE (class IN ('STAR'))")
+        self.assertEqual(extractor.extract_identifiers().tolist(), [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""This unit test module runs tests for rate_limiter_module.py"""
+
+import asyncio
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from astropy.table import Table
+from group9_package.subpkg_1 import rate_limiter_module
+from group9_package.subpkg_1.rate_limiter_module import TokenBucket, configure_rate_limit, get_rate_limiter
+from group9_package.subpkg_1.core_functions_module_extract import SpectraExtract
+
+def take_tokens(lock_path, n, results):
+    """Takes n tokens from a shared bucket in another process"""
+    bucket = TokenBucket(rate=1, capacity=5, lock_path=lock_path)
+    results.put(sum(bucket.try_acquire() == 0.0 for _ in range(n)))
+
+class TestTokenBucket(unittest.TestCase):
+    """A class for testing our methods in the TokenBucket Class"""
+    def test_invalid_rate(self):
+        """Tests that non positive rates raise ValueError"""
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+    def test_burst_then_wait(self):
+        """Tests that a full bucket allows a burst and then asks callers to wait"""
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertGreater(bucket.try_acquire(), 0.0)
+
+    def test_acquire_blocks_until_refill(self):
+        """Tests that acquire waits about 1 / rate seconds for a token"""
+        bucket = TokenBucket(rate=20, capacity=1)
+        bucket.acquire()
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+
+    def test_acquire_timeout(self):
+        """Tests that acquire gives up after the timeout"""
+        bucket = TokenBucket(rate=0.1, capacity=1)
+        bucket.acquire()
+        self.assertFalse(bucket.acquire(timeout=0.05))
+
+    def test_invalid_tokens(self):
+        """Tests that token counts the bucket can never hold raise ValueError instead of waiting forever"""
+        bucket = TokenBucket(rate=10, capacity=3)
+        for tokens in (0, -1, 3.5):
+            with self.assertRaises(ValueError):
+                bucket.try_acquire(tokens)
+            with self.assertRaises(ValueError):
+                bucket.acquire(tokens)
+            with self.assertRaises(ValueError):
+                asyncio.run(bucket.acquire_async(tokens))
+        self.assertEqual(bucket.try_acquire(3), 0.0)
+
+    def test_penalize_and_reward(self):
+        """Tests the adaptive rate halves on errors and recovers on successes"""
+        bucket = TokenBucket(rate=16, min_rate=2)
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 8)
+        for _ in range(5):
+            bucket.penalize()
+        self.assertEqual(bucket.rate, 2)
+        for _ in range(100):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 16)
+
+    def test_shared_between_processes(self):
+        """Tests that processes using the same lock file share one budget"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lock_path = os.path.join(tmpdir, 'bucket')
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=take_tokens, args=(lock_path, 5, results)) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            # five tokens in the bucket, plus at most a little refill while the processes run
+            taken = sum(results.get() for _ in workers)
+            self.assertGreaterEqual(taken, 5)
+            self.assertLessEqual(taken, 6)
+
+    def test_state_of_earlier_boot_is_reset(self):
+        """Tests that a state file written before a reboot neither blocks nor keeps its penalised rate"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lock_path = os.path.join(tmpdir, 'bucket')
+            bucket = TokenBucket(rate=16, capacity=2, lock_path=lock_path)
+            bucket.penalize()
+            self.assertEqual(bucket.rate, 8)
+
+            # a timestamp far ahead of the clock, as left by a long uptime before a reboot
+            with open(lock_path, 'r+b') as file:
+                tokens, _, rate, origin = struct.unpack(rate_limiter_module._STATE_FORMAT, file.read())
+                file.seek(0)
+                file.write(struct.pack(rate_limiter_module._STATE_FORMAT, -1.0, time.monotonic() + 1e6, rate, origin))
+            self.assertEqual(bucket.try_acquire(), 0.0)
+            self.assertEqual(bucket.rate, 16)
+
+            # a clock origin of another boot
+            bucket.penalize()
+            with open(lock_path, 'r+b') as file:
+                tokens, last, rate, origin = struct.unpack(rate_limiter_module._STATE_FORMAT, file.read())
+                file.seek(0)
+                file.write(struct.pack(rate_limiter_module._STATE_FORMAT, tokens, last, rate, origin - 3600))
+            self.assertEqual(bucket.rate, 16)
+            self.assertEqual(bucket.try_acquire(), 0.0)
+
+class TestServiceLimiters(unittest.TestCase):
+    """A class for testing that package requests go through the service limiters"""
+    def setUp(self):
+        """Keep the default limiters so they can be restored"""
+        self.defaults = dict(rate_limiter_module._RATE_LIMITERS)
+
+    def tearDown(self):
+        """Restore the default limiters"""
+        rate_limiter_module._RATE_LIMITERS.update(self.defaults)
+
+    def test_configure_unknown_service(self):
+        """Tests that configuring an unknown service raises KeyError"""
+        with self.assertRaises(KeyError):
+            configure_rate_limit('unknown', 1)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.time.sleep')
+    @patch('group9_package.subpkg_1.core_functions_module_extract.requests.get')
+    def test_spectra_requests_use_sdss_limiter(self, mock_get, mock_sleep):
+        """Tests that spectrum downloads acquire tokens and server errors slow the limiter down"""
+        limiter = configure_rate_limit('sdss', 100)
+        self.assertIs(get_rate_limiter('sdss'), limiter)
+        mock_get.side_effect = [MagicMock(status_code=500),
+                                MagicMock(status_code=200, text="Wavelength,Flux,BestFit,SkyFlux\n1,2,3,4\n")]
+
+        row = Table({'plate': np.array([15150]), 'mjd': np.array([59291]), 'fiberid': np.array([1])})[0]
+        with patch.object(limiter, 'acquire', wraps=limiter.acquire) as mock_acquire:
+            SpectraExtract(row).extract_spectra()
+
+        self.assertEqual(mock_acquire.call_count, 2)
+        self.assertLess(limiter.rate, 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""This unit test module runs tests for service_urls_module.py"""
+
+import os
+import unittest
+from unittest.mock import patch
+from group9_package.subpkg_1 import service_urls_module
+from group9_package.subpkg_1.core_functions_module_extract import spectrum_url
+from group9_package.subpkg_1.service_urls_module import (
+    SDSS_SPECTRUM_URL, configure_service_urls, get_service_url, is_default_service, reset_service_urls)
+
+class TestServiceUrls(unittest.TestCase):
+    """A class for testing the configuration of the service addresses"""
+    def setUp(self):
+        """Keep the addresses, so tests can change them"""
+        self.saved = dict(service_urls_module._SERVICE_URLS)
+
+    def tearDown(self):
+        """Restore the addresses"""
+        service_urls_module._SERVICE_URLS.update(self.saved)
+
+    def test_configure_and_restore(self):
+        """Tests that configured addresses are used by the package and can be restored"""
+        self.assertTrue(is_default_service('sdss_spectrum'))
+        previous = configure_service_urls(sdss_spectrum='http://127.0.0.1:8080/spectrum/')
+        self.assertEqual(previous, {'sdss_spectrum': SDSS_SPECTRUM_URL})
+        self.assertFalse(is_default_service('sdss_spectrum'))
+        self.assertEqual(spectrum_url(1, 2, 3),
+                         'http://127.0.0.1:8080/spectrum/format=csv/spec=lite?plateid=1&mjd=2&fiberid=3')
+
+        configure_service_urls(**previous)
+        self.assertEqual(get_service_url('sdss_spectrum'), SDSS_SPECTRUM_URL)
+        configure_service_urls(sdss_spectrum='http://localhost', gaia_tap=None)
+        configure_service_urls(sdss_spectrum=None)
+        self.assertTrue(is_default_service('sdss_spectrum'))
+
+    def test_unknown_service(self):
+        """Tests that unknown services raise KeyError"""
+        with self.assertRaises(KeyError):
+            configure_service_urls(sdss_images='http://localhost')
+        with self.assertRaises(KeyError):
+            get_service_url('sdss_images')
+
+    def test_environment(self):
+        """Tests that GROUP9_<SERVICE>_URL environment variables set the starting addresses"""
+        with patch.dict(os.environ, {'GROUP9_GAIA_TAP_URL': 'http://127.0.0.1:9000/tap'}):
+            reset_service_urls()
+            self.assertEqual(get_service_url('gaia_tap'), 'http://127.0.0.1:9000/tap')
+        reset_service_urls()
+        self.assertTrue(is_default_service('gaia_tap'))
+
+if __name__ == '__main__':
+    unittest.main()
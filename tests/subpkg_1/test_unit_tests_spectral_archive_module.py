@@ -0,0 +1,118 @@
+"""This unit test module runs tests for spectral_archive_module.py"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1.spectral_archive_module import SpectralArchive
+from group9_package.subpkg_1.core_functions_module_modify import DataPreprocessor
+from group9_package.subpkg_1.data_augmentation_module import DataAugmentation
+
+def make_full_spectrum(n, seed=0):
+    """Creates a spectrum with the columns returned by extract_spectra_full"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({column: rng.normal(10, 1, n) for column in
+                          ['FLUX', 'LOGLAM', 'IVAR', 'WDISP', 'SKY', 'WRESL', 'MODEL']})
+    frame['AND_MASK'] = rng.integers(0, 8, n)
+    frame['OR_MASK'] = rng.integers(0, 8, n)
+    return frame
+
+class TestSpectralArchive(unittest.TestCase):
+    """A class for testing our methods in the SpectralArchive Class"""
+    def setUp(self):
+        """Create an archive in a temporary directory holding two spectra"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.archive = SpectralArchive(self.tmpdir.name)
+        self.spectra = {(15150, 59291, 1): make_full_spectrum(40, 1), (15150, 59291, 2): make_full_spectrum(25, 2)}
+        for key, data in self.spectra.items():
+            self.archive.append(*key, data)
+
+    def tearDown(self):
+        """Remove the temporary archive"""
+        self.archive = None
+        self.tmpdir.cleanup()
+
+    def test_get_returns_stored_values(self):
+        """Tests that spectra read back match what was appended, as float32 views"""
+        for key, data in self.spectra.items():
+            result = self.archive.get(*key)
+            self.assertEqual(len(result), len(data))
+            np.testing.assert_allclose(result['FLUX'], data['FLUX'].astype(np.float32))
+            np.testing.assert_array_equal(result['AND_MASK'], data['AND_MASK'])
+            self.assertIsInstance(result['FLUX'].values.base, np.memmap)
+
+    def test_missing_and_duplicate_keys(self):
+        """Tests that unknown keys raise KeyError and duplicates raise ValueError"""
+        with self.assertRaises(KeyError):
+            self.archive.get(1, 2, 3)
+
+        with self.assertRaises(ValueError):
+            self.archive.append(15150, 59291, 1, make_full_spectrum(5))
+
+    def test_zero_length_spectra(self):
+        """Tests that an archive holding only empty spectra returns empty columns"""
+        with tempfile.TemporaryDirectory() as path:
+            archive = SpectralArchive(path)
+            archive.append(15150, 59291, 1, make_full_spectrum(0))
+            for reader in (archive, SpectralArchive(path)):
+                result = reader.get(15150, 59291, 1)
+                self.assertEqual(len(result), 0)
+                self.assertEqual(list(result.columns), list(self.archive.get(15150, 59291, 1).columns))
+                self.assertEqual(result['FLUX'].dtype, np.float32)
+
+            archive.append(15150, 59291, 2, make_full_spectrum(5))
+            self.assertEqual(len(archive.get(15150, 59291, 1)), 0)
+            self.assertEqual(len(archive.get(15150, 59291, 2)), 5)
+
+    def test_reopen_and_append(self):
+        """Tests that a reopened archive keeps its index and can be appended to"""
+        reopened = SpectralArchive(self.tmpdir.name)
+        self.assertEqual(reopened.keys(), list(self.spectra))
+
+        reopened.append(15151, 59292, 7, make_full_spectrum(10, 3))
+        self.assertIn((15151, 59292, 7), reopened)
+        np.testing.assert_allclose(reopened.get(15150, 59291, 2)['SKY'],
+                                   self.spectra[(15150, 59291, 2)]['SKY'].astype(np.float32))
+
+    def test_interrupted_append_is_ignored(self):
+        """Tests that column bytes written without an index entry are discarded"""
+        with open(os.path.join(self.tmpdir.name, 'flux.bin'), 'ab') as column_file:
+            column_file.write(b'\x00' * 12)
+
+        reopened = SpectralArchive(self.tmpdir.name)
+        reopened.append(1, 2, 3, make_full_spectrum(4, 4))
+        np.testing.assert_allclose(reopened.get(1, 2, 3)['FLUX'], make_full_spectrum(4, 4)['FLUX'].astype(np.float32))
+
+    def test_reads_feed_processing_classes(self):
+        """Tests that archived spectra can be used directly by DataPreprocessor and DataAugmentation"""
+        data = self.archive.get(15150, 59291, 1)[['LOGLAM', 'FLUX']]
+        preprocessor = DataPreprocessor(query=None, data=data)
+        preprocessor.normalize_data()
+        augmentor = DataAugmentation(preprocessor.data)
+        augmentor.compute_derivative('FLUX')
+        self.assertIn('FLUX Derivative', augmentor.data.columns)
+
+    def test_get_batch(self):
+        """Tests that several spectra are read into a SpectrumBatch"""
+        batch = self.archive.get_batch()
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.index_of(15150, 59291, 2), 1)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra_full')
+    def test_add_row(self, mock_extract):
+        """Tests that add_row downloads only spectra that are not archived yet"""
+        mock_extract.return_value = make_full_spectrum(12, 5)
+        rows = Table({'plate': [15150, 15152], 'mjd': [59291, 59293], 'fiberid': [1, 4]})
+
+        self.archive.add_row(rows[0])
+        mock_extract.assert_not_called()
+
+        result = self.archive.add_row(rows[1])
+        mock_extract.assert_called_once()
+        self.assertEqual(len(result), 12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""This unit test module runs tests for spectrum_batch_module.py"""
+
+import unittest
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1.spectrum_batch_module import SpectrumBatch
+
+def make_full_spectrum(n, seed=0):
+    """Creates a spectrum with the columns returned by extract_spectra_full"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'FLUX': rng.normal(10, 1, n).astype(np.float32), 'LOGLAM': np.linspace(3.58, 3.96, n).astype(np.float32),
+        'IVAR': rng.uniform(0, 1, n).astype(np.float32), 'AND_MASK': rng.integers(0, 4, n).astype(np.int32),
+        'OR_MASK': rng.integers(0, 4, n).astype(np.int32), 'WDISP': np.ones(n, dtype=np.float32),
+        'SKY': rng.uniform(0, 5, n).astype(np.float32), 'WRESL': np.ones(n, dtype=np.float32),
+        'MODEL': rng.normal(10, 1, n).astype(np.float32),
+    })
+
+class TestSpectrumBatch(unittest.TestCase):
+    """A class for testing our methods in the SpectrumBatch Class"""
+    def setUp(self):
+        """Create three spectra of different lengths and their metadata"""
+        self.frames = [make_full_spectrum(n, seed=n) for n in (30, 25, 30)]
+        self.metadata = Table({'plate': [15150, 15150, 15151], 'mjd': [59291, 59291, 59292], 'fiberid': [1, 2, 1]})
+        self.batch = SpectrumBatch.from_dataframes(self.frames, metadata=self.metadata, extra_columns=('sky',))
+
+    def test_shapes_and_dtypes(self):
+        """Tests that spectra are stacked into padded float32 and int32 arrays"""
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual(self.batch.flux.shape, (3, 30))
+        self.assertEqual(self.batch.flux.dtype, np.float32)
+        self.assertEqual(self.batch.and_mask.dtype, np.int32)
+        self.assertTrue(self.batch.flux.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(self.batch.lengths, [30, 25, 30])
+        self.assertTrue(np.all(np.isnan(self.batch.flux[1, 25:])))
+
+    def test_round_trip(self):
+        """Tests that converting back to DataFrames gives the original values"""
+        for frame, result in zip(self.frames, self.batch.to_dataframes()):
+            for column in ['FLUX', 'LOGLAM', 'IVAR', 'MODEL', 'AND_MASK', 'OR_MASK', 'SKY']:
+                np.testing.assert_array_equal(result[column].to_numpy(), frame[column].to_numpy())
+
+        self.assertIn('loglam', self.batch.to_dataframe(0, uppercase=False).columns)
+
+    def test_slicing_is_zero_copy(self):
+        """Tests that slices share memory with the batch"""
+        sliced = self.batch[1:]
+        self.assertEqual(len(sliced), 2)
+        self.assertTrue(np.shares_memory(sliced.flux, self.batch.flux))
+        self.assertTrue(np.shares_memory(self.batch[0].flux, self.batch.flux))
+        self.assertTrue(np.shares_memory(self.batch.to_dataframe(2)['FLUX'].to_numpy(), self.batch.flux))
+        self.assertEqual(sliced.metadata['fiberid'].tolist(), [2, 1])
+
+    def test_index_of(self):
+        """Tests lookup of a spectrum by plate, mjd and fiberid"""
+        self.assertEqual(self.batch.index_of(15151, 59292, 1), 2)
+        with self.assertRaises(KeyError):
+            self.batch.index_of(1, 2, 3)
+
+    def test_missing_column(self):
+        """Tests that a spectrum without a required column raises ValueError"""
+        with self.assertRaises(ValueError):
+            SpectrumBatch.from_dataframes([self.frames[0].drop(columns='IVAR')])
+
+    def test_mismatched_metadata(self):
+        """Tests that metadata with the wrong number of rows raises ValueError"""
+        with self.assertRaises(ValueError):
+            SpectrumBatch.from_dataframes(self.frames, metadata=self.metadata[:2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""This unit test module runs tests for spectrum_store_module.py"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_1.spectrum_store_module import SpectrumStore, configure_spectrum_store, get_spectrum_store
+from group9_package.subpkg_1.visualize_module import SpectralVisualizer
+
+class TestSpectrumStore(unittest.TestCase):
+    """A class for testing our methods in the SpectrumStore Class"""
+    def setUp(self):
+        """Create a temporary cache directory and a table of objects"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.table = Table({'plate': [15150, 15150, 15151], 'mjd': [59291, 59291, 59292], 'fiberid': [1, 2, 3]})
+        self.spectrum = pd.DataFrame({'Wavelength': [1.0, 2.0], 'Flux': [0.5, 0.8], 'BestFit': [0.4, 0.7], 'SkyFlux': [0.1, 0.2]})
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        self.tmpdir.cleanup()
+
+    def test_invalid_input(self):
+        """Tests that invalid settings and rows are rejected"""
+        with self.assertRaises(ValueError):
+            SpectrumStore(max_items=0)
+        with self.assertRaises(TypeError):
+            SpectrumStore().get({'plate': 1, 'mjd': 2, 'fiberid': 3})
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_memory_cache(self, mock_extract):
+        """Tests that a spectrum is downloaded once and evicted in least recently used order"""
+        mock_extract.return_value = self.spectrum
+        store = SpectrumStore(max_items=2)
+
+        self.assertIs(store.get(self.table[0]), self.spectrum)
+        store.get(self.table[0])
+        store.get(self.table[1])
+        store.get(self.table[0])
+        store.get(self.table[2])
+
+        self.assertEqual(mock_extract.call_count, 3)
+        self.assertEqual(store.stats['memory_hits'], 2)
+        self.assertIn(self.table[0], store)
+        self.assertNotIn(self.table[1], store)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_disk_cache(self, mock_extract):
+        """Tests that a new store reads spectra written by an earlier one"""
+        mock_extract.return_value = self.spectrum
+        SpectrumStore(cache_dir=self.tmpdir.name).get(self.table[2])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, 'spec-15151-59292-3.csv')))
+
+        store = SpectrumStore(cache_dir=self.tmpdir.name)
+        pd.testing.assert_frame_equal(store.get(self.table[2]), self.spectrum)
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertEqual(store.stats['disk_hits'], 1)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_failed_downloads_not_cached(self, mock_extract):
+        """Tests that a spectrum that could not be downloaded is requested again"""
+        mock_extract.return_value = None
+        store = SpectrumStore(cache_dir=self.tmpdir.name)
+        self.assertIsNone(store.get(self.table[0]))
+        self.assertIsNone(store.get(self.table[0]))
+        self.assertEqual(mock_extract.call_count, 2)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_prefetch(self, mock_extract):
+        """Tests that prefetched spectra are fetched once, even when requested while in flight"""
+        release = threading.Event()
+        def slow_extract():
+            release.wait(5)
+            return self.spectrum
+        mock_extract.side_effect = slow_extract
+        store = SpectrumStore(max_workers=2)
+
+        self.assertEqual(store.prefetch(self.table), 3)
+        self.assertEqual(store.prefetch(self.table), 0)
+        getter = threading.Thread(target=store.get, args=(self.table[0],))
+        getter.start()
+        release.set()
+        getter.join()
+
+        for row in self.table:
+            self.assertIs(store.get(row), self.spectrum)
+        self.assertEqual(mock_extract.call_count, 3)
+        store.close()
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_visualizers_share_the_store(self, mock_extract):
+        """Tests that visualizers of the same row download it once and browse prefetches a table"""
+        mock_extract.return_value = self.spectrum
+        store = SpectrumStore()
+        with patch('matplotlib.pyplot.show'):
+            SpectralVisualizer(row=self.table[0], store=store).visualize()
+            SpectralVisualizer(row=self.table[0], store=store).visualize()
+            self.assertEqual(mock_extract.call_count, 1)
+
+            visualizers = SpectralVisualizer.browse(self.table, store=store)
+            for visualizer in visualizers:
+                visualizer.visualize()
+        self.assertEqual(len(visualizers), 3)
+        self.assertEqual(mock_extract.call_count, 3)
+
+    @patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra')
+    def test_visualizer_does_not_modify_the_cache(self, mock_extract):
+        """Tests that changing the data of a visualizer leaves the cached spectrum untouched"""
+        mock_extract.return_value = self.spectrum.copy()
+        store = SpectrumStore()
+        visualizer = SpectralVisualizer(row=self.table[0], store=store)
+        with patch('matplotlib.pyplot.show'):
+            visualizer.visualize()
+        visualizer.data['Flux'] *= 10
+        pd.testing.assert_frame_equal(store.get(self.table[0]), self.spectrum)
+        store.close()
+
+    def test_configure_full_store(self):
+        """Tests that configure_spectrum_store forwards the full option"""
+        # the replaced store is closed, so a fresh default one is configured afterwards
+        self.addCleanup(configure_spectrum_store)
+        store = configure_spectrum_store(cache_dir=self.tmpdir.name, full=True)
+        self.assertTrue(store.full)
+        self.assertIs(get_spectrum_store(), store)
+
+if __name__ == '__main__':
+    unittest.main()
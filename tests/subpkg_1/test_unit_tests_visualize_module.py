@@ -1,5 +1,6 @@
 """This unit test module runs tests for visualize_module.py"""
 
+import os
 import unittest
 from unittest.mock import patch
 import matplotlib
@@ -8,7 +9,12 @@ from astropy.table import Table
 import numpy as np
 import pandas as pd
 import pytest
-from group9_package.subpkg_1.visualize_module import SpectralVisualizer
+from group9_package.subpkg_1 import visualize_module
+from group9_package.subpkg_1.visualize_module import (SpectralVisualizer, MultiSpectralVisualizer,
+                                                     BatchSpectralRenderer, decimate_minmax)
+from group9_package.subpkg_1.spectrum_batch_module import SpectrumBatch
+from matplotlib.collections import LineCollection
+from matplotlib.image import AxesImage
 
 class TestVisualizer():
     """A class for testing our methods in the SpectralVisualizer Class"""
@@ -98,5 +104,270 @@ class TestVisualizer():
 
         # Reset the backend to the default
         plt.close('all')
-            
 
+
+class TestDecimation():
+    """A class for testing the min/max decimation used to draw large spectra"""
+    def test_keeps_extremes_of_every_bin(self):
+        """
+        Ensures that decimation bounds the number of vertices while keeping peaks,
+        the minimum and maximum of each bin, and the end points
+        """
+        rng = np.random.default_rng(0)
+        x = np.linspace(3600, 10400, 100000)
+        y = rng.normal(size=x.size)
+        y[54321] = 50.0
+        y[12345] = -50.0
+
+        x_dec, y_dec = decimate_minmax(x, y, 500)
+
+        assert len(x_dec) <= 2 * 500 + 2
+        assert np.all(np.diff(x_dec) > 0)
+        assert y_dec.max() == 50.0 and y_dec.min() == -50.0
+        assert x_dec[0] == x[0] and x_dec[-1] == x[-1]
+
+        bins = np.minimum(((x - x[0]) * (500 / (x[-1] - x[0]))).astype(int), 499)
+        for b in (0, 137, 499):
+            assert y[bins == b].max() in y_dec and y[bins == b].min() in y_dec
+
+    def test_short_and_nan_input(self):
+        """
+        Ensures that short curves are left untouched and NaN values are ignored
+        """
+        x, y = np.arange(10.0), np.arange(10.0)
+        x_dec, y_dec = decimate_minmax(x, y, 100)
+        assert x_dec is x and y_dec is y
+
+        y = np.ones(1000)
+        y[::2] = np.nan
+        y[501] = 3.0
+        _, y_dec = decimate_minmax(np.arange(1000.0), y, 10)
+        assert np.nanmax(y_dec) == 3.0
+
+    def test_nan_x(self):
+        """
+        Ensures that NaN wavelengths, as left by remove_outliers, are dropped instead
+        of collapsing or scrambling the bins
+        """
+        x = np.linspace(3600, 10400, 10000)
+        y = np.sin(x / 100)
+        x[[0, 5000, -1]] = np.nan
+        x_dec, y_dec = decimate_minmax(x, y, 100)
+        assert np.isfinite(x_dec).all() and np.isfinite(y_dec).all()
+        assert 100 < len(x_dec) <= 2 * 100 + 2
+        assert np.all(np.diff(x_dec) > 0)
+        assert x_dec[0] == x[1] and x_dec[-1] == x[-2]
+
+        y[::3] = np.inf
+        _, y_dec = decimate_minmax(x, y, 100)
+        assert np.isfinite(y_dec).all()
+
+    def test_descending_and_unsorted_x(self):
+        """
+        Ensures that descending x is decimated in its order and unsorted x is not decimated
+        """
+        rng = np.random.default_rng(1)
+        x = np.linspace(3600, 10400, 10000)
+        y = rng.normal(size=x.size)
+        x_up, y_up = decimate_minmax(x, y, 100)
+        x_down, y_down = decimate_minmax(x[::-1], y[::-1], 100)
+        np.testing.assert_array_equal(x_down, x_up[::-1])
+        np.testing.assert_array_equal(y_down, y_up[::-1])
+
+        order = rng.permutation(x.size)
+        x_dec, y_dec = decimate_minmax(x[order], y[order], 100)
+        np.testing.assert_array_equal(x_dec, x[order])
+        np.testing.assert_array_equal(y_dec, y[order])
+
+    def test_invalid_input(self):
+        """
+        Ensures that mismatched arrays and invalid bin counts raise ValueError
+        """
+        with pytest.raises(ValueError):
+            decimate_minmax(np.arange(3), np.arange(4), 10)
+        with pytest.raises(ValueError):
+            decimate_minmax(np.arange(3), np.arange(3), 0)
+
+    def test_visualize_draws_decimated_line(self):
+        """
+        Ensures that visualize draws at most two vertices per pixel unless decimation is disabled
+        """
+        matplotlib.use('Agg')
+        x = np.linspace(3600, 10400, 200000)
+        data = pd.DataFrame({'Wavelength': x, 'Flux': np.sin(x)})
+
+        with patch('matplotlib.pyplot.show'):
+            SpectralVisualizer(data=data).visualize()
+            fig = plt.gcf()
+            assert len(plt.gca().lines[0].get_xdata()) <= 2 * fig.get_figwidth() * fig.dpi + 2
+
+            SpectralVisualizer(data=data).visualize(decimate=False)
+            assert len(plt.gca().lines[0].get_xdata()) == len(x)
+
+        plt.close('all')
+
+
+class TestMultiSpectralVisualizer():
+    """A class for testing our methods in the MultiSpectralVisualizer Class"""
+    def aligned_frames(self, n):
+        """Returns n spectra on the same loglam grid, as WavelengthAlign produces"""
+        loglam = np.linspace(3.6, 3.9, 300)
+        return [pd.DataFrame({'loglam': loglam, 'flux': np.sin(loglam * (i + 10))}) for i in range(n)]
+
+    def test_inputs(self):
+        """
+        Ensures that arrays, DataFrames and SpectrumBatch objects are stacked, and bad inputs rejected
+        """
+        visualizer = MultiSpectralVisualizer(np.ones((3, 5)))
+        assert visualizer.flux.shape == (3, 5)
+        assert visualizer.wavelength.tolist() == [0, 1, 2, 3, 4]
+
+        frames = self.aligned_frames(4)
+        frames[1] = frames[1].iloc[:200]
+        visualizer = MultiSpectralVisualizer(frames)
+        assert visualizer.flux.shape == (4, 300)
+        assert np.isnan(visualizer.flux[1, 200:]).all()
+
+        batch = SpectrumBatch.from_dataframes([frame.assign(ivar=1.0, model=0.0, and_mask=0, or_mask=0) for frame in frames])
+        np.testing.assert_allclose(MultiSpectralVisualizer(batch).wavelength, visualizer.wavelength, rtol=1e-5)
+
+        with pytest.raises(TypeError):
+            MultiSpectralVisualizer({'flux': [1, 2]})
+        with pytest.raises(ValueError):
+            MultiSpectralVisualizer([pd.DataFrame({'Flux': [1.0]})])
+        with pytest.raises(ValueError):
+            MultiSpectralVisualizer(np.ones((2, 3)), wavelength=[1, 2])
+
+    def test_common_grid(self):
+        """
+        Ensures that aligned spectra keep their grid and others are interpolated onto a shared one
+        """
+        grid, flux = MultiSpectralVisualizer(self.aligned_frames(3)).common_grid()
+        assert grid.shape == (300,) and flux.shape == (3, 300)
+
+        frames = [pd.DataFrame({'Wavelength': [1.0, 2.0, 3.0], 'Flux': [1.0, 2.0, 3.0]}),
+                  pd.DataFrame({'Wavelength': [2.0, 3.0, 4.0], 'Flux': [4.0, 5.0, 6.0]})]
+        grid, flux = MultiSpectralVisualizer(frames).common_grid()
+        np.testing.assert_allclose(grid, [1.0, 2.5, 4.0])
+        np.testing.assert_allclose(flux, [[1.0, 2.5, np.nan], [np.nan, 4.5, 6.0]])
+
+    def test_overlay_is_one_artist(self):
+        """
+        Ensures that few spectra are drawn as one LineCollection and many as one density image
+        """
+        matplotlib.use('Agg')
+        visualizer = MultiSpectralVisualizer(self.aligned_frames(20))
+        fig, ax = plt.subplots()
+        collection = visualizer.overlay(ax=ax)
+        assert isinstance(collection, LineCollection)
+        assert len(collection.get_segments()) == 20
+        assert len(ax.lines) == 0
+
+        fig, ax = plt.subplots()
+        image = visualizer.overlay(ax=ax, max_lines=10)
+        assert isinstance(image, AxesImage)
+        assert image.get_array().sum() > 0
+        plt.close('all')
+
+    def test_overlay_without_finite_samples(self):
+        """
+        Ensures that a density overlay of only NaN flux raises ValueError and leaves no figure open
+        """
+        matplotlib.use('Agg')
+        plt.close('all')
+        visualizer = MultiSpectralVisualizer(np.full((20, 50), np.nan))
+        with pytest.raises(ValueError):
+            visualizer.overlay(max_lines=10)
+        assert plt.get_fignums() == []
+
+        fig, ax = plt.subplots()
+        assert len(visualizer.overlay(ax=ax).get_segments()) == 20
+        plt.close('all')
+
+    def test_heatmap(self):
+        """
+        Ensures that the heatmap is one image, reduced to max_shape, and shown without an axes
+        """
+        matplotlib.use('Agg')
+        flux = np.arange(40 * 30, dtype=float).reshape(40, 30)
+        visualizer = MultiSpectralVisualizer(flux, wavelength=np.linspace(4000, 5000, 30))
+
+        with patch('matplotlib.pyplot.show') as mock_show:
+            image = visualizer.heatmap(max_shape=(10, 15))
+        mock_show.assert_called_once()
+        assert image.get_array().shape == (10, 15)
+        assert image.get_array()[0, 0] == np.mean(flux[:4, :2])
+        assert image.get_extent()[:2] == [4000, 5000]
+
+        fig, ax = plt.subplots()
+        assert visualizer.heatmap(ax=ax, max_shape=None).get_array().shape == (40, 30)
+        plt.close('all')
+
+class TestBatchSpectralRenderer():
+    """A class for testing our methods in the BatchSpectralRenderer Class"""
+    def spectra(self, n):
+        """Returns n small spectra keyed by name"""
+        x = np.linspace(3600, 10400, 500)
+        return {f'spec-{i}': pd.DataFrame({'Wavelength': x, 'Flux': np.sin(x / (i + 1))}) for i in range(n)}
+
+    def test_invalid_settings(self, tmp_path):
+        """
+        Ensures that unsupported formats raise a ValueError
+        """
+        with pytest.raises(ValueError):
+            BatchSpectralRenderer(str(tmp_path), fmt='jpg')
+
+    def test_render_reuses_one_figure(self, tmp_path):
+        """
+        Ensures that every spectrum is written and a single figure is created per process
+        """
+        visualize_module._RENDER_FIGURES.clear()
+        with patch('group9_package.subpkg_1.visualize_module.Figure', wraps=visualize_module.Figure) as mock_figure:
+            manifest = BatchSpectralRenderer(str(tmp_path), processes=1).render(self.spectra(5))
+
+        assert mock_figure.call_count == 1
+        assert manifest['status'].tolist() == ['done'] * 5
+        for path in manifest['file']:
+            with open(path, 'rb') as image:
+                assert image.read(8) == b'\x89PNG\r\n\x1a\n'
+        assert not plt.get_fignums()
+
+    def test_render_in_parallel_with_manifest(self, tmp_path):
+        """
+        Ensures that the process pool renders SVG files and records failures in the manifest
+        """
+        spectra = list(self.spectra(6).items()) + [('broken', pd.DataFrame({'Flux': [1.0]}))]
+        manifest = BatchSpectralRenderer(str(tmp_path), fmt='svg', processes=2).render(spectra)
+
+        assert manifest['name'].tolist() == [name for name, _ in spectra]
+        assert manifest['status'].tolist() == ['done'] * 6 + ['failed']
+        assert 'Wavelength' in manifest['error'].iloc[-1]
+        assert (tmp_path / 'spec-3.svg').exists()
+        assert pd.read_csv(tmp_path / 'manifest.csv')['status'].tolist() == manifest['status'].tolist()
+
+    def test_render_names_stay_in_output_dir(self, tmp_path):
+        """
+        Ensures that names with path separators or '..' cannot write outside of the output directory
+        """
+        output_dir = tmp_path / 'images'
+        spectrum = self.spectra(1)['spec-0']
+        spectra = [('../escaped', spectrum), ('a/b\\c', spectrum), ('..', spectrum)]
+        manifest = BatchSpectralRenderer(str(output_dir), processes=1).render(spectra)
+
+        assert manifest['status'].tolist() == ['done', 'done', 'failed']
+        assert manifest['name'].tolist() == ['../escaped', 'a/b\\c', '..']
+        assert sorted(path.name for path in output_dir.iterdir()) == ['.._escaped.png', 'a_b_c.png', 'manifest.csv']
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['images']
+
+    def test_render_colliding_names(self, tmp_path):
+        """
+        Ensures that names sharing a file once sanitised get suffixes, even when rendered by different processes
+        """
+        spectrum = self.spectra(1)['spec-0']
+        spectra = [('a/b', spectrum), ('a_b', spectrum), ('A\\b', spectrum), ('a_b-1', spectrum), ('c', spectrum)]
+        manifest = BatchSpectralRenderer(str(tmp_path), processes=2, chunks_per_process=3).render(spectra)
+
+        assert manifest['status'].tolist() == ['done'] * 5
+        assert [os.path.basename(path) for path in manifest['file']] == [
+            'a_b.png', 'a_b-1.png', 'A_b-2.png', 'a_b-1-1.png', 'c.png']
+        assert len(list(tmp_path.iterdir())) == 6
@@ -6,7 +6,8 @@ import pandas as pd
 import numpy as np
 from io import StringIO
 from pandas.testing import assert_frame_equal
-from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier
+from sklearn.metrics import confusion_matrix, log_loss
+from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier, StreamingEvaluator
 
 class TestCelestialObjectClassifier(unittest.TestCase):
     """A class for testing our methods in the CelestialObjectClassifier Class"""
@@ -209,5 +210,83 @@ class TestCelestialObjectClassifier(unittest.TestCase):
        
         self.assertEqual(prediction_probabilities.shape, (self.y_test.shape[0],3))
 
+    def test_evaluate_stream_no_train(self):
+        """
+        Tests that we raise ValueError when trying to evaluate before training
+        """
+        classifier = CelestialObjectClassifier()
+        with self.assertRaises(ValueError):
+            classifier.evaluate_stream([(self.spectral_data_test, self.y_test)])
+
+    def test_evaluate_stream_incorrect_types(self):
+        """
+        Tests that we raise ValueError when a batch of incorrect type is streamed
+        """
+        classifier = CelestialObjectClassifier()
+        classifier.fit(spectral_data=self.spectral_data_train, y=self.y_train)
+
+        with self.assertRaises(ValueError):
+            classifier.evaluate_stream([(self.spectral_data_test, [["galaxy"], ["star"]])])
+
+    def test_evaluate_stream_matches_full_evaluation(self):
+        """
+        Tests that evaluating in chunks gives the same confusion matrix and log-loss
+        as evaluating the whole dataset at once
+        """
+        classifier = CelestialObjectClassifier()
+        classifier.fit(spectral_data=self.spectral_data_train, y=self.y_train)
+
+        def batches():
+            for start in range(0, len(self.y_train), 3):
+                yield (self.spectral_data_train.iloc[start:start + 3],
+                       self.y_train.iloc[start:start + 3])
+
+        evaluator = classifier.evaluate_stream(batches())
+
+        y_pred = classifier.model.predict(self.spectral_data_train)
+        expected = confusion_matrix(self.y_train, y_pred, labels=["galaxy", "star", "qso"])
+        np.testing.assert_array_equal(evaluator.confusion_matrix, expected)
+
+        expected_log_loss = log_loss(self.y_train, classifier.model.predict_proba(self.spectral_data_train),
+                                     labels=classifier.model.classes_)
+        self.assertAlmostEqual(evaluator.log_loss(), expected_log_loss)
+        self.assertEqual(evaluator.n_samples, self.y_train.shape[0])
+
+class TestStreamingEvaluator(unittest.TestCase):
+    """A class for testing our methods in the StreamingEvaluator Class"""
+    def test_invalid_labels(self):
+        """Tests that we raise ValueError for empty or duplicated labels"""
+        with self.assertRaises(ValueError):
+            StreamingEvaluator(labels=[])
+
+        with self.assertRaises(ValueError):
+            StreamingEvaluator(labels=["star", "star"])
+
+    def test_precision_recall(self):
+        """Tests the per-class precision and recall accumulated over two batches"""
+        evaluator = StreamingEvaluator()
+        evaluator.update(["galaxy", "galaxy", "star"], ["galaxy", "star", "star"])
+        evaluator.update(["qso", "star"], ["qso", "galaxy"])
+
+        np.testing.assert_array_equal(evaluator.confusion_matrix, [[1, 1, 0], [1, 1, 0], [0, 0, 1]])
+        self.assertEqual(evaluator.precision(), {"galaxy": 0.5, "star": 0.5, "qso": 1.0})
+        self.assertEqual(evaluator.recall(), {"galaxy": 0.5, "star": 0.5, "qso": 1.0})
+
+    def test_log_loss_without_probabilities(self):
+        """Tests that the log-loss is unavailable if no probabilities were given"""
+        evaluator = StreamingEvaluator()
+        evaluator.update(["galaxy"], ["galaxy"])
+
+        with self.assertRaises(ValueError):
+            evaluator.log_loss()
+
+        self.assertIsNone(evaluator.summary()["log_loss"])
+
+    def test_mismatched_lengths(self):
+        """Tests that we raise ValueError when a batch has mismatched lengths"""
+        evaluator = StreamingEvaluator()
+        with self.assertRaises(ValueError):
+            evaluator.update(["galaxy", "star"], ["galaxy"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""This unit test module runs tests for pipeline_module.py"""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from astropy.table import Table
+from group9_package.subpkg_2.machine_learning_module import CelestialObjectClassifier
+from group9_package.subpkg_2.pipeline_module import (SpectralPipeline, PipelineStage, extract_stage,
+                                                     preprocess_stage, align_stage, augment_stage, classify_stage)
+
+class TestSpectralPipeline(unittest.TestCase):
+    """A class for testing our methods in the SpectralPipeline Class"""
+    def test_invalid_stage(self):
+        """Tests that invalid stage definitions raise errors"""
+        with self.assertRaises(TypeError):
+            PipelineStage("bad", func="not callable")
+
+        with self.assertRaises(ValueError):
+            PipelineStage("bad", func=abs, workers=0)
+
+    def test_no_stages(self):
+        """Tests that running an empty pipeline raises ValueError"""
+        with self.assertRaises(ValueError):
+            list(SpectralPipeline().run(range(3)))
+
+    def test_stages_applied_in_order(self):
+        """Tests that single worker stages are applied in order and keep item order"""
+        pipeline = SpectralPipeline().add_stage("double", lambda x: 2 * x).add_stage("inc", lambda x: x + 1)
+        self.assertEqual(list(pipeline.run(range(5))), [1, 3, 5, 7, 9])
+
+    def test_none_results_are_dropped(self):
+        """Tests that items for which a stage returns None are dropped"""
+        pipeline = SpectralPipeline().add_stage("odd", lambda x: x if x % 2 else None)
+        self.assertEqual(list(pipeline.run(range(6))), [1, 3, 5])
+
+    def test_parallel_stage_with_source(self):
+        """Tests that a multi worker stage processes every item and keeps track of its source"""
+        def slow_square(x):
+            time.sleep(0.01)
+            return x * x
+
+        pipeline = SpectralPipeline().add_stage("square", slow_square, workers=4)
+        results = dict(pipeline.run(range(20), with_source=True))
+        self.assertEqual(results, {x: x * x for x in range(20)})
+
+    def test_bounded_queues_apply_backpressure(self):
+        """Tests that the source is not drained far ahead of a slow consumer"""
+        pulled = []
+        lock = threading.Lock()
+
+        def source():
+            for i in range(100):
+                with lock:
+                    pulled.append(i)
+                yield i
+
+        pipeline = SpectralPipeline(queue_size=2).add_stage("identity", lambda x: x)
+        stream = pipeline.run(source())
+        next(stream)
+        time.sleep(0.2)
+
+        # two queues of size 2, one item in the worker, one in the feeder and one consumed
+        with lock:
+            self.assertLessEqual(len(pulled), 8)
+        stream.close()
+
+    def test_stage_error_is_raised(self):
+        """Tests that an exception in a stage is re-raised to the consumer"""
+        def fail(x):
+            raise ValueError("bad spectrum")
+
+        pipeline = SpectralPipeline().add_stage("fail", fail)
+        with self.assertRaises(RuntimeError):
+            list(pipeline.run(range(3)))
+
+class TestPipelineStages(unittest.TestCase):
+    """A class for testing the stage factories against the package classes"""
+    def setUp(self):
+        """Create a synthetic full spectrum in the format of extract_spectra_full"""
+        n = 50
+        self.full_spectrum = pd.DataFrame({
+            'FLUX': np.sin(np.linspace(0, 6, n)) + 2, 'LOGLAM': np.linspace(3.6, 3.9, n),
+            'IVAR': np.ones(n), 'AND_MASK': np.zeros(n, dtype=np.int32), 'OR_MASK': np.zeros(n, dtype=np.int32),
+            'WDISP': np.ones(n), 'SKY': np.ones(n), 'WRESL': np.ones(n), 'MODEL': np.ones(n),
+        })
+        self.rows = Table({'plate': np.array([15150, 15151]), 'mjd': np.array([59291, 59291]),
+                           'fiberid': np.array([1, 2])})
+
+    def test_end_to_end(self):
+        """Tests that extract, align, preprocess, augment and classify stages chain together"""
+        classifier = CelestialObjectClassifier()
+        features = pd.DataFrame({'flux': [1.0, 2.0, 3.0, 1.5], 'flux Derivative': [0.1, -0.1, 0.2, 0.0]})
+        classifier.fit(features, pd.Series(["galaxy", "star", "qso", "star"]))
+
+        spectra = {15150: self.full_spectrum.copy(), 15151: self.full_spectrum.copy()}
+        with patch('group9_package.subpkg_1.core_functions_module_extract.SpectraExtract.extract_spectra_full',
+                   autospec=True, side_effect=lambda extractor: spectra[extractor.row['plate']]):
+            pipeline = (SpectralPipeline()
+                        .add_stage("extract", extract_stage(), workers=2)
+                        .add_stage("align", align_stage((3.65, 3.85)))
+                        .add_stage("augment", augment_stage('flux'))
+                        .add_stage("classify", classify_stage(classifier, columns=['flux', 'flux Derivative'])))
+            results = list(pipeline.run(self.rows))
+
+        self.assertEqual(len(results), 2)
+        for predictions in results:
+            self.assertEqual(len(predictions), 50)
+            self.assertTrue(set(predictions) <= {"galaxy", "star", "qso"})
+
+    def test_align_stage_keeps_input_columns(self):
+        """Tests that the align stage renames the columns of a copy, not of the spectrum it is handed"""
+        aligned = align_stage((3.65, 3.85))(self.full_spectrum)
+
+        self.assertEqual(list(self.full_spectrum.columns)[:2], ['FLUX', 'LOGLAM'])
+        self.assertIn('flux', aligned.columns)
+
+    def test_classify_stage_per_row_and_per_spectrum(self):
+        """Tests that every row is classified by default, and the whole spectrum given features"""
+        classifier = CelestialObjectClassifier()
+        features = pd.DataFrame({'flux': [1.0, 2.0, 3.0, 1.5], 'sky': [0.1, 0.9, 0.5, 0.0]})
+        classifier.fit(features, pd.Series(["galaxy", "star", "qso", "star"]))
+        spectrum = self.full_spectrum.rename(columns=str.lower)
+
+        per_row = classify_stage(classifier, columns=['flux', 'sky'])(spectrum)
+        self.assertEqual(len(per_row), len(spectrum))
+        for i in (0, 17, 49):
+            row = spectrum[['flux', 'sky']].iloc[[i]]
+            self.assertEqual(per_row[i], classifier.model.classes_[np.argmax(classifier.predict_proba(row))])
+
+        whole = classify_stage(classifier, columns=['flux', 'sky'], features=lambda data: data.mean())(spectrum)
+        self.assertIn(whole, {"galaxy", "star", "qso"})
+        mean = spectrum[['flux', 'sky']].mean().to_frame().T
+        self.assertEqual(whole, classifier.model.classes_[np.argmax(classifier.predict_proba(mean))])
+
+        with self.assertRaises(ValueError):
+            classify_stage(classifier, features=lambda data: data.iloc[:2])(spectrum)
+
+    def test_preprocess_stage_modifies_in_place(self):
+        """Tests that the preprocess stage works on the DataFrame it is handed"""
+        data = pd.DataFrame({'Wavelength': [1.0, 2.0, 3.0], 'Flux': [2.0, 4.0, 6.0]})
+        result = preprocess_stage('normalize_data')(data)
+
+        self.assertIs(result, data)
+        np.testing.assert_almost_equal(result['Flux'].mean(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()